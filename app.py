@@ -4,11 +4,11 @@ import time
 import subprocess
 import tkinter as tk
 import json
+import re
 import shutil
 from tkinter import font as tkfont
-from typing import Any, Callable
+from typing import Any, Callable, Dict
 
-import psutil
 import win32api
 
 from utils.hotkeys import Hotkeys
@@ -18,9 +18,50 @@ from utils.config import (
     set_opacity as config_set_opacity,
     get_speedtest as config_get_speedtest,
     set_speedtest as config_set_speedtest,
+    get_throughput_endpoint,
+    get_stream_tuning,
+    set_stream_tuning,
+    get_selfmon_settings,
+    get_graph_window,
+    set_graph_window as config_set_graph_window,
+    get_graph_mode,
+    get_structured_log_enabled,
+    get_counter_backend,
+    get_alert_rules,
+    get_ipc_enabled,
+    get_shared_memory_enabled,
+    get_history_archive_enabled,
+    get_microburst_settings,
+    get_trace_path,
+    get_usage_settings,
+    get_anomaly_settings,
+    get_telemetry_settings,
 )
 from utils.paths import resource_path
-from utils.logger import startup, info, warn, section
+from utils.render import RenderCache, graph_segments
+from utils.cursor import HoverGuard, default_cursor_source
+from utils.state import StateStore
+from utils.cancel import CancelToken, Cancelled, run_cancellable
+from net.counters import open_counter_source
+from net.ipc import IpcServer
+from net.latency import IDLE_BASELINE_SEC, LatencyProbe
+from net.shm import SampleRing
+from net.telemetry import TelemetrySender, parse_address
+from net.autotune import MAX_STREAMS, PROBE_SEC, StreamRamp, network_identity, ramp_start
+from net.throughput import DEFAULT_STREAMS, Endpoint, run_throughput_test
+from net.upload import SPEEDTEST_UPLOAD_SIZES, install_streaming_uploads
+from utils.history import SEAL_INTERVAL_SEC, HistoryWriter, append_speedtest, iter_samples, iter_speedtests, seal_history
+from utils.decimate import DecimatedSeries
+from utils.alerts import Alert, AlertDispatcher, RuleEngine
+from utils.anomaly import ANOMALY_SAVE_SEC, AnomalyMonitor
+from utils.microburst import BurstSummary, MicroburstCapture
+from utils.sampler import SPEEDTEST_INTERVAL_SEC, SPEEDTEST_STARTUP_GRACE_SEC, Sampler, SpeedtestGate
+from utils.trace import RecordingCounterSource, TraceRecorder
+from utils.usage import USAGE_INTERVAL_SEC, UsageMeter
+from utils.runtime import Runtime, Timer
+from utils.selfmon import SelfMonitor, format_sample
+from utils.sketch import DEFAULT_QUANTILES, KEEP_MONTHS, METRICS, SKETCH_SAVE_SEC, SketchStore, write_snapshot
+from utils.logger import startup, info, warn, section, event, enable_structured_log, close_structured_log
 
 try:
     import speedtest as _speedtest
@@ -32,8 +73,10 @@ APP_NAME = f"NetSpeed Widget v{APP_VERSION} by jn-s3s"
 FONT_FAMILY = "Segoe UI"
 PING_HOST = "fast.com"
 PING_TIMEOUT_MS = 1200
-SPEEDTEST_INTERVAL_SEC = 4 * 60 * 60  # 4 hours
-SPEEDTEST_STARTUP_GRACE_SEC = 20 # 20 seconds
+LATENCY_PROBE_PORT = 443  # TCP connect probes during speedtests (to PING_HOST unless a native endpoint is set)
+PING_RTT_RE = re.compile(r"[=<]\s*(\d+(?:[.,]\d+)?)\s*ms", re.IGNORECASE)
+SPEEDTEST_BUDGET_SEC = 240  # overall time budget for one speedtest, split across providers
+SHUTDOWN_TIMEOUT_SEC = 0.2  # max time to wait for background activities on exit
 
 class NetSpeedWidget:
     """
@@ -47,10 +90,12 @@ class NetSpeedWidget:
         Initialize the widget UI and services.
 
         This sets window flags, binds hotkeys, restores saved opacity, builds labels
-        and canvas, positions the window in the primary work area, and starts:
-          - the 1 Hz UI refresh loop,
-          - the background speedtest scheduler,
-          - the hover guard that hides/restores the window.
+        and canvas, positions the window in the primary work area, and starts
+        the background runtime (one asyncio loop thread) with:
+          - the 1 Hz sampler tick,
+          - the speedtest timer,
+          - the self-monitor tick,
+        plus the hover guard that hides/restores the window.
         """
         self.root = root
         self.root.withdraw()
@@ -63,16 +108,16 @@ class NetSpeedWidget:
         self.root.overrideredirect(True)          # borderless
         self.root.attributes("-topmost", True)    # always-on-top
 
-        # --- Log state helpers ---
-        self._last_ping_ok: bool = True
-        self._max_up_seen: float = 0.0
-        self._max_down_seen: float = 0.0
+        # Saved opacity
+        self.opacity = get_opacity()
+
+        # Observable snapshot shared with the tray (opacity, speedtest status/summary)
+        self.state = StateStore(opacity=self.opacity, graph_window=get_graph_window())
 
         # Bind global hotkeys (opacity control)
         Hotkeys(self).bind()
 
         # Apply saved opacity
-        self.opacity = get_opacity()
         try:
             self.root.attributes("-alpha", self.opacity)
         except Exception:
@@ -138,39 +183,183 @@ class NetSpeedWidget:
         self.root.geometry(f"{self.win_width}x{self.win_height}+{self.win_x}+{self.win_y}")
 
         # --- Counters baseline ---
-        counters = psutil.net_io_counters()
-        self.last_bytes_sent: int = counters.bytes_sent
-        self.last_bytes_recv: int = counters.bytes_recv
+        # Direct OS counters (/proc/net/dev, GetIfTable2) where available, else psutil
+        self._counters = open_counter_source(get_counter_backend())
+        # Optional raw trace of counters + probes for deterministic replay
+        self._trace: TraceRecorder | None = None
+        trace_path = get_trace_path()
+        if trace_path:
+            try:
+                self._trace = TraceRecorder(trace_path)
+                self._counters = RecordingCounterSource(self._counters, self._trace)
+            except Exception:
+                self._trace = None
+        # Rates, peaks and ping edges per tick (shared with utils.replay)
+        self._sampler = Sampler(*self._counters.read())
+
+        # Last-rendered state; skips Tk calls for unchanged labels/segments
+        self._render = RenderCache()
+
+        # Per-second sample history (throughput + RTT) on disk
+        self._history = HistoryWriter()
+        # --- Graph series (decimated to ~1 point per pixel for long windows) ---
+        # Each point carries a ping-loss flag; red segments mark drops
+        self._graph_mode: str = get_graph_mode()
+        self._pending_graph_window: int | None = None
+        self._build_graph_series(self.state.snapshot().graph_window)
+
+        if get_structured_log_enabled():
+            enable_structured_log()
+        startup(APP_NAME)
+        event("app_start", opacity=round(self.opacity, 2))
+        info(f"[APP] Initialized at x={self.win_x} y={self.win_y} size={self.win_width}x{self.win_height} opacity={self.opacity:.2f} counters={self._counters.name}")
+
+        # --- Self-overhead monitor (CPU, RSS, threads, wakeups, Tk after calls) ---
+        selfmon_settings = get_selfmon_settings()
+        self.selfmon = SelfMonitor(selfmon_settings["budgets"])
+        self._selfmon_interval: float = selfmon_settings["interval_sec"]
+
+        # --- Background runtime ---
+        # One event loop thread owns every timer (sampler tick, speedtest due
+        # time, self-monitor, tray refresh) in a single timer heap; ping and
+        # speedtest providers run on its small worker pool. Tk is only
+        # touched through ui_call.
+        self.runtime = Runtime(on_wakeup=self.selfmon.count_wakeup)
+        self.runtime.start()
+
+        # --- Alert rules (evaluated per sample, delivered after the tick) ---
+        self._alert_dispatcher = AlertDispatcher([self._deliver_alert], post=self.runtime.call_soon)
+        self._rules = RuleEngine(get_alert_rules(), self._alert_dispatcher)
+        saved = config_get_speedtest(None)
+        if saved:
+            self._rules.set_reference(saved.get("down_mbps"), saved.get("up_mbps"))
+
+        # Seasonal (hour-of-week) baselines for ping and speedtest results
+        self._anomaly: AnomalyMonitor | None = None
+        anomaly_settings = get_anomaly_settings()
+        if anomaly_settings:
+            self._anomaly = AnomalyMonitor(anomaly_settings["z_threshold"])
+            seeded = self._anomaly.seed_speedtests(iter_speedtests(0.0))
+            if seeded:
+                info(f"[ALERT] Anomaly baselines seeded from {seeded} saved speedtests")
+
+        # Per-interface data usage per day/month, restored from the last checkpoint
+        self._usage = UsageMeter(get_usage_settings())
+        self._usage_tick()  # baseline reading
+
+        # --- Background lifecycle ---
+        # Root cancellation token; every loop and speedtest derives from it
+        self._stop = CancelToken()
+        # Threads outside the runtime (microburst capture needs its own cadence)
+        self._threads: list[threading.Thread] = []
+        self._speedtest_token: CancelToken | None = None
+        self._latency_probe: LatencyProbe | None = None
+        self._speedtest_timer: Timer | None = None
+
+        # Latest (ts, down, up, rtt) for IPC status; the server itself starts last
+        self._last_sample: tuple[float, float, float, float | None] | None = None
+        self._ipc: IpcServer | None = None
+
+        # Seqlock ring of the latest samples in shared memory for local readers
+        self._shm: SampleRing | None = None
+        if get_shared_memory_enabled():
+            try:
+                self._shm = SampleRing()
+            except Exception as exc:
+                warn(f"[SHM] Shared memory ring unavailable ({exc})")
+
+        # Optional sub-second capture on its own thread and counter source;
+        # only its per-second summaries reach the sampler tick
+        self._microburst: MicroburstCapture | None = None
+        self._microburst_settings = get_microburst_settings()
+        self._last_burst_ts: float = 0.0
+        if self._microburst_settings:
+            try:
+                self._microburst = MicroburstCapture(
+                    open_counter_source(get_counter_backend()), self._stop, self._microburst_settings["interval_ms"]
+                )
+                self._set_microburst_thresholds(saved)
+                self._start_thread(self._microburst.run)
+                info(f"[NET] Microburst capture every {self._microburst.interval * 1000:.0f} ms")
+            except Exception as exc:
+                self._microburst = None
+                warn(f"[NET] Microburst capture unavailable ({exc})")
+
+        # Optional push of samples/speedtests to a fleet aggregator (net.aggregator)
+        self._telemetry: TelemetrySender | None = None
+        telemetry_settings = get_telemetry_settings()
+        if telemetry_settings:
+            try:
+                self._telemetry = TelemetrySender(
+                    parse_address(telemetry_settings["address"]), telemetry_settings["name"], telemetry_settings["transport"]
+                )
+                self.runtime.every(telemetry_settings["flush_sec"], self._flush_telemetry)
+                info(f"[NET] Telemetry to {telemetry_settings['address']} ({telemetry_settings['transport']}) as {telemetry_settings['name']}")
+            except Exception as exc:
+                self._telemetry = None
+                warn(f"[NET] Telemetry unavailable ({exc})")
 
-        # --- Sample series buffers (10 points) ---
-        self.upload_speeds: list[float] = []
-        self.download_speeds: list[float] = []
-        # True means the segment ending at index i had a ping drop
-        self.ping_loss: list[bool] = []
+        # Per-hour/day/month quantile sketches for long-range percentiles
+        self._sketches = SketchStore()
 
-        startup(APP_NAME)
-        info(f"[APP] Initialized at x={self.win_x} y={self.win_y} size={self.win_width}x{self.win_height} opacity={self.opacity:.2f}")
+        # --- 1 Hz sampler tick ---
+        self.runtime.every(1.0, self._sample_tick)
+
+        # Data-usage accounting at a slower cadence (per-interface reads)
+        self.runtime.every(USAGE_INTERVAL_SEC, self._usage_tick)
+        self.runtime.every(self._usage.checkpoint_sec, self._save_usage)
+        if self._anomaly:
+            self.runtime.every(ANOMALY_SAVE_SEC, self._save_anomaly)
 
-        # --- Updater thread ---
-        self._run: bool = True
-        threading.Thread(target=self.update_loop, daemon=True).start()
+        self.runtime.every(SKETCH_SAVE_SEC, self._save_sketches)
+
+        # Compress finished history days (first pass shortly after startup)
+        if get_history_archive_enabled():
+            self.runtime.every(SEAL_INTERVAL_SEC, self._seal_history, first_delay=60.0)
 
         # Persisted last speedtest + scheduler
-        self._speedtest_running = False
-        self._speedtest_next_due = self._compute_next_speedtest_due()
+        self._gate = self._make_speedtest_gate()
 
         # Reflect saved result in the UI if available
         self._apply_saved_speedtest_labels()
 
-        # Background scheduler that triggers a run
-        threading.Thread(target=self._speedtest_scheduler_loop, daemon=True).start()
+        # One timer armed for the next due time (re-armed after each run)
+        self._schedule_speedtest()
+
+        # Periodic self-overhead sampling
+        self.runtime.every(self._selfmon_interval, self._selfmon_tick)
 
         # --- Hover/restore behavior ---
-        self._hover_guard_active: bool = False
+        self._hover = HoverGuard(default_cursor_source(self.root), self._after, self._on_hover_leave)
+        self._hover.set_rect(self.win_x, self.win_y, self.win_width, self.win_height)
         self.root.bind("<Enter>", self._on_mouse_enter)
 
+        # --- Local control API (Unix socket / named pipe) ---
+        if get_ipc_enabled():
+            server = IpcServer({
+                "status": self._ipc_status,
+                "speedtest": self._ipc_speedtest,
+                "opacity": self._ipc_opacity,
+                "percentiles": self._ipc_percentiles,
+            })
+            if server.start(loop=self.runtime.loop):
+                self._ipc = server
+                info(f"[IPC] Listening on {server.address}")
+            else:
+                warn(f"[IPC] Could not open {server.address}; control API disabled")
+
         # --- Clean exit ---
-        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
+
+    def _start_thread(self, target: Callable[..., None], *args: Any) -> threading.Thread:
+        """
+        Start a daemon thread and remember it so `close()` can join it.
+        """
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+        thread.start()
+        return thread
 
 
     def _pack_row(self, *widgets: Any) -> None:
@@ -187,164 +376,403 @@ class NetSpeedWidget:
 
     def _on_mouse_enter(self, _event: Any = None) -> None:
         """
-        When the cursor enters the window, hide it and begin polling until
-        the cursor leaves the widget bounds, then restore.
+        When the cursor enters the window, hide it and let the hover guard
+        poll until the cursor leaves the widget bounds, then restore.
         """
-        if not self._hover_guard_active:
-            self._hover_guard_active = True
+        if not self._hover.active:
             info("[APP] Hover hide")
+            event("hover_hide")
             self.root.withdraw()
-            self._poll_cursor_and_restore()
+            self._hover.start()
 
 
-    def _poll_cursor_and_restore(self) -> None:
+    def _on_hover_leave(self) -> None:
         """
-        Poll the global cursor position; if it's still inside the last-known
-        window rect, keep waiting; otherwise restore the window once it leaves.
+        Hover guard callback: the cursor left the last-known window rect.
         """
-        if not self._hover_guard_active:
-            return
-
-        # Current global cursor position
-        x, y = win32api.GetCursorPos()
-        inside = (self.win_x <= x <= self.win_x + self.win_width and
-                  self.win_y <= y <= self.win_y + self.win_height)
-        if inside:
-            # keep waiting, then retry
-            self.root.after(120, self._poll_cursor_and_restore)
-        else:
-            # restore once pointer is outside
-            info("[APP] Hover restore")
-            self.root.deiconify()
-            self._hover_guard_active = False
+        info(f"[APP] Hover restore (polls={self._hover.polls})")
+        event("hover_restore", self._hover.polls)
+        self.root.deiconify()
 
 
-    def _ping_once(self) -> bool:
+    def _ping_once(self) -> float | None:
         """
-        Perform a single ICMP ping. Returns True if ping succeeds, False otherwise.
+        Perform a single ICMP ping. Returns the round-trip time in ms if the
+        ping succeeds, None otherwise. The child is killed as soon as the app
+        shuts down.
         """
         cmd = ["ping", PING_HOST, "-n", "1", "-w", str(PING_TIMEOUT_MS)]
         try:
-            res = subprocess.run(
+            started = time.perf_counter()
+            res = run_cancellable(
                 cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
+                self._stop,
+                capture_output=True,
+                text=True,
+                errors="replace",
                 creationflags=0x08000000,  # CREATE_NO_WINDOW
-                check=False,
             )
-            return res.returncode == 0
+            if res.returncode != 0:
+                return None
+            match = PING_RTT_RE.search(res.stdout or "")
+            if match:
+                return float(match.group(1).replace(",", "."))
+            # Unparseable (localized) output: fall back to wall time of the child
+            return (time.perf_counter() - started) * 1000.0
         except Exception:
-            return False
+            return None
 
 
-    def update_loop(self) -> None:
+    async def _sample_tick(self) -> None:
         """
-        Background loop (~1Hz) that samples net I/O, updates labels, and redraws the graph.
+        Runtime tick (~1Hz): samples net I/O and ping, feeds history, alerts
+        and local readers, then hands the label/graph update to Tk.
         """
-        while self._run:
-            start = time.time()
-            counters = psutil.net_io_counters()
-            new_sent = counters.bytes_sent
-            new_recv = counters.bytes_recv
+        start = time.time()
+        new_sent, new_recv = self._counters.read()
+
+        # Ping for this tick (blocking child process, on the worker pool)
+        rtt_ms = await self.runtime.run_blocking(self._ping_once, pool="ping")
+        if self._trace:
+            self._trace.probe(time.monotonic(), rtt_ms)
+        if self._stop.cancelled:
+            return
 
-            up_mbps = (new_sent - self.last_bytes_sent) * 8.0 / 1_000_000.0
-            down_mbps = (new_recv - self.last_bytes_recv) * 8.0 / 1_000_000.0
+        sample, tick_events = self._sampler.step(start, new_sent, new_recv, rtt_ms)
+        down_mbps, up_mbps, dropped = sample.down_mbps, sample.up_mbps, sample.dropped
+        for name, value in tick_events:
+            self._log_tick_event(name, value)
+
+        # Persist the sample for history export
+        self._history.append(start, down_mbps, up_mbps, rtt_ms)
+        self._rules.feed(start, down_mbps, up_mbps, rtt_ms)
+        self._sketches.add_sample(start, down_mbps, up_mbps, rtt_ms)
+        if self._anomaly:
+            self._raise_anomalies(self._anomaly.feed_sample(start, rtt_ms))
+        self._last_sample = (start, down_mbps, up_mbps, rtt_ms)
+        if self._shm:
+            self._shm.publish(start, down_mbps, up_mbps, rtt_ms)
+        if self._ipc:
+            self._ipc.publish(self._sample_message(self._last_sample))
+        if self._telemetry:
+            self._telemetry.add_sample(start, down_mbps, up_mbps, rtt_ms)
+        if self._microburst:
+            self._report_microbursts(self._microburst.last_summary)
 
-            # Log new peaks with a small threshold to avoid noise
-            if up_mbps > self._max_up_seen and up_mbps >= 1.0:
-                self._max_up_seen = up_mbps
-                info(f"[NET] New upstream peak {up_mbps:.2f} Mb/s")
+        if hasattr(self, "tray") and self.tray:
+            self.tray.update_rate(down_mbps, up_mbps, dropped)
 
-            if down_mbps > self._max_down_seen and down_mbps >= 1.0:
-                self._max_down_seen = down_mbps
-                info(f"[NET] New downstream peak {down_mbps:.2f} Mb/s")
+        self.ui_call(self._render_sample, down_mbps, up_mbps, dropped)
 
-            self.last_bytes_sent = new_sent
-            self.last_bytes_recv = new_recv
 
-            # Ping for this tick
-            ok = self._ping_once()
-            dropped = not ok
+    def _raise_anomalies(self, alerts: list[Alert]) -> None:
+        """
+        Deliver anomaly transitions like rule alerts and refresh the tray flag.
+        """
+        if not alerts:
+            return
+        for alert in alerts:
+            self._alert_dispatcher.submit(alert)
+        self.state.update(anomaly=self._anomaly.status())
 
-            # Ping state edge logging
-            if ok and not self._last_ping_ok:
-                info("[NET] Ping restored")
-            elif not ok and self._last_ping_ok:
-                info("[NET] Ping dropped")
-            self._last_ping_ok = ok
 
-            # Append series
-            self.upload_speeds.append(up_mbps)
-            self.download_speeds.append(down_mbps)
-            self.ping_loss.append(dropped)
+    def _anomaly_speedtest(self, ts: float, down_mbps: float, up_mbps: float) -> None:
+        if self._anomaly:
+            self._raise_anomalies(self._anomaly.feed_speedtest(ts, down_mbps, up_mbps))
 
-            # Keep last 10 samples
-            for arr in (self.upload_speeds, self.download_speeds, self.ping_loss):
-                if len(arr) > 10:
-                    arr.pop(0)
 
-            # Update labels
-            self.lbl_down_val.config(text=f"{down_mbps:.2f}")
-            self.lbl_up_val.config(text=f"{up_mbps:.2f}")
+    async def _flush_telemetry(self) -> None:
+        if not self._telemetry.resolved:
+            await self.runtime.run_blocking(self._telemetry.resolve, pool="housekeeping")
+        self._telemetry.flush()
 
-            # Redraw
-            self.draw_graph()
 
-            # Pace to ~1s
-            elapsed = time.time() - start
-            time.sleep(max(0.0, 1.0 - elapsed))
+    async def _save_sketches(self) -> None:
+        try:
+            files = self._sketches.snapshot()
+            if files:
+                await self.runtime.run_blocking(write_snapshot, files, self._sketches.directory, pool="housekeeping")
+        except Exception as exc:
+            warn(f"[APP] Saving percentile sketches failed ({exc})")
 
 
-    def draw_graph(self) -> None:
+    async def _seal_history(self) -> None:
+        try:
+            sealed = await self.runtime.run_blocking(seal_history, self._history.open_day, pool="housekeeping")
+            if sealed:
+                info(f"[APP] Sealed {sealed} history day file(s) into compressed archives")
+        except Exception as exc:
+            warn(f"[APP] History sealing failed ({exc})")
+
+
+    def _usage_tick(self) -> None:
         """
-        Draw two polylines (download top, upload bottom). Red segment indicates ping loss.
+        Account per-interface byte deltas; quota warnings go through the
+        alert dispatcher like rule alerts.
         """
-        self.canvas.delete("all")
+        try:
+            for alert in self._usage.update(time.time(), self._counters.read_interfaces()):
+                self._alert_dispatcher.submit(alert)
+        except Exception:
+            pass
 
-        # Base scale on max of both series
-        max_speed = max(self.download_speeds + self.upload_speeds + [1.0])
 
-        def draw_line(data: list[float], loss_flags: list[bool], base_color: str, offset_y: int) -> None:
-            n = len(data)
-            if n < 2:
-                return
+    async def _save_anomaly(self) -> None:
+        await self.runtime.run_blocking(self._anomaly.write, self._anomaly.snapshot(), pool="housekeeping")
 
-            half = self.graph_height // 2
 
-            # Map points
-            pts: list[tuple[float, float]] = []
-            for i, val in enumerate(data):
-                x = i * (self.graph_width / 9.0)  # 10 samples -> 9 segments
-                y = (half - (val / max_speed) * (half - 2)) + offset_y
-                pts.append((x, y))
+    async def _save_usage(self) -> None:
+        try:
+            data = self._usage.snapshot()
+            if data is not None:
+                await self.runtime.run_blocking(self._usage.write, data, pool="housekeeping")
+        except Exception as exc:
+            warn(f"[APP] Saving data usage failed ({exc})")
 
-            # Draw segments individually (color per-segment)
-            for i in range(1, n):
-                x0, y0 = pts[i - 1]
-                x1, y1 = pts[i]
-                seg_color = "red" if (i < len(loss_flags) and loss_flags[i]) else base_color
-                self.canvas.create_line(x0, y0, x1, y1, fill=seg_color, width=2)
+
+    def _render_sample(self, down_mbps: float, up_mbps: float, dropped: bool) -> None:
+        """
+        Tk side of a tick: append to the graph series, update labels, redraw.
+        """
+        # Append series (a window change requested from the tray applies here)
+        if self._pending_graph_window is not None:
+            self._build_graph_series(self._pending_graph_window)
+            self._pending_graph_window = None
+        self.download_series.append(down_mbps, dropped)
+        self.upload_series.append(up_mbps, dropped)
+
+        # Update labels (no-op when the formatted text did not change)
+        self._render.set_text(self.lbl_down_val, f"{down_mbps:.2f}")
+        self._render.set_text(self.lbl_up_val, f"{up_mbps:.2f}")
+
+        # Redraw
+        self.draw_graph()
+
+
+    def _log_tick_event(self, name: str, value: Any) -> None:
+        """
+        Text + structured log line for a sampler transition.
+        """
+        if name == "peak_up":
+            info(f"[NET] New upstream peak {value:.2f} Mb/s")
+        elif name == "peak_down":
+            info(f"[NET] New downstream peak {value:.2f} Mb/s")
+        elif name == "ping_restore":
+            info("[NET] Ping restored")
+        elif name == "ping_drop":
+            info("[NET] Ping dropped")
+        event(name, None if value is None else round(value, 3 if name.startswith("peak") else 1))
+
+
+    def _set_microburst_thresholds(self, speedtest: Dict[str, Any] | None) -> None:
+        """
+        Saturation thresholds: explicit config values, else a ratio of the
+        last speedtest result.
+        """
+        if not self._microburst:
+            return
+        settings = self._microburst_settings
+        ratio = settings["saturation_ratio"]
+        down = settings["down_threshold_mbps"]
+        up = settings["up_threshold_mbps"]
+        if speedtest:
+            down = down if down is not None else ratio * float(speedtest.get("down_mbps") or 0)
+            up = up if up is not None else ratio * float(speedtest.get("up_mbps") or 0)
+        self._microburst.set_thresholds(down, up)
+
+
+    def _report_microbursts(self, summary: BurstSummary | None) -> None:
+        """
+        Log the latest per-second capture summary if it saw bursts.
+        """
+        if summary is None or summary.ts == self._last_burst_ts:
+            return
+        self._last_burst_ts = summary.ts
+        if summary.bursts:
+            info(
+                f"[NET] Microbursts={summary.bursts} down peak {summary.down_peak_mbps:.1f} Mb/s "
+                f"(x{summary.down_peak_to_mean:.1f} mean, {summary.down_above_ms:.0f} ms saturated) "
+                f"up peak {summary.up_peak_mbps:.1f} Mb/s (x{summary.up_peak_to_mean:.1f} mean, {summary.up_above_ms:.0f} ms saturated)"
+            )
+            event("microburst", {k: round(v, 3) for k, v in summary._asdict().items()})
+
+
+    def _build_graph_series(self, window: int) -> None:
+        """
+        (Re)create the download/upload series for a `window`-second graph and
+        backfill them from on-disk history so long windows start populated.
+        """
+        # About one point per pixel of canvas width
+        self.download_series = DecimatedSeries(window, self.graph_width, self._graph_mode)
+        self.upload_series = DecimatedSeries(window, self.graph_width, self._graph_mode)
+        if window <= 10:
+            return
+        try:
+            now = time.time()
+            for _, down, up, rtt in iter_samples(now - window, now):
+                lost = rtt != rtt  # NaN marks a lost ping
+                self.download_series.append(down, lost)
+                self.upload_series.append(up, lost)
+        except Exception:
+            pass
+
+
+    def set_graph_window(self, seconds: int) -> None:
+        """
+        Switch the graph time window (persisted). Safe to call from any thread;
+        the series are rebuilt when the next tick is rendered.
+        """
+        window = config_set_graph_window(seconds)
+        self._pending_graph_window = window
+        self.state.update(graph_window=window)
+        info(f"[APP] Graph window set to {window}s ({self._graph_mode})")
+        event("graph_window", window, mode=self._graph_mode)
+
+
+    def draw_graph(self) -> None:
+        """
+        Draw two polylines (download top, upload bottom). Red segment indicates ping loss.
+
+        Series are pre-decimated to about one point per pixel (min/max or LTTB
+        buckets), so a 1 h window costs about as much as 10 s. Segments are
+        snapped to whole pixels and handed to the render cache, so only items
+        whose position or color changed are touched on the canvas.
+        """
+        # Base scale on max of both series
+        max_speed = max(self.download_series.peak(), self.upload_series.peak(), 1.0)
+        width, height = self.graph_width, self.graph_height
 
         # Download and Upload lines
-        draw_line(self.download_speeds, self.ping_loss, "lime", 0)
-        draw_line(self.upload_speeds, self.ping_loss, "cyan", self.graph_height // 2)
+        self._render.draw_segments(
+            self.canvas, "down", graph_segments(self.download_series.points(), max_speed, width, height, "lime", 0)
+        )
+        self._render.draw_segments(
+            self.canvas, "up", graph_segments(self.upload_series.points(), max_speed, width, height, "cyan", height // 2)
+        )
 
     # ---------- App lifecycle / tray helpers ----------
 
-    def _on_close(self) -> None:
-        """Stop loop and destroy the window."""
+    def close(self) -> None:
+        """
+        Stop every background activity and destroy the window.
+
+        Cancels the root token (which kills any ping/speedtest child process),
+        stops the runtime and joins the remaining threads, waiting at most
+        SHUTDOWN_TIMEOUT_SEC in total. Must run on the Tk main thread.
+        """
         section("App exit")
-        self._run = False
-        self._hover_guard_active = False
+        stats = self._render.stats()
+        info(f"[RENDER] Tk updates applied={stats['applied']} skipped={stats['skipped']}")
+        started = time.monotonic()
+        self._stop.cancel()
+        if self._ipc:
+            self._ipc.stop()
+        self._hover.stop()
+        runtime_stopped = self.runtime.stop(SHUTDOWN_TIMEOUT_SEC)
+        for thread in self._threads:
+            thread.join(max(0.0, SHUTDOWN_TIMEOUT_SEC - (time.monotonic() - started)))
+        lingering = sum(1 for t in self._threads if t.is_alive()) + (0 if runtime_stopped else 1)
+        if not lingering:
+            self._usage.checkpoint()
+            if self._anomaly:
+                self._anomaly.save()
+            if self._telemetry:
+                self._telemetry.close()
+            self._sketches.save()
+            self._history.close()
+            self._counters.close()
+            if self._shm:
+                self._shm.close()
+        info(f"[APP] Background stopped in {(time.monotonic() - started) * 1000:.0f} ms (lingering={lingering})")
+        event("app_exit", lingering=lingering)
+        close_structured_log()
         self.root.destroy()
 
 
+    def _sample_message(self, sample: tuple[float, float, float, float | None]) -> Dict[str, Any]:
+        """
+        Compact IPC form of one sample: {"t", "d", "u", "r"}.
+        """
+        ts, down_mbps, up_mbps, rtt_ms = sample
+        return {
+            "t": round(ts, 3),
+            "d": round(down_mbps, 3),
+            "u": round(up_mbps, 3),
+            "r": None if rtt_ms is None else round(rtt_ms, 1),
+        }
+
+
+    async def _ipc_status(self, _request: Dict[str, Any]) -> Dict[str, Any]:
+        speedtest = await self.runtime.run_blocking(config_get_speedtest, None)
+        snapshot = self.state.snapshot()
+        sample = self._last_sample
+        return {
+            "version": APP_VERSION,
+            "sample": self._sample_message(sample) if sample else None,
+            "opacity": snapshot.opacity,
+            "graph_window": snapshot.graph_window,
+            "speedtest_running": snapshot.speedtest_running,
+            "speedtest": speedtest,
+            "microburst": self._microburst.last_summary._asdict() if self._microburst and self._microburst.last_summary else None,
+            "usage": self._usage.summary(),
+            "anomaly": snapshot.anomaly,
+            "telemetry": {"sent": self._telemetry.sent, "dropped": self._telemetry.dropped} if self._telemetry else None,
+        }
+
+
+    async def _ipc_percentiles(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        {"metric": "down"|"up"|"rtt", "days": 30} or {"from": ts, "to": ts},
+        optional "q": [0.5, 0.95, ...] -> {"count", "mean", "p50", ...}.
+        The range is clamped to the KEEP_MONTHS the sketch files are kept;
+        month files not read yet are loaded on the worker pool.
+        """
+        metric = request.get("metric", "down")
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+        now = time.time()
+        earliest = now - KEEP_MONTHS * 31 * 86400.0
+        end = request.get("to")
+        end = None if end is None or float(end) >= now else max(earliest, float(end))
+        start = request.get("from")
+        if start is None:
+            start = (now if end is None else end) - float(request.get("days", 30)) * 86400.0
+        start = max(earliest, float(start))
+        qs = [float(q) for q in request.get("q", DEFAULT_QUANTILES)]
+        missing = self._sketches.missing_months(start, end)
+        if missing:
+            self._sketches.add_months(await self.runtime.run_blocking(self._sketches.read_months, missing))
+        result = self._sketches.percentiles(metric, start, end, qs)
+        return {"metric": metric, **result}
+
+
+    def _ipc_speedtest(self, _request: Dict[str, Any]) -> Dict[str, Any]:
+        started = not self._gate.running and not self._stop.cancelled
+        if started:
+            self.run_speedtest_now(manual=True)
+        return {"started": started}
+
+
+    def _ipc_opacity(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        target = max(0.40, min(1.00, float(request["value"])))
+        self.set_opacity(target)
+        return {"opacity": target}
+
+
     def ui_call(self, func: Callable[..., None], *args: Any, **kwargs: Any) -> None:
         """
         Schedule a callable to run on the Tk main thread.
         Safe to call from other threads.
         """
-        self.root.after(0, lambda: func(*args, **kwargs))
+        self._after(0, lambda: func(*args, **kwargs))
+
+
+    def _after(self, ms: int, func: Callable[[], None]) -> Any:
+        """
+        `root.after` that is counted by the self-monitor.
+        """
+        self.selfmon.count_after()
+        return self.root.after(ms, func)
 
 
     def show_window(self) -> None:
@@ -372,13 +800,15 @@ class NetSpeedWidget:
         def _apply():
             # persist then apply
             self.opacity = config_set_opacity(target)
+            self.state.update(opacity=self.opacity)
             try:
                 self.root.attributes("-alpha", self.opacity)
                 info(f"[APP] Opacity set to {self.opacity:.2f}")
+                event("opacity", round(self.opacity, 2))
             except Exception:
                 pass
 
-        self.root.after(0, _apply)
+        self._after(0, _apply)
 
 
     def _apply_saved_speedtest_labels(self) -> None:
@@ -402,34 +832,79 @@ class NetSpeedWidget:
         st = config_get_speedtest(None)
         if not st:
             return "Speedtest: --"
-        return f"Speedtest: {st['down_mbps']:.1f}↓ | {st['up_mbps']:.1f}↑ Mb/s"
+        return self._speedtest_summary_line(st)
+
 
+    def _speedtest_summary_line(self, st: Dict[str, Any]) -> str:
+        line = f"Speedtest: {st['down_mbps']:.1f}↓ | {st['up_mbps']:.1f}↑ Mb/s"
+        latency = st.get("latency")
+        if isinstance(latency, dict) and latency.get("grade"):
+            line += f" | bloat {latency['grade']} (+{latency['added_ms']:.0f} ms)"
+        return line
 
-    def _speedtest_scheduler_loop(self) -> None:
+
+    def _schedule_speedtest(self) -> None:
+        """
+        Arm a single runtime timer for the gate's next due time, replacing
+        any earlier one. No polling: the loop sleeps until it fires.
         """
-        Background scheduler that triggers speedtests on schedule.
+        if self._speedtest_timer is not None:
+            self._speedtest_timer.cancel()
+        self._speedtest_timer = self.runtime.call_at_wall(self._gate.next_due, self._on_speedtest_due)
 
-        Every 5 seconds it checks the due time. If no speedtest is running and the
-        due time has passed, it calls `run_speedtest_now(manual=False)`.
+
+    def _on_speedtest_due(self) -> None:
+        if self._gate.due(time.time()):
+            self._start_speedtest(manual=False)
+        elif not self._gate.running:
+            self._schedule_speedtest()  # woke early (clock change); re-arm
+
+
+    def _selfmon_tick(self) -> None:
         """
-        while getattr(self, "_run", True):
-            try:
-                now = time.time()
-                if not self._speedtest_running and now >= self._speedtest_next_due:
-                    self.run_speedtest_now(manual=False)
-            except Exception:
-                pass
-            time.sleep(5)
+        Sample the widget's own footprint every `interval_sec`, log it, warn
+        on exceeded budgets and publish the lines for the tray diagnostics view.
+        """
+        try:
+            sample = self.selfmon.sample()
+            lines = format_sample(sample)
+            info("[SELF] " + " | ".join(lines))
+            for message in self.selfmon.check_budgets(sample):
+                warn(f"[SELF] Budget exceeded: {message}")
+                event("budget_exceeded", message)
+            self.state.update(diagnostics=tuple(lines))
+        except Exception:
+            pass
+
+
+    def toggle_alloc_tracking(self) -> None:
+        """
+        Start tracemalloc, or stop it and log the peak. Safe from any thread.
+        """
+        if self.selfmon.tracing:
+            peak = self.selfmon.stop_tracemalloc()
+            info(f"[SELF] tracemalloc stopped, peak={peak or 0.0:.2f} MB")
+        else:
+            self.selfmon.start_tracemalloc()
+            info("[SELF] tracemalloc started")
+        self.state.update(alloc_tracking=self.selfmon.tracing)
 
 
     def run_speedtest_now(self, manual: bool = True) -> None:
         """
-        Launch a speedtest on a worker thread.
+        Request a speedtest. Safe from any thread (tray, IPC); the run is
+        started on the runtime loop, which owns the speedtest gate.
+        """
+        self.runtime.call_soon(self._start_speedtest, manual)
+
+
+    def _start_speedtest(self, manual: bool) -> None:
+        """
+        Claim the gate and launch a speedtest on the worker pool (loop thread).
         """
         section("Speedtest run (manual)" if manual else "Speedtest run (scheduled)")
-        if self._speedtest_running:
+        if self._stop.cancelled or not self._gate.try_start():
             return
-        self._speedtest_running = True
 
         # On manual trigger, reset the small labels to placeholders for a fresh look
         if manual:
@@ -446,104 +921,293 @@ class NetSpeedWidget:
             except Exception:
                 pass
 
-        # Spawn the background worker that performs the actual speed test
-        thread = threading.Thread(target=self._speedtest_worker, daemon=True)
-        thread.start()
+        # Run the actual speed test on the worker pool
+        self._speedtest_token = self._stop.child(SPEEDTEST_BUDGET_SEC)
+        self.runtime.loop.create_task(self._speedtest_run(self._speedtest_token))
 
 
-    def _speedtest_worker(self) -> None:
+    async def _speedtest_run(self, token: CancelToken) -> None:
+        try:
+            await self.runtime.run_blocking(self._speedtest_worker, token)
+        finally:
+            self._gate.finish(time.time())
+            self._schedule_speedtest()
+
+
+    def _speedtest_worker(self, token: CancelToken) -> None:
         """
         Measure, persist, update UI, and notify the tray.
+        Nothing is persisted if the run is cancelled.
+
+        Latency probes run alongside: an idle baseline first, then through
+        the phases the provider reports (see `_latency_phase`).
         """
+        probe = LatencyProbe(*self._latency_target(), token)
+        self._latency_probe = probe
         try:
-            down_mbps, up_mbps = self._measure_speed()
-            saved_speedtest = config_set_speedtest(down_mbps, up_mbps)
+            probe.start()
+            if token.wait(IDLE_BASELINE_SEC):
+                raise Cancelled()
+            down_mbps, up_mbps = self._measure_speed(token)
+            probe.stop()
+            latency = probe.result()
+            token.raise_if_cancelled()
+            saved_speedtest = config_set_speedtest(down_mbps, up_mbps, latency=latency)
+            append_speedtest(saved_speedtest)
+            self.runtime.call_soon(self._rules.set_reference, down_mbps, up_mbps)
+            self._set_microburst_thresholds(saved_speedtest)
+            if hasattr(self, "tray") and self.tray:
+                self.tray.set_rate_scale(down_mbps)
+            self.runtime.call_soon(self._anomaly_speedtest, saved_speedtest["ts"], down_mbps, up_mbps)
+            if self._telemetry:
+                self.runtime.call_soon(
+                    self._telemetry.add_speedtest, saved_speedtest["ts"], down_mbps, up_mbps, latency["added_ms"] if latency else None
+                )
             self._update_speedtest_ui(down_mbps, up_mbps)
             info(f"[SPEEDTEST] Result: down={down_mbps:.2f} Mb/s, up={up_mbps:.2f} Mb/s")
-            self._notify_tray(f"Speedtest: {saved_speedtest['down_mbps']:.1f}↓ | {saved_speedtest['up_mbps']:.1f}↑ Mb/s")
+            if latency:
+                loaded = " ".join(f"{k[:-3]}={v:.0f}" for k, v in latency.items() if k.endswith("_ms") and k not in ("idle_ms", "added_ms"))
+                info(f"[SPEEDTEST] Latency idle={latency['idle_ms']:.0f} {loaded} ms, +{latency['added_ms']:.0f} ms under load, bufferbloat {latency['grade']}")
+            event("speedtest", {"down_mbps": round(down_mbps, 3), "up_mbps": round(up_mbps, 3), "latency": latency})
+            self._notify_tray(self._speedtest_summary_line(saved_speedtest))
+        except Cancelled:
+            warn("[SPEEDTEST] Cancelled (shutdown or time budget exceeded)")
+            event("speedtest_cancelled")
+            if not self._stop.cancelled:
+                self._notify_tray("Speedtest: timed out")
         except Exception:
+            event("speedtest_failed")
             self._notify_tray("Speedtest: failed")
         finally:
-            self._speedtest_running = False
-            self._speedtest_next_due = time.time() + SPEEDTEST_INTERVAL_SEC
+            self._latency_probe = None
+            probe.stop()
             self._stop_tray_spinner()
 
 
-    def _measure_speed(self) -> tuple[float, float]:
+    def _latency_target(self) -> tuple[str, int]:
+        """
+        Host for loaded-latency probes: the native tester's server when
+        configured (same path as the load), else PING_HOST.
+        """
+        endpoint = get_throughput_endpoint()
+        if endpoint:
+            try:
+                url = Endpoint(endpoint["download_url"])
+                return url.host, url.port
+            except Exception:
+                pass
+        return PING_HOST, LATENCY_PROBE_PORT
+
+
+    def _latency_phase(self, phase: str | None) -> None:
+        """
+        Providers report their load phase here ("download", "upload", or
+        "loaded" when they can't tell); None pauses the probes.
+        """
+        probe = self._latency_probe
+        if probe:
+            probe.set_phase(phase)
+
+    def _measure_speed(self, token: CancelToken) -> tuple[float, float]:
         """
         Try providers in order and return the first successful (down, up) in Mb/s.
+
+        The overall budget is split across the remaining providers: each gets
+        an equal share of what is left, so time a fast provider does not use
+        rolls over to the fallbacks.
         """
-        for provider in (self._measure_fast_cli, self._measure_python_speedtest, self._measure_passive_estimate):
-            result = self._safe(provider)
+        providers = [self._measure_fast_cli, self._measure_python_speedtest, self._measure_passive_estimate]
+        if get_throughput_endpoint():
+            providers.insert(0, self._measure_native_throughput)
+        for index, provider in enumerate(providers):
+            token.raise_if_cancelled()
+            if self._latency_probe:
+                self._latency_probe.reset_loaded()  # keep only the successful provider's phases
+            remaining = token.remaining()
+            share = remaining / (len(providers) - index) if remaining is not None else None
+            result = self._safe(provider, token.child(share))
             if result is not None:
+                self._latency_phase(None)
                 return result
+        token.raise_if_cancelled()
         raise RuntimeError("All speed providers failed")
 
 
-    def _measure_fast_cli(self) -> tuple[float, float] | None:
+    def _measure_native_throughput(self, token: CancelToken) -> tuple[float, float] | None:
+        """
+        Measure with the built-in asyncio multi-stream tester against the
+        endpoint configured under `throughput` in config.json.
+
+        With "streams": "auto" (the default) each direction starts at the
+        count saved for the current network and ramps while more streams
+        still pay off (see `net.autotune`); the chosen counts are saved.
+        """
+        endpoint = get_throughput_endpoint()
+        if not endpoint:
+            return None
+        network = None
+        if endpoint["streams"] is None:
+            network = network_identity()
+            saved = get_stream_tuning(network, "native")
+            down_streams, down_ramp = ramp_start(saved, "download")
+            up_streams, up_ramp = ramp_start(saved, "upload")
+            info(f"[SPEEDTEST] Backend: native (auto streams on {network or 'unknown network'}: "
+                 f"down {down_streams}{'+' if down_ramp else ''}, up {up_streams}{'+' if up_ramp else ''}) "
+                 f"{endpoint['download_url']}")
+        else:
+            down_streams = up_streams = endpoint["streams"]
+            down_ramp = up_ramp = False
+            info(f"[SPEEDTEST] Backend: native ({endpoint['streams']} streams) {endpoint['download_url']}")
+        try:
+            result = run_throughput_test(
+                endpoint["download_url"], endpoint["upload_url"], token,
+                streams=down_streams, upload_streams=up_streams,
+                max_streams=MAX_STREAMS if down_ramp else None,
+                max_upload_streams=MAX_STREAMS if up_ramp else None,
+                on_phase=self._latency_phase, loop=self.runtime.loop,
+            )
+        except Cancelled:
+            warn("[SPEEDTEST] native tester cancelled, trying next backend")
+            return None
+        except Exception as exc:
+            warn(f"[SPEEDTEST] native tester failed ({exc}), trying next backend")
+            return None
+        info(f"[SPEEDTEST] native warm-up down={result.down.warmup_sec:.1f}s up={result.up.warmup_sec:.1f}s "
+             f"streams down={result.down.streams} up={result.up.streams}")
+        if down_ramp or up_ramp:
+            set_stream_tuning(network, "native", result.down.streams, result.up.streams or up_streams)
+        return result.down.mbps, result.up.mbps
+
+
+    def _measure_fast_cli(self, token: CancelToken) -> tuple[float, float] | None:
         """
         Measure using fast.com via `fast` or `fast-cli`.
+        It runs both directions in one process, so latency probes cover the
+        whole run as one "loaded" phase.
         """
-        d_fast, u_fast = self._run_fast_cli()
+        self._latency_phase("loaded")
+        d_fast, u_fast = self._run_fast_cli(token)
         if d_fast is None or u_fast is None:
             warn(f"[SPEEDTEST] fast-cli unavailable, trying next backend")
             return None
         return float(d_fast), float(u_fast)
 
 
-    def _measure_python_speedtest(self) -> tuple[float, float] | None:
+    def _measure_python_speedtest(self, token: CancelToken) -> tuple[float, float] | None:
         """
         Measure using the `speedtest-cli` Python library via its in-process API.
 
         Converts bits per second to Mb/s. Threads/pre-allocation arguments are
-        attempted with fallbacks for older library versions.
+        attempted with fallbacks for older library versions; upload bodies are
+        streamed (see `_configure_speedtest`), so nothing is pre-allocated. The token is
+        passed as the library's shutdown event, so its transfer threads stop
+        when the run is cancelled or the provider's budget runs out. Thread
+        counts are tuned per network (see `_speedtest_threads`).
         """
         info("[SPEEDTEST] Backend: speedtest-cli (python module)")
         if _speedtest is None:
             warn(f"[SPEEDTEST] speedtest-cli unavailable, trying next backend")
             return None
         try:
-            tester = _speedtest.Speedtest()
+            try:
+                tester = _speedtest.Speedtest(shutdown_event=token.as_event())
+            except TypeError:
+                tester = _speedtest.Speedtest()
             tester.get_servers(None)
+            token.raise_if_cancelled()
             tester.get_best_server()
+            token.raise_if_cancelled()
             self._configure_speedtest(tester)
+            network = network_identity()
+            saved = get_stream_tuning(network, "speedtest")
 
+            self._latency_phase("download")
+            down_threads, down_ramped = self._speedtest_threads(tester, "download", saved, token)
             try:
-                tester.download(threads=8)
+                tester.download(threads=down_threads)
             except TypeError:
                 tester.download()
+            token.raise_if_cancelled()
 
+            self._latency_phase("upload")
+            up_threads, up_ramped = self._speedtest_threads(tester, "upload", saved, token)
             try:
-                tester.upload(threads=8, pre_allocate=True)
+                tester.upload(threads=up_threads, pre_allocate=False)
             except TypeError:
                 try:
-                    tester.upload(pre_allocate=True)
+                    tester.upload(pre_allocate=False)
                 except TypeError:
                     tester.upload()
+            token.raise_if_cancelled()
+
+            if down_ramped or up_ramped:
+                info(f"[SPEEDTEST] speedtest-cli threads on {network or 'unknown network'}: down={down_threads} up={up_threads}")
+                set_stream_tuning(network, "speedtest", down_threads, up_threads)
 
             result = tester.results.dict()  # bits per second
             down_mbps = float(result.get("download", 0.0)) / 1_000_000.0
             up_mbps   = float(result.get("upload",   0.0)) / 1_000_000.0
             return down_mbps, up_mbps
+        except Cancelled:
+            warn("[SPEEDTEST] speedtest-cli cancelled, trying next backend")
+            return None
         except Exception:
             warn(f"[SPEEDTEST] speedtest-cli unavailable, trying next backend")
             return None
 
 
-    def _measure_passive_estimate(self) -> tuple[float, float] | None:
+    def _speedtest_threads(self, tester, direction: str, saved: Dict[str, Any] | None, token: CancelToken) -> tuple[int, bool]:
+        """
+        (threads, ramped) for one speedtest-cli direction. A fresh count
+        saved for this network is used as is; otherwise short probes (the
+        library's own test cut to PROBE_SEC) double the thread count until
+        the rate plateaus. Libraries without a `threads` argument or time
+        limit config keep their defaults.
+        """
+        threads, ramp_needed = ramp_start(saved, direction)
+        if not ramp_needed:
+            return threads, False
+        try:
+            if direction == "download":
+                run = tester.download
+            else:
+                run = lambda threads: tester.upload(threads=threads, pre_allocate=False)
+            lengths = tester.config["length"]
+            full_length = lengths[direction]
+        except (AttributeError, KeyError, TypeError):
+            return DEFAULT_STREAMS, False
+        lengths[direction] = PROBE_SEC
+        try:
+            ramp = StreamRamp(threads)
+            trial = threads
+            while trial is not None:
+                trial = ramp.record(trial, run(threads=trial) / 1_000_000.0)
+                token.raise_if_cancelled()
+        except TypeError:
+            return DEFAULT_STREAMS, False
+        finally:
+            lengths[direction] = full_length
+        return ramp.streams, True
+
+
+    def _measure_passive_estimate(self, token: CancelToken) -> tuple[float, float] | None:
         """
         Estimate throughput by sampling OS network counters for ~10 seconds.
+        Reads the unwrapped source, so these reads stay out of a trace
+        recording (replay pairs each tick's counter read with its probe).
         """
-        info("[SPEEDTEST] Backend: psutil (fallback)")
+        counters = getattr(self._counters, "inner", self._counters)
+        info(f"[SPEEDTEST] Backend: {counters.name} counters (fallback)")
         current_time = time.time()
-        net_io_1 = psutil.net_io_counters()
-        while time.time() - current_time < 10 and getattr(self, "_run", True):
-            time.sleep(0.5)
-        net_io_2 = psutil.net_io_counters()
+        sent_1, recv_1 = counters.read()
+        while time.time() - current_time < 10:
+            if token.wait(0.5):
+                raise Cancelled()
+        sent_2, recv_2 = counters.read()
 
         elapsed_time = max(time.time() - current_time, 1e-6)
-        d_bytes = net_io_2.bytes_recv - net_io_1.bytes_recv
-        u_bytes = net_io_2.bytes_sent - net_io_1.bytes_sent
+        d_bytes = recv_2 - recv_1
+        u_bytes = sent_2 - sent_1
         down_mbps = (d_bytes * 8.0) / (elapsed_time * 1_000_000.0)
         up_mbps   = (u_bytes * 8.0) / (elapsed_time * 1_000_000.0)
         return down_mbps, up_mbps
@@ -560,6 +1224,20 @@ class NetSpeedWidget:
             pass
 
 
+    def _deliver_alert(self, alert: Alert) -> None:
+        """
+        Alert dispatcher handler: log every transition, pop a tray
+        notification when a rule fires.
+        """
+        if alert.firing:
+            warn(f"[ALERT] {alert.message}")
+            if hasattr(self, "tray") and self.tray:
+                self.tray.notify(alert.message)
+        else:
+            info(f"[ALERT] {alert.message}")
+        event("alert" if alert.firing else "alert_clear", round(alert.value, 4), rule=alert.rule)
+
+
     def _notify_tray(self, message: str) -> None:
         """
         Send a summary string to the tray if a tray controller is attached.
@@ -582,24 +1260,27 @@ class NetSpeedWidget:
                 pass
 
 
-    def _safe(self, fn):
+    def _safe(self, fn, *args):
         """
         This is a small helper for optional providers that can fail without
         affecting the overall flow.
         """
         try:
-            return fn()
+            return fn(*args)
         except Exception:
             return None
 
 
     def attach_tray(self, tray: Any) -> None:
         """
-        Attach a tray controller and push the current summary.
+        Attach a tray controller and push the current summary and live icon scale.
         """
         self.tray = tray
         try:
             self.tray.update_speedtest_summary(self._format_speedtest_summary())
+            saved = config_get_speedtest(None)
+            if saved:
+                self.tray.set_rate_scale(saved.get("down_mbps"))
         except Exception:
             pass
 
@@ -609,39 +1290,34 @@ class NetSpeedWidget:
         Bias speedtest-cli toward larger upload payloads on Windows.
 
         Larger chunks reduce under-reporting by saturating the pipe more consistently.
+        Bodies are streamed from one shared buffer (`net.upload`), so the sizes
+        don't translate into memory held by the widget.
         """
+        if not install_streaming_uploads(_speedtest):
+            warn("[SPEEDTEST] speedtest-cli internals changed; upload bodies are not streamed")
         try:
             config = tester.get_config()
             sizes = config.get("sizes", {})
-            sizes["upload"] = [
-                256 * 1024,
-                512 * 1024,
-                1 * 1024 * 1024,
-                2 * 1024 * 1024,
-                5 * 1024 * 1024,
-                10 * 1024 * 1024,
-                20 * 1024 * 1024,
-                30 * 1024 * 1024,
-            ]
-            sizes["upload_min"] = 256 * 1024
-            sizes["upload_max"] = 30 * 1024 * 1024
+            sizes["upload"] = list(SPEEDTEST_UPLOAD_SIZES)
+            sizes["upload_min"] = SPEEDTEST_UPLOAD_SIZES[0]
+            sizes["upload_max"] = SPEEDTEST_UPLOAD_SIZES[-1]
             config["sizes"] = sizes
             tester.config.update(config)
         except Exception:
             pass
 
-    def _run_fast_cli(self) -> tuple[float | None, float | None]:
+    def _run_fast_cli(self, token: CancelToken) -> tuple[float | None, float | None]:
         """
         Run fast.com via a bundled Node fast-cli first, then via PATH fallback.
         """
         spawn_kw = self._fast_spawn_settings()
-        data = self._run_node_bundle_fast(**spawn_kw) or self._run_path_fast(**spawn_kw)
+        data = self._run_node_bundle_fast(token, **spawn_kw) or self._run_path_fast(token, **spawn_kw)
         return self._parse_fast_result(data)
 
 
     def _fast_spawn_settings(self) -> dict:
         """
-        Build `subprocess.run` keyword args that suppress child windows on Windows.
+        Build `subprocess.Popen` keyword args that suppress child windows on Windows.
         """
         startupinfo = None
         creationflags = 0
@@ -653,9 +1329,10 @@ class NetSpeedWidget:
         return {"startupinfo": startupinfo, "creationflags": creationflags}
 
 
-    def _run_node_bundle_fast(self, **spawn_kw) -> dict | None:
+    def _run_node_bundle_fast(self, token: CancelToken, **spawn_kw) -> dict | None:
         """
         Execute the bundled `node.exe` + fast-cli `cli.js` with `--json`.
+        The child is killed if the token is cancelled.
         """
         info("[SPEEDTEST] Backend: fast-cli (bundled Node)")
         node_exe = resource_path(os.path.join("third_party", "node", "node.exe"))
@@ -668,8 +1345,9 @@ class NetSpeedWidget:
             return None
 
         try:
-            process = subprocess.run(
+            process = run_cancellable(
                 [node_exe, cli_js, "--upload", "--json"],
+                token,
                 cwd=bundle_cwd,
                 capture_output=True,
                 text=True,
@@ -682,9 +1360,10 @@ class NetSpeedWidget:
             return None
 
 
-    def _run_path_fast(self, **spawn_kw) -> dict | None:
+    def _run_path_fast(self, token: CancelToken, **spawn_kw) -> dict | None:
         """
         Execute `fast` or `fast-cli` from PATH with `--json`.
+        The child is killed if the token is cancelled.
         """
         info("[SPEEDTEST] Backend: fast-cli (PATH)")
         on_path = shutil.which("fast") or shutil.which("fast-cli")
@@ -692,8 +1371,9 @@ class NetSpeedWidget:
             return None
 
         try:
-            process = subprocess.run(
+            process = run_cancellable(
                 [on_path, "--upload", "--json"],
+                token,
                 capture_output=True,
                 text=True,
                 timeout=180,
@@ -746,23 +1426,16 @@ class NetSpeedWidget:
         return None
 
 
-    def _compute_next_speedtest_due(self) -> float:
+    def _make_speedtest_gate(self) -> SpeedtestGate:
         """
-        Compute the next epoch time for an automatic speedtest.
-
-        Policy:
-            - If a saved result exists with timestamp `ts`, schedule `ts + interval`.
-            - If that time is already past, apply a short startup grace.
-            - If no saved result exists, use the startup grace from now.
-
-        This prevents an immediate auto-run at startup while maintaining the cadence.
+        Speedtest gate seeded from the saved result's timestamp, if any
+        (see `SpeedtestGate` for the scheduling policy).
         """
-        now = time.time()
         speedtest = config_get_speedtest(None)
+        last_ts = None
         if speedtest and isinstance(speedtest, dict) and "ts" in speedtest:
-            due = float(speedtest["ts"]) + SPEEDTEST_INTERVAL_SEC
-            return due if due > now else now + SPEEDTEST_STARTUP_GRACE_SEC
-        return now + SPEEDTEST_STARTUP_GRACE_SEC
+            last_ts = float(speedtest["ts"])
+        return SpeedtestGate(SPEEDTEST_INTERVAL_SEC, SPEEDTEST_STARTUP_GRACE_SEC, last_ts, time.time())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+"""
+Compression and decode speed of the sealed history archive (`utils.archive`).
+
+Without an argument a deterministic synthetic day of 1 Hz samples is used
+(scheduler jitter on the timestamps, diurnal load with bursts and idle
+stretches, integer-ms pings with loss episodes); pass a raw history day
+file (`history/samples-YYYY-MM-DD.bin`) to measure real data. Every input
+is round-tripped bit-exactly first, together with edge cases (NaN, inf,
+signed zeros, denormals, clock jumps, single-sample blocks).
+
+    python -m benchmarks.bench_archive [samples-YYYY-MM-DD.bin]
+"""
+import io
+import math
+import random
+import sys
+import time
+
+from utils.archive import BLOCK_SAMPLES, ArchiveReader, ArchiveWriter
+from utils.history import RECORD
+
+DAY_SEC = 24 * 60 * 60
+REPEATS = 3
+
+
+def synthesize_day(seed: int = 7) -> list[tuple[float, float, float, float]]:
+    rng = random.Random(seed)
+    rows = []
+    start = 1_760_000_000.0 + rng.random()
+    loss_left = 0
+    for second in range(DAY_SEC):
+        ts = start + second + rng.gauss(0.0, 0.0003)
+        load = 0.5 + 0.5 * math.sin(2 * math.pi * second / DAY_SEC)
+        if rng.random() < 0.3:
+            down = up = 0.0
+        else:
+            down = rng.expovariate(1.0) * 20.0 * load
+            if rng.random() < 0.002:
+                down += rng.uniform(100.0, 400.0)
+            up = down * rng.uniform(0.05, 0.2)
+        if loss_left == 0 and rng.random() < 0.0005:
+            loss_left = rng.randint(2, 30)
+        rtt = math.nan if loss_left else float(rng.randint(12, 25))
+        loss_left = max(0, loss_left - 1)
+        rows.append((ts, down, up, rtt))
+    return rows
+
+
+def edge_cases() -> list[list[tuple[float, float, float, float]]]:
+    ts = 1_760_000_000.25
+    odd = [
+        (ts, math.nan, math.inf, -math.inf),
+        (ts, 0.0, -0.0, 1e-40),
+        (ts + 1e-6, 3.4e38, 1.0, 1.0),
+        (ts - 3600.0, 1.0, 1.0, 1.0),
+        (ts + 86400.0 * 365, 1.0, 2.0, math.nan),
+        (0.0, 0.0, 0.0, 0.0),
+        (-1.5, 1.0, 1.0, 1.0),
+    ]
+    return [[], odd[:1], odd, [(ts + i, 1.0, 1.0, 20.0) for i in range(BLOCK_SAMPLES + 1)]]
+
+
+def _encode(rows: list) -> bytes:
+    f = io.BytesIO()
+    writer = ArchiveWriter(f)
+    writer.write(rows)
+    writer.close()
+    return f.getvalue()
+
+
+def _decode(data: bytes) -> list:
+    return [row for chunk in ArchiveReader(io.BytesIO(data)).iter_chunks() for row in chunk]
+
+
+def _raw(rows: list) -> bytes:
+    return b"".join(RECORD.pack(*row) for row in rows)
+
+
+def _best(fn, *args) -> tuple[float, object]:
+    best, result = math.inf, None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            buf = f.read()
+        rows = list(RECORD.iter_unpack(buf[: len(buf) - len(buf) % RECORD.size]))
+        label = sys.argv[1]
+    else:
+        rows = synthesize_day()
+        label = "synthetic day"
+
+    for case in edge_cases() + [rows]:
+        if _raw(_decode(_encode(case))) != _raw(case):
+            print(f"Round trip FAILED for a {len(case)}-sample input")
+            return
+    print(f"Round trip bit-exact ({len(edge_cases())} edge cases + {label})")
+
+    raw = _raw(rows)
+    encode_sec, archive = _best(_encode, rows)
+    decode_sec, _ = _best(_decode, archive)
+    raw_sec, _ = _best(lambda: list(RECORD.iter_unpack(raw)))
+    reader = ArchiveReader(io.BytesIO(archive))
+    middle = rows[len(rows) // 2][0]
+    seek_sec, hour = _best(lambda: [r for c in reader.iter_chunks(middle, middle + 3600) for r in c])
+
+    n = len(rows)
+    print(f"{n} samples: raw {len(raw) / 1e6:.2f} MB -> archive {len(archive) / 1e6:.2f} MB "
+          f"({len(raw) / len(archive):.2f}x, {len(archive) / n:.2f} bytes/sample)")
+    print(f"encode  {n / encode_sec / 1e3:>8.0f} k samples/s")
+    print(f"decode  {n / decode_sec / 1e3:>8.0f} k samples/s  ({len(raw) / decode_sec / 1e6:.1f} MB/s of raw records)")
+    print(f"raw     {n / raw_sec / 1e3:>8.0f} k samples/s  (struct.iter_unpack, for reference)")
+    print(f"seek    {seek_sec * 1e3:>8.1f} ms for one hour ({len(hour)} samples) from the middle of the day")
+
+
+if __name__ == "__main__":
+    main()
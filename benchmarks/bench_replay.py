@@ -0,0 +1,78 @@
+"""
+Replays a day of 1 Hz traffic through the sampler, graph decimation,
+render cache and speedtest gate, for each graph window.
+
+Without an argument a deterministic synthetic day is generated first
+(diurnal load, bursts, ping-loss episodes); pass a recorded trace
+(`"trace_file"` in config.json) to replay real traffic instead.
+
+    python -m benchmarks.bench_replay [trace.nswt]
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+
+from utils.replay import replay
+from utils.trace import TraceRecorder
+
+DAY_SEC = 24 * 60 * 60
+WINDOWS = (10, 600, 3600)
+MODES = ("minmax",)  # the app default; add "lttb" to compare
+
+
+def synthesize_day(path: str, seconds: int = DAY_SEC, seed: int = 7) -> None:
+    """
+    Write a trace with counters/probe pairs at 1 s monotonic steps.
+    """
+    rng = random.Random(seed)
+    recorder = TraceRecorder(path)
+    sent = recv = 10_000_000_000
+    mono = 1000.0
+    loss_left = 0
+    recorder.counters(mono, sent, recv)
+    for second in range(seconds):
+        mono += 1.0
+        load = 0.5 + 0.5 * math.sin(2 * math.pi * second / DAY_SEC)
+        down = rng.expovariate(1.0) * 20.0 * load
+        if rng.random() < 0.002:
+            down += rng.uniform(100.0, 400.0)
+        up = down * rng.uniform(0.05, 0.2)
+        recv += int(down * 1_000_000 / 8)
+        sent += int(up * 1_000_000 / 8)
+        if loss_left == 0 and rng.random() < 0.0005:
+            loss_left = rng.randint(2, 30)
+        rtt = None if loss_left else 15.0 + rng.random() * 10.0
+        loss_left = max(0, loss_left - 1)
+        recorder.counters(mono, sent, recv)
+        recorder.probe(mono + 0.02, rtt)
+    recorder.close()
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        path, cleanup = sys.argv[1], False
+    else:
+        fd, path = tempfile.mkstemp(suffix=".nswt")
+        os.close(fd)
+        synthesize_day(path)
+        cleanup = True
+    try:
+        print(f"trace {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        for mode in MODES:
+            for window in WINDOWS:
+                result = replay(path, window=window, mode=mode)
+                print(
+                    f"{mode:<6} window={window:>5}s ticks={result.ticks} replay={result.elapsed_sec:6.2f}s "
+                    f"(x{result.speedup:,.0f} real time) speedtests={result.speedtests} "
+                    f"ping_drops={result.events.get('ping_drop', 0)} render ops={result.render_applied} "
+                    f"digest={result.digest[:12]}"
+                )
+    finally:
+        if cleanup:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
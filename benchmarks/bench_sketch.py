@@ -0,0 +1,89 @@
+"""
+Cost and accuracy of the long-range percentile sketches (`utils.sketch`).
+
+Feeds DAYS of synthetic 1 Hz samples ending now (diurnal load, idle
+stretches, bursts, ping loss) into a SketchStore in a temporary folder,
+saves and reloads it, then compares sketch percentiles against exact ones
+from the sorted raw values: relative error, query time warm (months
+loaded) and cold (including the file load), and the on-disk size. The
+exact baseline's sort time is what a query costs without sketches, before
+even reading the history files.
+
+    python -m benchmarks.bench_sketch
+"""
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from utils.sketch import DEFAULT_QUANTILES, RELATIVE_ACCURACY, SketchStore, write_snapshot
+
+DAYS = 30
+DAY_SEC = 24 * 60 * 60
+
+
+def synthesize(start: float, seconds: int, seed: int = 11):
+    rng = random.Random(seed)
+    loss_left = 0
+    for second in range(seconds):
+        load = 0.5 + 0.5 * math.sin(2 * math.pi * second / DAY_SEC)
+        if rng.random() < 0.3:
+            down = up = 0.0
+        else:
+            down = rng.expovariate(1.0) * 20.0 * load
+            if rng.random() < 0.002:
+                down += rng.uniform(100.0, 400.0)
+            up = down * rng.uniform(0.05, 0.2)
+        if loss_left == 0 and rng.random() < 0.0005:
+            loss_left = rng.randint(2, 30)
+        rtt = None if loss_left else rng.gauss(20.0, 3.0)
+        loss_left = max(0, loss_left - 1)
+        yield start + second, down, up, rtt
+
+
+def _exact(values: list[float], q: float) -> float:
+    return values[round(q * (len(values) - 1))]
+
+
+def main() -> None:
+    now = time.time()
+    start = now - DAYS * DAY_SEC
+    month_start = datetime.fromtimestamp(now).replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp()
+    directory = tempfile.mkdtemp(prefix="sketch-bench-")
+    store = SketchStore(directory)
+    rows = []
+    add_sec = 0.0
+    for row in synthesize(start, int(now - start)):
+        rows.append(row)
+        started = time.perf_counter()
+        store.add_sample(*row)
+        add_sec += time.perf_counter() - started
+    write_snapshot(store.snapshot(), directory)
+    disk = {name: os.path.getsize(os.path.join(directory, name)) for name in sorted(os.listdir(directory))}
+    print(f"{len(rows)} samples over {DAYS} days: add {add_sec / len(rows) * 1e6:.2f} us/sample; "
+          + ", ".join(f"{name} {size / 1e3:.0f} KB" for name, size in disk.items()))
+    print(f"target relative accuracy {RELATIVE_ACCURACY:.0%}; exact = nearest-rank over the sorted raw values")
+    print(f"{'range':<14} {'metric':<5} {'samples':>8} {'max rel err':>11} {'cold ms':>8} {'warm us':>8} {'sort ms':>8}")
+
+    for label, range_start in ((f"last {DAYS} days", start), ("month to date", month_start), ("last 24 h", now - DAY_SEC)):
+        for column, metric in ((1, "down"), (3, "rtt")):
+            started = time.perf_counter()
+            values = sorted(row[column] for row in rows if row[0] >= range_start and row[column] is not None)
+            sort_ms = (time.perf_counter() - started) * 1e3
+            started = time.perf_counter()
+            SketchStore(directory).percentiles(metric, range_start)
+            cold_ms = (time.perf_counter() - started) * 1e3
+            started = time.perf_counter()
+            result = store.percentiles(metric, range_start)
+            warm_us = (time.perf_counter() - started) * 1e6
+            error = max(
+                abs(result[f"p{q * 100:g}"] - _exact(values, q)) / _exact(values, q)
+                for q in DEFAULT_QUANTILES if _exact(values, q) > 0
+            )
+            print(f"{label:<14} {metric:<5} {result['count']:>8} {error:>11.2%} {cold_ms:>8.1f} {warm_us:>8.0f} {sort_ms:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
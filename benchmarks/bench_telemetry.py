@@ -0,0 +1,109 @@
+"""
+Loopback benchmark for the telemetry pipeline.
+
+Starts `net.aggregator` on localhost and replays a fleet of simulated
+senders (one datagram per host per flush, each a batch of 1 Hz samples)
+over UDP, paced in rounds so the socket buffer is not the bottleneck.
+Reports datagrams and records ingested per second of aggregator CPU, then
+checks a TCP sender end to end and the sender's drop-oldest bound.
+
+    python -m benchmarks.bench_telemetry
+"""
+import json
+import socket
+import time
+import urllib.request
+
+from net.aggregator import AggregatorThread
+from net.telemetry import RECORD, KIND_SAMPLE, TelemetrySender, encode_datagram
+
+HOSTS = (100, 1000, 5000)
+SITES = 20
+RECORDS_PER_DATAGRAM = 5   # FLUSH_SEC of 1 Hz samples
+ROUNDS = 20
+ROUND_SIZE = 200           # datagrams sent before yielding to the receiver
+
+
+def _datagrams(hosts: int, round_no: int) -> list[bytes]:
+    ts = time.time() + round_no * RECORDS_PER_DATAGRAM
+    out = []
+    for host in range(hosts):
+        name = f"site{host % SITES}/host{host}".encode("utf-8")
+        records = [
+            RECORD.pack(KIND_SAMPLE, ts + i, 10.0 + host % 50, 2.0, 12.0 + i if (host + i) % 97 else float("nan"))
+            for i in range(RECORDS_PER_DATAGRAM)
+        ]
+        out.append(encode_datagram(name, round_no + 1, records))
+    return out
+
+
+def _wait_for(thread: AggregatorThread, datagrams: int, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and thread.call(lambda: thread.aggregator.datagrams) < datagrams:
+        time.sleep(0.01)
+
+
+def _udp(hosts: int) -> None:
+    thread = AggregatorThread().start()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        rounds = [_datagrams(hosts, r) for r in range(ROUNDS)]
+        cpu_start = thread.call(time.thread_time)
+        started = time.perf_counter()
+        sent = 0
+        for datagrams in rounds:
+            for i in range(0, len(datagrams), ROUND_SIZE):
+                for datagram in datagrams[i:i + ROUND_SIZE]:
+                    sock.sendto(datagram, (thread.host, thread.port))
+                sent += len(datagrams[i:i + ROUND_SIZE])
+                _wait_for(thread, sent, timeout=0.5)
+        _wait_for(thread, sent)
+        wall = time.perf_counter() - started
+        cpu = thread.call(time.thread_time) - cpu_start
+        agg = thread.aggregator
+        with urllib.request.urlopen(f"http://{thread.host}:{thread.http_port}/sites?minutes=5") as response:
+            sites = json.loads(response.read())
+        print(f"{hosts:>6} {sent:>9} {agg.datagrams:>9} {agg.datagrams / max(cpu, 1e-9):>12.0f} "
+              f"{agg.records / max(cpu, 1e-9):>12.0f} {cpu / max(wall, 1e-9) * 100:>6.0f}% {len(sites):>6}")
+    finally:
+        sock.close()
+        thread.stop()
+
+
+def _tcp_and_backpressure() -> None:
+    thread = AggregatorThread().start()
+    try:
+        sender = TelemetrySender((thread.host, thread.port), "lab/tcp-sender", "tcp")
+        sender.resolve()
+        now = time.time()
+        for i in range(5000):
+            sender.add_sample(now + i, 50.0, 5.0, 10.0)
+            if i % 1000 == 999:
+                sender.flush()
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline and thread.call(lambda: thread.aggregator.records) < 5000:
+            sender.flush()
+            time.sleep(0.01)
+        sender.close()
+        time.sleep(0.1)  # let the aggregator see the connection close
+        print(f"TCP: {thread.aggregator.records} of 5000 records in {sender.sent} frames, dropped={sender.dropped}")
+
+        bounded = TelemetrySender((thread.host, thread.port), "lab/bounded", max_records=100)
+        for i in range(1000):
+            bounded.add_sample(now + i, 1.0, 1.0, None)
+        print(f"Bound: 1000 records into a 100-record buffer -> dropped={bounded.dropped} (oldest first)")
+        bounded.close()
+    finally:
+        thread.stop()
+
+
+def main() -> None:
+    print(f"UDP, {RECORDS_PER_DATAGRAM} records/datagram, {ROUNDS} rounds")
+    print(f"{'hosts':>6} {'sent':>9} {'ingested':>9} {'dgram/cpu-s':>12} {'rec/cpu-s':>12} {'core':>7} {'sites':>6}")
+    for hosts in HOSTS:
+        _udp(hosts)
+    _tcp_and_backpressure()
+
+
+if __name__ == "__main__":
+    main()
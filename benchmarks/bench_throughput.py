@@ -0,0 +1,112 @@
+"""
+Loopback benchmark for the native throughput tester.
+
+Starts `net.refserver` in a child process (optionally rate-shaped, which
+gives a known ground truth), runs the tester against it and reports the
+measured rate, its error vs. the shaped rate, and the tester's own CPU cost.
+
+A second table caps each connection as well (like a TCP window on a long
+path) and compares the old fixed 8 streams with the auto-tuned ramp
+(`net.autotune`), both from scratch and starting from the saved count:
+chosen streams, accuracy and wall time per test.
+
+    python -m benchmarks.bench_throughput
+"""
+import socket
+import subprocess
+import sys
+import time
+
+from net.autotune import MAX_STREAMS, MIN_STREAMS
+from net.throughput import run_throughput_test
+from utils.cancel import CancelToken
+
+RATES_MBPS = (50.0, 200.0, 800.0, None)
+STREAMS = (1, 4, 8)
+# (link Mb/s, per-stream cap Mb/s): fast fiber needing many streams, a mid
+# link, and a DSL line where two streams already fill it
+CAPPED_LINKS = ((2000.0, 150.0), (400.0, 60.0), (40.0, 25.0))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(port: int, rate_mbps: float | None, stream_mbps: float | None = None) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "net.refserver", "--port", str(port)]
+    if rate_mbps:
+        cmd += ["--rate-mbps", str(rate_mbps)]
+    if stream_mbps:
+        cmd += ["--stream-mbps", str(stream_mbps)]
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 5.0
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Reference server did not start")
+
+
+def main() -> None:
+    print(f"{'shaped':>10} {'streams':>7} {'down Mb/s':>10} {'err':>7} {'up Mb/s':>10} {'err':>7} {'cpu s/GB':>9}")
+    for rate in RATES_MBPS:
+        for streams in STREAMS:
+            # Fresh server per run: leftovers of a cancelled upload would
+            # otherwise still be draining through the shaper
+            port = _free_port()
+            server = _start_server(port, rate)
+            try:
+                base = f"http://127.0.0.1:{port}"
+                cpu_start = time.process_time()
+                result = run_throughput_test(
+                    f"{base}/download?bytes={{bytes}}", f"{base}/upload", CancelToken(),
+                    streams=streams, measure_sec=3.0, warmup_max_sec=2.0,
+                )
+                cpu = time.process_time() - cpu_start
+                moved_gb = (result.down.bytes + result.up.bytes) / 1e9
+                err_down = f"{(result.down.mbps / rate - 1) * 100:+.1f}%" if rate else "-"
+                err_up = f"{(result.up.mbps / rate - 1) * 100:+.1f}%" if rate else "-"
+                print(f"{rate or 'none':>10} {streams:>7} {result.down.mbps:>10.1f} {err_down:>7} "
+                      f"{result.up.mbps:>10.1f} {err_up:>7} {cpu / max(moved_gb, 1e-9):>9.3f}")
+            finally:
+                server.kill()
+                server.wait()
+
+    print()
+    print(f"{'link':>6} {'/stream':>7} {'mode':>6} {'streams':>9} {'down Mb/s':>10} {'err':>7} {'up Mb/s':>10} {'err':>7} {'time s':>7}")
+    for rate, stream_rate in CAPPED_LINKS:
+        tuned = {}
+        for mode in ("fixed", "ramp", "saved"):
+            if mode == "fixed":
+                kw = {"streams": 8}
+            elif mode == "ramp":
+                kw = {"streams": MIN_STREAMS, "max_streams": MAX_STREAMS, "max_upload_streams": MAX_STREAMS}
+            else:
+                kw = tuned  # what the ramp chose, as a later scheduled run would start
+            port = _free_port()
+            server = _start_server(port, rate, stream_rate)
+            try:
+                base = f"http://127.0.0.1:{port}"
+                started = time.perf_counter()
+                result = run_throughput_test(
+                    f"{base}/download?bytes={{bytes}}", f"{base}/upload", CancelToken(),
+                    measure_sec=3.0, warmup_max_sec=2.0, **kw,
+                )
+                elapsed = time.perf_counter() - started
+                if mode == "ramp":
+                    tuned = {"streams": result.down.streams, "upload_streams": result.up.streams}
+                print(f"{rate:>6.0f} {stream_rate:>7.0f} {mode:>6} {result.down.streams:>4}/{result.up.streams:<4} "
+                      f"{result.down.mbps:>10.1f} {(result.down.mbps / rate - 1) * 100:>+6.1f}% "
+                      f"{result.up.mbps:>10.1f} {(result.up.mbps / rate - 1) * 100:>+6.1f}% {elapsed:>7.1f}")
+            finally:
+                server.kill()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Per-tick cost of the live tray icon (`tray.sparkline`) in PIL.
+
+Feeds an hour of synthetic 1 Hz samples (idle stretches, steady
+downloads, bursts, ping-loss ticks) to each icon mode and reports the
+update cost per tick, how many ticks produced a new image, and the total
+including the ICO serialization pystray performs for every new image on
+Windows. A baseline redraws the sparkline with ImageDraw on every tick.
+
+    python -m benchmarks.bench_tray_icon
+"""
+import io
+import random
+import time
+
+from PIL import Image, ImageDraw
+
+from tray.sparkline import BAR_WIDTH, ICON_SIZE, LEVELS, SparklineIcon, quantize
+
+TICKS = 3600
+SCALE_MBPS = 200.0
+
+
+def synthesize(seed: int = 3) -> list[tuple[float, float, bool]]:
+    rng = random.Random(seed)
+    samples = []
+    rate = 0.0
+    for second in range(TICKS):
+        phase = (second // 300) % 4
+        if phase in (0, 2):
+            rate = 0.0 if rng.random() < 0.9 else rng.uniform(0.01, 0.3)
+        elif phase == 1:
+            rate = max(0.0, rng.gauss(60.0, 3.0))
+        else:
+            rate = rng.expovariate(1 / 30.0) + (rng.uniform(100, 180) if rng.random() < 0.02 else 0.0)
+        samples.append((rate, rate / 8.0, rng.random() < 0.005))
+    return samples
+
+
+class RedrawIcon:
+    """
+    Baseline: draw the same sparkline from scratch on every tick.
+    """
+
+    def __init__(self) -> None:
+        self.history = [0] * (ICON_SIZE // BAR_WIDTH)
+        self.regenerations = 0
+
+
+    def update(self, down_mbps: float, up_mbps: float, dropped: bool = False) -> Image.Image:
+        self.history = self.history[1:] + [quantize(down_mbps, SCALE_MBPS)]
+        image = Image.new("RGBA", (ICON_SIZE, ICON_SIZE), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for i, level in enumerate(self.history):
+            height = round(level * (ICON_SIZE - 1) / LEVELS)
+            if height:
+                x = i * BAR_WIDTH
+                draw.rectangle((x, ICON_SIZE - 1 - height, x + BAR_WIDTH - 1, ICON_SIZE - 2), fill=(0, 255, 0, 255))
+        draw.line((0, ICON_SIZE - 1, ICON_SIZE, ICON_SIZE - 1), fill=(90, 90, 90, 255))
+        self.regenerations += 1
+        return image
+
+
+def _run(icon, samples) -> tuple[float, float]:
+    update_sec = serialize_sec = 0.0
+    for down, up, dropped in samples:
+        started = time.perf_counter()
+        image = icon.update(down, up, dropped)
+        update_sec += time.perf_counter() - started
+        if image is not None:
+            started = time.perf_counter()
+            image.save(io.BytesIO(), format="ICO")
+            serialize_sec += time.perf_counter() - started
+    return update_sec, serialize_sec
+
+
+def main() -> None:
+    samples = synthesize()
+    print(f"{TICKS} ticks, {ICON_SIZE}x{ICON_SIZE} icon, {LEVELS} levels")
+    print(f"{'mode':<10} {'update us/tick':>14} {'new images':>10} {'total us/tick':>13}")
+    for name, icon in (
+        ("redraw", RedrawIcon()),
+        ("sparkline", SparklineIcon("sparkline", scale_mbps=SCALE_MBPS)),
+        ("bars", SparklineIcon("bars", scale_mbps=SCALE_MBPS)),
+    ):
+        update_sec, serialize_sec = _run(icon, samples)
+        print(f"{name:<10} {update_sec / TICKS * 1e6:>14.1f} {icon.regenerations:>10} "
+              f"{(update_sec + serialize_sec) / TICKS * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Memory benchmark for speedtest-cli upload payloads.
+
+Runs the library's own upload threads (8 in flight, the widget's configured
+sizes up to 30 MB) against `net.refserver` on loopback, once per payload
+mode, and reports the peak Python allocation seen by tracemalloc:
+
+    preallocated  stock bodies built before the test (upload(pre_allocate=True))
+    lazy          stock bodies built on first read (pre_allocate=False)
+    streaming     `net.upload` slices of one shared buffer
+
+It also checks that the streamed body is byte-identical to the stock one.
+The stock generator rounds its pattern count, so some sizes (30 MB among
+them) come out a few bytes short of their Content-Length and the request
+stalls until the socket timeout; streamed bodies are always exact.
+Needs speedtest-cli installed.
+
+    python -m benchmarks.bench_upload_memory
+"""
+import socket
+import threading
+import timeit
+import tracemalloc
+
+from net.refserver import ReferenceServerThread
+from net.upload import SPEEDTEST_UPLOAD_SIZES, streaming_upload_data
+
+THREADS = 8
+TIMEOUT_SEC = 30.0
+SOCKET_TIMEOUT_SEC = 3.0  # ends stalled short-body requests
+
+
+def _body(data) -> bytes:
+    out = bytearray()
+    while True:
+        chunk = data.read(8192)
+        if not chunk:
+            return bytes(out)
+        out += chunk
+
+
+def _run(module, data_class, url: str, pre_allocate: bool) -> tuple[int, int]:
+    """
+    Upload every size once; returns (bytes reported by the library, peak bytes).
+    """
+    tracemalloc.start()
+    try:
+        start = timeit.default_timer()
+        requests = []
+        for size in SPEEDTEST_UPLOAD_SIZES:
+            data = data_class(size, 0, TIMEOUT_SEC)
+            if pre_allocate:
+                data.pre_allocate()
+            requests.append((module.build_request(url, data, headers={"Content-length": size}), size))
+        slots = threading.Semaphore(THREADS)
+        uploaders = []
+        for i, (request, size) in enumerate(requests):
+            slots.acquire()
+            uploader = module.HTTPUploader(i, request, start, size, TIMEOUT_SEC)
+            original_run = uploader.run
+
+            def _run_and_release(run=original_run) -> None:
+                try:
+                    run()
+                finally:
+                    slots.release()
+
+            uploader.run = _run_and_release
+            uploader.start()
+            uploaders.append(uploader)
+        for uploader in uploaders:
+            uploader.join()
+        _, peak = tracemalloc.get_traced_memory()
+        return sum(u.result for u in uploaders), peak
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    try:
+        import speedtest
+    except ImportError:
+        print("speedtest-cli is not installed (pip install speedtest-cli)")
+        return
+
+    streaming = streaming_upload_data(speedtest)
+    for size in (1000, 100_003, SPEEDTEST_UPLOAD_SIZES[0]):
+        stock = speedtest.HTTPUploaderData(size, timeit.default_timer(), TIMEOUT_SEC)
+        if _body(stock) != _body(streaming(size, timeit.default_timer(), TIMEOUT_SEC)):
+            print(f"Body mismatch at {size} bytes")
+            return
+    print("Streamed bodies match the stock payload")
+
+    socket.setdefaulttimeout(SOCKET_TIMEOUT_SEC)
+    server = ReferenceServerThread().start()
+    try:
+        url = server.url("/upload")
+        total = sum(SPEEDTEST_UPLOAD_SIZES)
+        print(f"{len(SPEEDTEST_UPLOAD_SIZES)} uploads, {total / 2**20:.1f} MiB, {THREADS} threads")
+        print(f"{'mode':<13} {'uploaded MiB':>12} {'peak MiB':>9}")
+        for name, data_class, pre_allocate in (
+            ("preallocated", speedtest.HTTPUploaderData, True),
+            ("lazy", speedtest.HTTPUploaderData, False),
+            ("streaming", streaming, False),
+        ):
+            uploaded, peak = _run(speedtest, data_class, url, pre_allocate)
+            print(f"{name:<13} {uploaded / 2**20:>12.1f} {peak / 2**20:>9.2f}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
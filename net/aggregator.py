@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+from urllib.parse import parse_qs, urlsplit
+
+from net.telemetry import DEFAULT_PORT, FRAME_LENGTH, KIND_SAMPLE, KIND_SPEEDTEST, decode_datagram
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_HTTP_PORT = DEFAULT_PORT + 1
+ROLLUP_MINUTES = 60     # per-minute buckets kept per host
+DEFAULT_WINDOW_MIN = 5  # rollup window when a query doesn't give one
+STALE_SEC = 120.0       # hosts silent for longer are offline in site rollups
+
+
+class HostStats:
+    """
+    Everything kept for one sender: counters, the latest sample and
+    speedtest, and ROLLUP_MINUTES per-minute buckets
+    [minute, samples, down_sum, up_sum, down_max, up_max, rtt_sum, rtt_count].
+    Ingest is O(1) per record; memory is bounded per host.
+    """
+
+    __slots__ = ("name", "site", "last_seen", "last_seq", "datagrams", "lost_datagrams", "last_sample", "last_speedtest", "buckets")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.site = name.split("/", 1)[0] if "/" in name else "default"
+        self.last_seen = 0.0
+        self.last_seq: int | None = None
+        self.datagrams = 0
+        self.lost_datagrams = 0
+        self.last_sample: tuple[float, float, float, float] | None = None
+        self.last_speedtest: tuple[float, float, float, float] | None = None
+        self.buckets: deque[list] = deque(maxlen=ROLLUP_MINUTES)
+
+
+    def add_sample(self, ts: float, down: float, up: float, rtt: float) -> None:
+        minute = int(ts // 60)
+        buckets = self.buckets
+        if not buckets or minute > buckets[-1][0]:
+            buckets.append([minute, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0])
+        bucket = buckets[-1]  # late records land in the newest bucket
+        bucket[1] += 1
+        bucket[2] += down
+        bucket[3] += up
+        if down > bucket[4]:
+            bucket[4] = down
+        if up > bucket[5]:
+            bucket[5] = up
+        if rtt == rtt:  # not NaN
+            bucket[6] += rtt
+            bucket[7] += 1
+        if self.last_sample is None or ts >= self.last_sample[0]:
+            self.last_sample = (ts, down, up, rtt)
+
+
+    def _totals(self, now: float, minutes: int) -> tuple[int, float, float, float, float, float, int]:
+        """
+        (samples, down_sum, up_sum, down_max, up_max, rtt_sum, rtt_count) over the last `minutes`.
+        """
+        first = int(now // 60) - minutes + 1
+        n = rtt_n = 0
+        down_sum = up_sum = down_max = up_max = rtt_sum = 0.0
+        for bucket in reversed(self.buckets):
+            if bucket[0] < first:
+                break
+            n += bucket[1]
+            down_sum += bucket[2]
+            up_sum += bucket[3]
+            down_max = max(down_max, bucket[4])
+            up_max = max(up_max, bucket[5])
+            rtt_sum += bucket[6]
+            rtt_n += bucket[7]
+        return n, down_sum, up_sum, down_max, up_max, rtt_sum, rtt_n
+
+
+    def online(self, now: float) -> bool:
+        return now - self.last_seen <= STALE_SEC
+
+
+    def rollup(self, now: float, minutes: int) -> Dict[str, Any]:
+        n, down_sum, up_sum, down_max, up_max, rtt_sum, rtt_n = self._totals(now, minutes)
+        return {
+            "host": self.name,
+            "site": self.site,
+            "online": self.online(now),
+            "last_seen": round(self.last_seen, 3),
+            "samples": n,
+            "down_mean_mbps": round(down_sum / n, 3) if n else None,
+            "up_mean_mbps": round(up_sum / n, 3) if n else None,
+            "down_peak_mbps": round(down_max, 3),
+            "up_peak_mbps": round(up_max, 3),
+            "rtt_mean_ms": round(rtt_sum / rtt_n, 1) if rtt_n else None,
+            "loss": round(1.0 - rtt_n / n, 4) if n else None,
+            "datagrams": self.datagrams,
+            "lost_datagrams": self.lost_datagrams,
+            "last_speedtest": _speedtest_dict(self.last_speedtest),
+        }
+
+
+def _speedtest_dict(record: tuple[float, float, float, float] | None) -> Dict[str, Any] | None:
+    if record is None:
+        return None
+    ts, down, up, added = record
+    return {"ts": ts, "down_mbps": round(down, 2), "up_mbps": round(up, 2), "added_latency_ms": None if math.isnan(added) else round(added, 1)}
+
+
+class Aggregator:
+    """
+    Receives telemetry datagrams (see `net.telemetry`) over UDP and
+    length-framed TCP and serves rollups as JSON over HTTP:
+
+        GET /hosts[?minutes=N]            -> every host's rollup
+        GET /host?name=site/host[&minutes=N]
+        GET /sites[?minutes=N]            -> per-site rollups
+        GET /stats                        -> ingest counters
+
+    Everything runs on one event loop; `ingest` decodes a whole batch with
+    a single iter_unpack and touches only the sender's own state.
+    """
+
+    def __init__(self) -> None:
+        self.hosts: Dict[str, HostStats] = {}
+        self.datagrams: int = 0
+        self.records: int = 0
+        self.rejected: int = 0
+
+
+    def ingest(self, data: bytes | memoryview, now: float | None = None) -> bool:
+        try:
+            name, seq, records = decode_datagram(data)
+        except (ValueError, UnicodeDecodeError):
+            self.rejected += 1
+            return False
+        host = self.hosts.get(name)
+        if host is None:
+            host = self.hosts[name] = HostStats(name)
+        host.last_seen = time.time() if now is None else now
+        host.datagrams += 1
+        if host.last_seq is not None and host.last_seq < seq <= host.last_seq + 1000:
+            host.lost_datagrams += seq - host.last_seq - 1
+        host.last_seq = seq  # older or far-off sequence: sender restarted, resync
+        add_sample = host.add_sample
+        for kind, ts, a, b, c in records:
+            if kind == KIND_SAMPLE:
+                add_sample(ts, a, b, c)
+            elif kind == KIND_SPEEDTEST:
+                host.last_speedtest = (ts, a, b, c)
+        self.datagrams += 1
+        self.records += len(records)
+        return True
+
+
+    def host_rollups(self, minutes: int = DEFAULT_WINDOW_MIN, now: float | None = None) -> list[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        return [self.hosts[name].rollup(now, minutes) for name in sorted(self.hosts)]
+
+
+    def site_rollups(self, minutes: int = DEFAULT_WINDOW_MIN, now: float | None = None) -> list[Dict[str, Any]]:
+        """
+        Per site: hosts online, the sum of their latest rates (current site
+        load), sample-weighted means over the window and the worst host loss.
+        """
+        now = time.time() if now is None else now
+        sites: Dict[str, Dict[str, Any]] = {}
+        for host in self.hosts.values():
+            n, down_sum, up_sum, _, _, rtt_sum, rtt_n = host._totals(now, minutes)
+            site = sites.setdefault(host.site, {
+                "site": host.site, "hosts": 0, "online": 0, "down_now_mbps": 0.0, "up_now_mbps": 0.0,
+                "_n": 0, "_down": 0.0, "_up": 0.0, "_rtt": 0.0, "_rtt_n": 0, "worst_loss": 0.0,
+            })
+            site["hosts"] += 1
+            if host.online(now):
+                site["online"] += 1
+                if host.last_sample:
+                    site["down_now_mbps"] += host.last_sample[1]
+                    site["up_now_mbps"] += host.last_sample[2]
+            if n:
+                site["_n"] += n
+                site["_down"] += down_sum
+                site["_up"] += up_sum
+                site["_rtt"] += rtt_sum
+                site["_rtt_n"] += rtt_n
+                site["worst_loss"] = max(site["worst_loss"], round(1.0 - rtt_n / n, 4))
+        result = []
+        for name in sorted(sites):
+            site = sites[name]
+            n, rtt_n = site.pop("_n"), site.pop("_rtt_n")
+            down, up, rtt = site.pop("_down"), site.pop("_up"), site.pop("_rtt")
+            site["down_now_mbps"] = round(site["down_now_mbps"], 3)
+            site["up_now_mbps"] = round(site["up_now_mbps"], 3)
+            site["down_mean_mbps"] = round(down / n, 3) if n else None
+            site["up_mean_mbps"] = round(up / n, 3) if n else None
+            site["rtt_mean_ms"] = round(rtt / rtt_n, 1) if rtt_n else None
+            result.append(site)
+        return result
+
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hosts": len(self.hosts), "datagrams": self.datagrams, "records": self.records, "rejected": self.rejected}
+
+
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                (length,) = FRAME_LENGTH.unpack(await reader.readexactly(FRAME_LENGTH.size))
+                self.ingest(await reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            parts = urlsplit(target)
+            query = parse_qs(parts.query)
+            minutes = max(1, min(ROLLUP_MINUTES, int(query.get("minutes", [DEFAULT_WINDOW_MIN])[0])))
+            status, body = 200, None
+            if method != "GET":
+                status = 405
+            elif parts.path == "/hosts":
+                body = self.host_rollups(minutes)
+            elif parts.path == "/host":
+                host = self.hosts.get(query.get("name", [""])[0])
+                body = host.rollup(time.time(), minutes) if host else None
+                status = 200 if host else 404
+            elif parts.path == "/sites":
+                body = self.site_rollups(minutes)
+            elif parts.path == "/stats":
+                body = self.stats()
+            else:
+                status = 404
+            payload = json.dumps(body, separators=(",", ":")).encode("utf-8")
+            reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed"}[status]
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("ascii") + payload
+            )
+            await writer.drain()
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def serve(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        http_port: int = DEFAULT_HTTP_PORT,
+    ) -> tuple[asyncio.DatagramTransport, asyncio.AbstractServer, asyncio.AbstractServer]:
+        """
+        Listen for UDP and TCP telemetry on `port` and HTTP queries on `http_port`.
+        """
+        loop = asyncio.get_running_loop()
+        udp, _ = await loop.create_datagram_endpoint(lambda: _UdpProtocol(self), local_addr=(host, port))
+        tcp = await asyncio.start_server(self._handle_tcp, host, port)
+        http = await asyncio.start_server(self._handle_http, host, http_port)
+        return udp, tcp, http
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, aggregator: Aggregator) -> None:
+        self.aggregator = aggregator
+
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        self.aggregator.ingest(data)
+
+
+class AggregatorThread:
+    """
+    Runs an Aggregator on its own event loop thread (for benchmarks/tests).
+    Port 0 picks free ports; the bound ones are `.port` (UDP and TCP share
+    it) and `.http_port`.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = 0, http_port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.http_port = http_port
+        self.aggregator = Aggregator()
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._endpoints: tuple = ()
+
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        # Same port for UDP and TCP: bind UDP first, then reuse its number
+        udp, _ = self._loop.run_until_complete(
+            self._loop.create_datagram_endpoint(lambda: _UdpProtocol(self.aggregator), local_addr=(self.host, self.port))
+        )
+        self.port = udp.get_extra_info("sockname")[1]
+        tcp = self._loop.run_until_complete(asyncio.start_server(self.aggregator._handle_tcp, self.host, self.port))
+        http = self._loop.run_until_complete(asyncio.start_server(self.aggregator._handle_http, self.host, self.http_port))
+        self.http_port = http.sockets[0].getsockname()[1]
+        self._endpoints = (udp, tcp, http)
+        self._ready.set()
+        self._loop.run_forever()
+
+
+    def start(self) -> "AggregatorThread":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+
+    def call(self, fn, *args: Any) -> Any:
+        """
+        Run `fn(*args)` on the aggregator's loop and return its result.
+        """
+        async def _call() -> Any:
+            return fn(*args)
+        return asyncio.run_coroutine_threadsafe(_call(), self._loop).result()
+
+
+    def stop(self) -> None:
+        def _shutdown() -> None:
+            for endpoint in self._endpoints:
+                endpoint.close()
+            self._loop.stop()
+        self._loop.call_soon_threadsafe(_shutdown)
+        self._thread.join(timeout=2.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Collect NetSpeed Widget telemetry and serve rollups")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="UDP and TCP telemetry port")
+    parser.add_argument("--http-port", type=int, default=DEFAULT_HTTP_PORT)
+    args = parser.parse_args()
+
+    async def _serve() -> None:
+        aggregator = Aggregator()
+        await aggregator.serve(args.host, args.port, args.http_port)
+        print(f"Telemetry on {args.host}:{args.port} (udp+tcp), rollups on http://{args.host}:{args.http_port}/sites")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import ipaddress
+import socket
+import time
+from typing import Any, Dict
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+MIN_STREAMS = 1
+MAX_STREAMS = 32
+PLATEAU_GAIN = 0.10                 # a doubling must add at least 10% to be kept
+RETUNE_AFTER_SEC = 7 * 24 * 60 * 60  # saved counts older than this are re-tuned
+PROBE_SEC = 3.0                     # speedtest-cli ramp probes: its own test with this time limit
+ROUTE_PROBE = ("192.0.2.1", 9)      # TEST-NET-1: connect() on UDP only picks the route, nothing is sent
+
+
+def network_identity() -> str | None:
+    """
+    Name for the network the default route goes through: the outbound
+    interface and its subnet, e.g. "Ethernet 10.20.0.0/22". Another site,
+    or Wi-Fi instead of the docking station, gives another identity.
+    None when there is no route (offline).
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(ROUTE_PROBE)
+            local = sock.getsockname()[0]
+    except OSError:
+        return None
+    if psutil is not None:
+        try:
+            for name, addresses in psutil.net_if_addrs().items():
+                for address in addresses:
+                    if address.family == socket.AF_INET and address.address == local and address.netmask:
+                        return f"{name} {ipaddress.ip_interface(f'{local}/{address.netmask}').network}"
+        except Exception:
+            pass
+    return str(ipaddress.ip_interface(f"{local}/24").network)
+
+
+def ramp_start(saved: Dict[str, Any] | None, direction: str, now: float | None = None) -> tuple[int, bool]:
+    """
+    (stream count to start at, whether to ramp) for "download"/"upload".
+    A fresh saved count is used as is. A stale one is re-tuned starting
+    from a quarter of it, so a link that got slower can settle lower.
+    Without one the ramp starts at MIN_STREAMS.
+    """
+    now = time.time() if now is None else now
+    try:
+        streams = max(MIN_STREAMS, min(MAX_STREAMS, int(saved[direction])))
+        fresh = now - float(saved["ts"]) < RETUNE_AFTER_SEC
+    except (TypeError, KeyError, ValueError):
+        return MIN_STREAMS, True
+    if fresh:
+        return streams, False
+    return max(MIN_STREAMS, streams // 4), True
+
+
+class StreamRamp:
+    """
+    Doubling search for the stream count where throughput stops improving.
+
+    `record(streams, mbps)` takes the rate measured at a count and returns
+    the next count to try, or None once a doubling added less than
+    PLATEAU_GAIN (or `max_streams` is reached). `streams` is then the
+    chosen count: the smallest one at the plateau, so a weak link keeps
+    few streams instead of adding contention.
+    """
+
+    def __init__(self, start: int, max_streams: int = MAX_STREAMS, gain: float = PLATEAU_GAIN) -> None:
+        self.max_streams = max(MIN_STREAMS, max_streams)
+        self.gain = gain
+        self.streams = max(MIN_STREAMS, min(self.max_streams, start))
+        self.mbps: float | None = None
+        self.steps: list[tuple[int, float]] = []
+
+
+    def record(self, streams: int, mbps: float) -> int | None:
+        self.steps.append((streams, mbps))
+        if self.mbps is not None and mbps < self.mbps * (1.0 + self.gain):
+            return None
+        self.streams, self.mbps = streams, mbps
+        if streams >= self.max_streams:
+            return None
+        return min(self.max_streams, streams * 2)
@@ -0,0 +1,290 @@
+import ctypes
+import os
+import re
+import sys
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+BACKENDS = ("auto", "psutil", "procfs", "iftable")
+
+PROC_NET_DEV = "/proc/net/dev"
+# "  eth0: rx_bytes rx_packets ... (8 receive fields) tx_bytes ..."
+_PROC_LINE_RE = re.compile(rb":\s*(\d+)(?:\s+\d+){7}\s+(\d+)")
+_PROC_IFACE_RE = re.compile(rb"^\s*([^:\s]+):\s*(\d+)(?:\s+\d+){7}\s+(\d+)", re.MULTILINE)
+
+
+def is_loopback(interface: str) -> bool:
+    """
+    Loopback by name ("lo" on Linux, "Loopback Pseudo-Interface 1" on Windows).
+    """
+    return interface == "lo" or interface.lower().startswith("loopback")
+
+
+class CounterSource:
+    """
+    Total bytes sent/received across all interfaces since boot.
+
+    `read()` is called once per sampler tick and returns (bytes_sent,
+    bytes_recv); callers diff consecutive reads. Implementations keep
+    whatever handle they need open between reads.
+
+    `read_interfaces()` returns the same counters per interface
+    ({name: (bytes_sent, bytes_recv)}) for slower-cadence accounting.
+    """
+
+    name = "base"
+
+
+    def read(self) -> tuple[int, int]:
+        raise NotImplementedError
+
+
+    def read_interfaces(self) -> dict[str, tuple[int, int]]:
+        return {"all": self.read()}
+
+
+    def close(self) -> None:
+        pass
+
+
+class PsutilCounterSource(CounterSource):
+    """
+    Portable backend: `psutil.net_io_counters()` (builds a namedtuple per
+    interface and sums them).
+    """
+
+    name = "psutil"
+
+    def __init__(self) -> None:
+        if psutil is None:
+            raise OSError("psutil is not installed")
+
+
+    def read(self) -> tuple[int, int]:
+        counters = psutil.net_io_counters()
+        return counters.bytes_sent, counters.bytes_recv
+
+
+    def read_interfaces(self) -> dict[str, tuple[int, int]]:
+        return {name: (c.bytes_sent, c.bytes_recv) for name, c in psutil.net_io_counters(pernic=True).items()}
+
+
+class ProcNetDevSource(CounterSource):
+    """
+    Linux backend: re-reads /proc/net/dev from a descriptor kept open for
+    the life of the source, with `os.preadv` into one preallocated buffer.
+    Per read only the matched digit strings and the two sums are created.
+    Counts every interface, loopback included, like psutil does.
+    """
+
+    name = "procfs"
+
+    def __init__(self, path: str = PROC_NET_DEV, buffer_size: int = 64 * 1024) -> None:
+        self._fd = os.open(path, os.O_RDONLY)
+        self._buf = bytearray(buffer_size)
+        self._view = memoryview(self._buf)
+        self.read()  # fail early if the file is not in the expected format
+
+
+    def _fill(self) -> int:
+        size = os.preadv(self._fd, [self._buf], 0)
+        while size == len(self._buf):
+            # More interfaces than fit: grow once and keep the bigger buffer
+            self._buf = bytearray(len(self._buf) * 2)
+            self._view = memoryview(self._buf)
+            size = os.preadv(self._fd, [self._buf], 0)
+        return size
+
+
+    def read(self) -> tuple[int, int]:
+        size = self._fill()
+        sent = recv = 0
+        for rx, tx in _PROC_LINE_RE.findall(self._view[:size]):
+            recv += int(rx)
+            sent += int(tx)
+        return sent, recv
+
+
+    def read_interfaces(self) -> dict[str, tuple[int, int]]:
+        size = self._fill()
+        return {
+            name.decode("ascii", "replace"): (int(tx), int(rx))
+            for name, rx, tx in _PROC_IFACE_RE.findall(self._view[:size])
+        }
+
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class _Guid(ctypes.Structure):
+    _fields_ = [
+        ("Data1", ctypes.c_uint32),
+        ("Data2", ctypes.c_uint16),
+        ("Data3", ctypes.c_uint16),
+        ("Data4", ctypes.c_ubyte * 8),
+    ]
+
+
+_IF_MAX_STRING_SIZE = 256
+_IF_MAX_PHYS_ADDRESS_LENGTH = 32
+
+
+class MIB_IF_ROW2(ctypes.Structure):
+    """
+    netioapi.h MIB_IF_ROW2 (1352 bytes). WCHAR fields are declared as
+    uint16 so the layout is the same wherever this module is imported.
+    """
+    _fields_ = [
+        ("InterfaceLuid", ctypes.c_uint64),
+        ("InterfaceIndex", ctypes.c_uint32),
+        ("InterfaceGuid", _Guid),
+        ("Alias", ctypes.c_uint16 * (_IF_MAX_STRING_SIZE + 1)),
+        ("Description", ctypes.c_uint16 * (_IF_MAX_STRING_SIZE + 1)),
+        ("PhysicalAddressLength", ctypes.c_uint32),
+        ("PhysicalAddress", ctypes.c_ubyte * _IF_MAX_PHYS_ADDRESS_LENGTH),
+        ("PermanentPhysicalAddress", ctypes.c_ubyte * _IF_MAX_PHYS_ADDRESS_LENGTH),
+        ("Mtu", ctypes.c_uint32),
+        ("Type", ctypes.c_uint32),
+        ("TunnelType", ctypes.c_int),
+        ("MediaType", ctypes.c_int),
+        ("PhysicalMediumType", ctypes.c_int),
+        ("AccessType", ctypes.c_int),
+        ("DirectionType", ctypes.c_int),
+        ("InterfaceAndOperStatusFlags", ctypes.c_ubyte),
+        ("OperStatus", ctypes.c_int),
+        ("AdminStatus", ctypes.c_int),
+        ("MediaConnectState", ctypes.c_int),
+        ("NetworkGuid", _Guid),
+        ("ConnectionType", ctypes.c_int),
+        ("TransmitLinkSpeed", ctypes.c_uint64),
+        ("ReceiveLinkSpeed", ctypes.c_uint64),
+        ("InOctets", ctypes.c_uint64),
+        ("InUcastPkts", ctypes.c_uint64),
+        ("InNUcastPkts", ctypes.c_uint64),
+        ("InDiscards", ctypes.c_uint64),
+        ("InErrors", ctypes.c_uint64),
+        ("InUnknownProtos", ctypes.c_uint64),
+        ("InUcastOctets", ctypes.c_uint64),
+        ("InMulticastOctets", ctypes.c_uint64),
+        ("InBroadcastOctets", ctypes.c_uint64),
+        ("OutOctets", ctypes.c_uint64),
+        ("OutUcastPkts", ctypes.c_uint64),
+        ("OutNUcastPkts", ctypes.c_uint64),
+        ("OutDiscards", ctypes.c_uint64),
+        ("OutErrors", ctypes.c_uint64),
+        ("OutUcastOctets", ctypes.c_uint64),
+        ("OutMulticastOctets", ctypes.c_uint64),
+        ("OutBroadcastOctets", ctypes.c_uint64),
+        ("OutQLen", ctypes.c_uint64),
+    ]
+
+
+class MIB_IF_TABLE2(ctypes.Structure):
+    _fields_ = [
+        ("NumEntries", ctypes.c_uint32),
+        ("Table", MIB_IF_ROW2 * 1),  # ANY_SIZE; rows follow contiguously
+    ]
+
+
+# InterfaceAndOperStatusFlags bit for NDIS filter (LWF/QoS) pseudo-interfaces,
+# which mirror the traffic of the adapter beneath them
+_IF_FLAG_FILTER_INTERFACE = 0x02
+
+
+class IfTableSource(CounterSource):
+    """
+    Windows backend: one `GetIfTable2` call per read returns every
+    interface row in a single buffer (freed with `FreeMibTable`). Filter
+    pseudo-interfaces are skipped so traffic is not counted twice.
+    """
+
+    name = "iftable"
+
+    def __init__(self) -> None:
+        if sys.platform != "win32":
+            raise OSError("GetIfTable2 is only available on Windows")
+        iphlpapi = ctypes.WinDLL("iphlpapi")
+        self._get_table = iphlpapi.GetIfTable2
+        self._get_table.argtypes = [ctypes.POINTER(ctypes.POINTER(MIB_IF_TABLE2))]
+        self._get_table.restype = ctypes.c_ulong
+        self._free_table = iphlpapi.FreeMibTable
+        self._free_table.argtypes = [ctypes.c_void_p]
+        self._free_table.restype = None
+        self._table = ctypes.POINTER(MIB_IF_TABLE2)()
+        self._row_size = ctypes.sizeof(MIB_IF_ROW2)
+        self._rows_offset = MIB_IF_TABLE2.Table.offset
+        self.read()
+
+
+    def _rows(self):
+        """
+        Yield the non-filter rows of a fresh table; the table is freed when
+        the generator finishes, so rows must not outlive iteration.
+        """
+        status = self._get_table(ctypes.byref(self._table))
+        if status != 0:
+            raise OSError(status, "GetIfTable2 failed")
+        try:
+            base = ctypes.addressof(self._table.contents) + self._rows_offset
+            for i in range(self._table.contents.NumEntries):
+                row = MIB_IF_ROW2.from_address(base + i * self._row_size)
+                if not row.InterfaceAndOperStatusFlags & _IF_FLAG_FILTER_INTERFACE:
+                    yield row
+        finally:
+            self._free_table(self._table)
+
+
+    def read(self) -> tuple[int, int]:
+        sent = recv = 0
+        for row in self._rows():
+            recv += row.InOctets
+            sent += row.OutOctets
+        return sent, recv
+
+
+    def read_interfaces(self) -> dict[str, tuple[int, int]]:
+        result: dict[str, tuple[int, int]] = {}
+        for row in self._rows():
+            alias = "".join(map(chr, row.Alias)).split("\0", 1)[0] or f"if{row.InterfaceIndex}"
+            prev_sent, prev_recv = result.get(alias, (0, 0))
+            result[alias] = (prev_sent + row.OutOctets, prev_recv + row.InOctets)
+        return result
+
+
+def available_sources() -> list[type[CounterSource]]:
+    """
+    Backends that can be constructed on this machine, fastest first.
+    """
+    candidates: list[type[CounterSource]] = []
+    if sys.platform == "win32":
+        candidates.append(IfTableSource)
+    if os.path.exists(PROC_NET_DEV):
+        candidates.append(ProcNetDevSource)
+    if psutil is not None:
+        candidates.append(PsutilCounterSource)
+    return candidates
+
+
+def open_counter_source(backend: str = "auto") -> CounterSource:
+    """
+    Open the named backend; "auto" picks the fastest one that works here.
+    Falls back to psutil if a direct backend cannot be opened.
+    """
+    by_name = {cls.name: cls for cls in (PsutilCounterSource, ProcNetDevSource, IfTableSource)}
+    if backend != "auto" and backend in by_name:
+        try:
+            return by_name[backend]()
+        except Exception:
+            pass
+    for cls in available_sources():
+        try:
+            return cls()
+        except Exception:
+            continue
+    raise OSError("No network counter backend available")
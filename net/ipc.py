@@ -0,0 +1,362 @@
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import socket
+import sys
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterator
+
+from utils.paths import config_path
+
+# Local control API for the running widget.
+#
+# Transport: a Unix domain socket (`widget.sock` in the app folder, mode 0600)
+# on POSIX, the named pipe \\.\pipe\NetSpeedWidget on Windows.
+#
+# Protocol: newline-delimited JSON, one object per line in both directions.
+# Requests carry "cmd" and an optional "id" that is echoed in the reply:
+#
+#     {"cmd": "status"}                  -> {"ok": true, "sample": {...}, "opacity": 0.72, ...}
+#     {"cmd": "speedtest"}               -> {"ok": true, "started": true}
+#     {"cmd": "opacity", "value": 0.8}   -> {"ok": true, "opacity": 0.8}
+#     {"cmd": "percentiles", "metric": "down", "days": 30}
+#                                        -> {"ok": true, "count": n, "mean": x, "p50": x, "p95": x, "p99": x}
+#     {"cmd": "subscribe"}               -> {"ok": true, "subscribed": true}, then one
+#                                           {"t": ts, "d": down, "u": up, "r": rtt_ms | null}
+#                                           line per sample
+#
+# Errors reply {"ok": false, "error": "..."}. Commands that read the disk
+# (status, percentiles) reply when the read is done, so replies may come
+# out of order; send an "id" to match them. Delivery never blocks the
+# widget: a subscriber whose unsent data exceeds MAX_PENDING_BYTES is
+# disconnected.
+
+PIPE_NAME = r"\\.\pipe\NetSpeedWidget"
+SOCKET_FILE = "widget.sock"
+MAX_LINE_BYTES = 64 * 1024
+MAX_PENDING_BYTES = 64 * 1024  # ~1000 sample messages before a subscriber is dropped
+
+Handler = Callable[[Dict[str, Any]], Dict[str, Any] | Awaitable[Dict[str, Any]]]
+
+
+def default_address() -> str:
+    return PIPE_NAME if sys.platform == "win32" else config_path(SOCKET_FILE)
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class _Connection(asyncio.Protocol):
+    """
+    One client connection: splits incoming lines and writes replies/pushes.
+    """
+
+    def __init__(self, server: "IpcServer") -> None:
+        self.server = server
+        self.transport: asyncio.Transport | None = None
+        self._buf = bytearray()
+
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        self.server._connections.add(self)
+
+
+    def data_received(self, data: bytes) -> None:
+        self._buf += data
+        while True:
+            end = self._buf.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(self._buf[:end])
+            del self._buf[:end + 1]
+            if line.strip():
+                self.server._handle_line(self, line)
+        if len(self._buf) > MAX_LINE_BYTES:
+            self.transport.close()
+
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self.server._connections.discard(self)
+        self.server._subscribers.discard(self)
+
+
+    def send(self, payload: bytes) -> bool:
+        """
+        Queue bytes without blocking. Clients that stopped reading are
+        disconnected once their backlog passes MAX_PENDING_BYTES.
+        """
+        transport = self.transport
+        if transport is None or transport.is_closing():
+            return False
+        if transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+            self.server.dropped += 1
+            self.server._subscribers.discard(self)
+            transport.abort()
+            return False
+        transport.write(payload)
+        return True
+
+
+class IpcServer:
+    """
+    Serves the control API on an asyncio loop: the app's shared loop when
+    one is passed to `start`, else a private loop on a daemon thread.
+
+    `handlers` maps command names to callables that take the request dict
+    and return the reply fields. They run on the IPC loop and must be
+    quick and thread-safe (read snapshots, hand work off to the app);
+    a handler that needs the disk returns an awaitable instead and is
+    replied to when it completes, without holding up other clients.
+    """
+
+    def __init__(self, handlers: Dict[str, Handler], address: str | None = None) -> None:
+        self.handlers = dict(handlers)
+        self.address = address or default_address()
+        self.dropped: int = 0
+        self._connections: set[_Connection] = set()
+        self._subscribers: set[_Connection] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._servers: list[Any] = []
+        self._thread: threading.Thread | None = None
+        self._ready = threading.Event()
+        self._error: Exception | None = None
+
+
+    def start(self, timeout: float = 2.0, loop: asyncio.AbstractEventLoop | None = None) -> bool:
+        """
+        Start serving. Returns False if the endpoint could not be opened
+        (for example another instance already owns it).
+        On Windows a shared `loop` must be a ProactorEventLoop (the default).
+        """
+        if loop is not None:
+            self._loop = loop
+            try:
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result(timeout)
+                return True
+            except Exception as exc:
+                self._error = exc
+                return False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        return self._ready.is_set() and self._error is None
+
+
+    def _run(self) -> None:
+        if sys.platform == "win32":
+            loop: asyncio.AbstractEventLoop = asyncio.ProactorEventLoop()
+        else:
+            loop = asyncio.new_event_loop()
+        self._loop = loop
+        try:
+            loop.run_until_complete(self._open())
+        except Exception as exc:
+            self._error = exc
+            self._ready.set()
+            loop.close()
+            return
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+
+    async def _open(self) -> None:
+        loop = asyncio.get_running_loop()
+        if sys.platform == "win32":
+            # Proactor pipe server: one listening instance per client, recycled
+            self._servers = await loop.start_serving_pipe(lambda: _Connection(self), self.address)
+            return
+        if os.path.exists(self.address):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.address)
+                raise OSError(f"{self.address} is in use by another instance")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.address)  # stale socket from a crashed run
+            finally:
+                probe.close()
+        server = await loop.create_unix_server(lambda: _Connection(self), self.address)
+        os.chmod(self.address, 0o600)
+        self._servers = [server]
+
+
+    def _handle_line(self, conn: _Connection, line: bytes) -> None:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except Exception:
+            conn.send(_encode({"ok": False, "error": "invalid JSON"}))
+            return
+        command = request.get("cmd")
+        reply: Dict[str, Any]
+        if command == "subscribe":
+            self._subscribers.add(conn)
+            reply = {"ok": True, "subscribed": True}
+        elif command in self.handlers:
+            try:
+                result = self.handlers[command](request)
+                if inspect.isawaitable(result):
+                    asyncio.get_running_loop().create_task(self._reply_later(conn, request, result))
+                    return
+                reply = {"ok": True, **result}
+            except Exception as exc:
+                reply = {"ok": False, "error": str(exc) or type(exc).__name__}
+        else:
+            reply = {"ok": False, "error": f"unknown command {command!r}"}
+        self._reply(conn, request, reply)
+
+
+    async def _reply_later(self, conn: _Connection, request: Dict[str, Any], result: Awaitable[Dict[str, Any]]) -> None:
+        try:
+            reply = {"ok": True, **(await result)}
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            reply = {"ok": False, "error": str(exc) or type(exc).__name__}
+        self._reply(conn, request, reply)
+
+
+    def _reply(self, conn: _Connection, request: Dict[str, Any], reply: Dict[str, Any]) -> None:
+        if "id" in request:
+            reply["id"] = request["id"]
+        conn.send(_encode(reply))
+
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        """
+        Push a message to every subscriber. Safe from any thread; returns
+        immediately (encoding happens once, delivery on the IPC loop).
+        """
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+        payload = _encode(message)
+        try:
+            loop.call_soon_threadsafe(self._broadcast, payload)
+        except RuntimeError:
+            pass  # loop already stopped
+
+
+    def _broadcast(self, payload: bytes) -> None:
+        for conn in list(self._subscribers):
+            conn.send(payload)
+
+
+    def stop(self, timeout: float = 0.1) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._shutdown)
+        except RuntimeError:
+            return
+        if self._thread:
+            self._thread.join(timeout)
+
+
+    def _shutdown(self) -> None:
+        """
+        Close listeners and clients; stop the loop only if it is our own.
+        """
+        for server in self._servers:
+            try:
+                server.close()
+            except Exception:
+                pass
+        for conn in list(self._connections):
+            if conn.transport:
+                conn.transport.abort()
+        if sys.platform != "win32":
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._loop.stop()
+
+
+class IpcClient:
+    """
+    Blocking client for scripts: `request(...)` for commands, `samples()`
+    to follow the subscription stream.
+    """
+
+    def __init__(self, address: str | None = None, timeout: float | None = 5.0) -> None:
+        self.address = address or default_address()
+        if sys.platform == "win32":
+            self._stream = open(self.address, "r+b", buffering=0)
+            self._reader = open(self._stream.fileno(), "rb", closefd=False)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(self.address)
+            self._sock = sock
+            self._stream = sock.makefile("wb", buffering=0)
+            self._reader = sock.makefile("rb")
+
+
+    def request(self, cmd: str, **fields: Any) -> Dict[str, Any]:
+        self._stream.write(_encode({"cmd": cmd, **fields}))
+        return json.loads(self._reader.readline())
+
+
+    def samples(self) -> Iterator[Dict[str, Any]]:
+        reply = self.request("subscribe")
+        if not reply.get("ok"):
+            raise OSError(reply.get("error", "subscribe failed"))
+        if sys.platform != "win32":
+            self._sock.settimeout(None)
+        for line in self._reader:
+            yield json.loads(line)
+
+
+    def close(self) -> None:
+        for stream in (self._reader, self._stream):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        if sys.platform != "win32":
+            self._sock.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Talk to a running NetSpeed Widget")
+    parser.add_argument("command", choices=("status", "speedtest", "opacity", "percentiles", "subscribe"))
+    parser.add_argument("value", nargs="?", type=float, help="opacity level (0.40 - 1.00)")
+    parser.add_argument("--metric", choices=("down", "up", "rtt"), default="down", help="percentiles: which series")
+    parser.add_argument("--days", type=float, default=30.0, help="percentiles: range ending now")
+    parser.add_argument("--address", default=None)
+    args = parser.parse_args(argv)
+
+    client = IpcClient(args.address)
+    try:
+        if args.command == "subscribe":
+            for sample in client.samples():
+                print(json.dumps(sample), flush=True)
+        elif args.command == "opacity":
+            print(json.dumps(client.request("opacity", value=args.value)))
+        elif args.command == "percentiles":
+            print(json.dumps(client.request("percentiles", metric=args.metric, days=args.days)))
+        else:
+            print(json.dumps(client.request(args.command)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
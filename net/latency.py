@@ -0,0 +1,175 @@
+import socket
+import threading
+import time
+from typing import Any, Dict, NamedTuple
+
+from utils.cancel import CancelToken
+
+PROBE_INTERVAL_SEC = 0.25
+PROBE_TIMEOUT_SEC = 1.0
+IDLE_BASELINE_SEC = 2.0  # probes taken before any load starts
+MIN_PHASE_PROBES = 3     # fewer probes than this and a phase is not reported
+LOADED_PHASES = ("download", "upload", "loaded")  # "loaded" = provider that can't split directions
+
+# Added latency under load (ms) below which each grade applies; worse is "F"
+BUFFERBLOAT_GRADES = ((5.0, "A+"), (30.0, "A"), (60.0, "B"), (200.0, "C"), (400.0, "D"))
+
+
+class PhaseLatency(NamedTuple):
+    probes: int      # answered probes
+    lost: int        # probes that timed out or failed
+    median_ms: float
+    p90_ms: float
+
+
+def bufferbloat_grade(added_ms: float) -> str:
+    for bound, grade in BUFFERBLOAT_GRADES:
+        if added_ms < bound:
+            return grade
+    return "F"
+
+
+class LatencyProbe:
+    """
+    Measures loaded latency while a speedtest runs: TCP connect round trips
+    (SYN to SYN-ACK, no payload) to one host at a fixed rate, on a dedicated
+    thread with its own deadline schedule, so probes neither wait behind the
+    tester's event loop nor add meaningful traffic to the measured link.
+
+    Each probe is filed under the phase that was current when it
+    was sent: "idle" until the first `set_phase`, then whatever phase the
+    provider reports; `set_phase(None)` pauses probing between phases.
+    The address is resolved once up front so probes time only the handshake.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        token: CancelToken,
+        interval_sec: float = PROBE_INTERVAL_SEC,
+        timeout_sec: float = PROBE_TIMEOUT_SEC,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.interval = interval_sec
+        self.timeout = timeout_sec
+        self.token = token.child()
+        self._phase: str | None = "idle"
+        self._rtts: Dict[str, list[float]] = {}
+        self._lost: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True, name="nsw-latency")
+        self._thread.start()
+
+
+    def stop(self, timeout: float = PROBE_TIMEOUT_SEC) -> None:
+        self.token.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+    def set_phase(self, phase: str | None) -> None:
+        """
+        Label probes from now on (any thread). None pauses probing.
+        """
+        with self._lock:
+            self._phase = phase
+
+
+    def reset_loaded(self) -> None:
+        """
+        Drop loaded-phase probes and pause, keeping the idle baseline
+        (a provider failed and the next one starts from scratch).
+        """
+        with self._lock:
+            self._phase = None
+            for phase in LOADED_PHASES:
+                self._rtts.pop(phase, None)
+                self._lost.pop(phase, None)
+
+
+    def _run(self) -> None:
+        try:
+            family, _, _, _, address = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)[0]
+        except OSError:
+            return
+        next_at = time.monotonic()
+        while not self.token.wait(max(0.0, next_at - time.monotonic())):
+            with self._lock:
+                phase = self._phase
+            if phase is not None:
+                rtt_ms = self._connect_ms(family, address)
+                with self._lock:
+                    if self._phase == phase:  # a probe spanning a phase switch belongs to neither
+                        if rtt_ms is None:
+                            self._lost[phase] = self._lost.get(phase, 0) + 1
+                        else:
+                            self._rtts.setdefault(phase, []).append(rtt_ms)
+            next_at += self.interval
+            now = time.monotonic()
+            if next_at < now:
+                next_at = now  # a slow probe delays the next one, no catch-up burst
+
+
+    def _connect_ms(self, family: int, address: Any) -> float | None:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            started = time.perf_counter()
+            sock.connect(address)
+            return (time.perf_counter() - started) * 1000.0
+        except OSError:
+            return None
+        finally:
+            sock.close()
+
+
+    def phases(self) -> Dict[str, PhaseLatency]:
+        """
+        Per-phase statistics for phases with at least MIN_PHASE_PROBES probes.
+        A phase where no probe was answered reports the probe timeout.
+        """
+        with self._lock:
+            snapshot = {phase: sorted(rtts) for phase, rtts in self._rtts.items()}
+            lost = dict(self._lost)
+        result: Dict[str, PhaseLatency] = {}
+        for phase in set(snapshot) | set(lost):
+            rtts = snapshot.get(phase, [])
+            n = len(rtts)
+            if n + lost.get(phase, 0) < MIN_PHASE_PROBES:
+                continue
+            if n:
+                median = rtts[n // 2] if n % 2 else (rtts[n // 2 - 1] + rtts[n // 2]) / 2.0
+                p90 = rtts[min(n - 1, int(n * 0.9))]
+            else:
+                median = p90 = self.timeout * 1000.0
+            result[phase] = PhaseLatency(n, lost.get(phase, 0), median, p90)
+        return result
+
+
+    def result(self) -> Dict[str, Any] | None:
+        """
+        Compact record for the speedtest entry, or None without both an idle
+        baseline and at least one loaded phase. Looks like:
+        {"idle_ms", "download_ms", "upload_ms", "added_ms", "grade", "lost"}
+        ("loaded_ms" instead of download/upload for providers that don't
+        report phases). Added latency is the worst loaded median minus idle.
+        """
+        phases = self.phases()
+        idle = phases.get("idle")
+        loaded = {name: phases[name] for name in LOADED_PHASES if name in phases}
+        if idle is None or idle.probes == 0 or not loaded:
+            return None  # no usable baseline (host unreachable) or nothing measured under load
+        added = max(0.0, max(p.median_ms for p in loaded.values()) - idle.median_ms)
+        record: Dict[str, Any] = {"idle_ms": round(idle.median_ms, 1)}
+        for name, stats in loaded.items():
+            record[f"{name}_ms"] = round(stats.median_ms, 1)
+        record["added_ms"] = round(added, 1)
+        record["grade"] = bufferbloat_grade(added)
+        record["lost"] = sum(p.lost for p in phases.values())
+        return record
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_DOWNLOAD_BYTES = 25 * 1024 * 1024
+MAX_DOWNLOAD_BYTES = 1024 * 1024 * 1024
+WRITE_CHUNK = 256 * 1024
+READ_CHUNK = 256 * 1024
+
+_ZEROS = memoryview(bytes(WRITE_CHUNK))
+
+
+class RateLimiter:
+    """
+    Pacer shared by all connections (or owned by one, for a per-stream
+    cap). With `rate_mbps=None` it is a no-op; otherwise it spaces
+    transfers so the aggregate matches the rate, which gives benchmarks a
+    known ground truth to compare against.
+    """
+
+    def __init__(self, rate_mbps: float | None) -> None:
+        self.bytes_per_sec = rate_mbps * 1_000_000.0 / 8.0 if rate_mbps else None
+        self._next = time.perf_counter()
+
+
+    async def consume(self, n: int) -> None:
+        if self.bytes_per_sec is None:
+            return
+        now = time.perf_counter()
+        start = max(self._next, now)
+        self._next = start + n / self.bytes_per_sec
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class ReferenceServer:
+    """
+    Minimal HTTP/1.1 keep-alive server for loopback throughput tests.
+
+        GET  /download?bytes=N   -> N zero bytes
+        POST /upload             -> body is read and discarded
+        GET  /stats              -> bytes served/received so far
+
+    Used by `net.throughput` benchmarks so accuracy and CPU overhead can be
+    measured with no network access. `stream_mbps` additionally caps each
+    connection, like a TCP window on a long path, so a single stream cannot
+    fill the link and the stream count matters.
+    """
+
+    def __init__(self, rate_mbps: float | None = None, stream_mbps: float | None = None) -> None:
+        self.down_limiter = RateLimiter(rate_mbps)
+        self.up_limiter = RateLimiter(rate_mbps)
+        self.stream_mbps = stream_mbps
+        self.bytes_sent: int = 0
+        self.bytes_received: int = 0
+        self.requests: int = 0
+        self.connections: int = 0
+
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        stream_limiter = RateLimiter(self.stream_mbps)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                self.requests += 1
+                parts = urlsplit(target)
+                if method == "GET" and parts.path == "/download":
+                    await self._download(writer, parts.query, stream_limiter)
+                elif method == "POST" and parts.path == "/upload":
+                    await self._upload(reader, writer, int(headers.get("content-length", "0")), stream_limiter)
+                elif method == "GET" and parts.path == "/stats":
+                    body = (f'{{"sent": {self.bytes_sent}, "received": {self.bytes_received}, '
+                            f'"requests": {self.requests}, "connections": {self.connections}}}').encode()
+                    writer.write(self._head(200, len(body), "application/json") + body)
+                    await writer.drain()
+                else:
+                    writer.write(self._head(404, 0))
+                    await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # shutdown; ending normally keeps asyncio < 3.12 from logging the cancelled handler
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+    def _head(self, status: int, length: int, content_type: str = "application/octet-stream") -> bytes:
+        reason = {200: "OK", 404: "Not Found"}.get(status, "OK")
+        return (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {length}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("ascii")
+
+
+    async def _download(self, writer: asyncio.StreamWriter, query: str, stream_limiter: RateLimiter) -> None:
+        try:
+            size = int(parse_qs(query).get("bytes", [DEFAULT_DOWNLOAD_BYTES])[0])
+        except ValueError:
+            size = DEFAULT_DOWNLOAD_BYTES
+        size = max(0, min(size, MAX_DOWNLOAD_BYTES))
+        writer.write(self._head(200, size))
+        remaining = size
+        while remaining > 0:
+            n = min(remaining, WRITE_CHUNK)
+            await stream_limiter.consume(n)
+            await self.down_limiter.consume(n)
+            writer.write(_ZEROS[:n])
+            await writer.drain()
+            self.bytes_sent += n
+            remaining -= n
+
+
+    async def _upload(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        length: int,
+        stream_limiter: RateLimiter,
+    ) -> None:
+        remaining = length
+        while remaining > 0:
+            data = await reader.read(min(remaining, READ_CHUNK))
+            if not data:
+                raise ConnectionError("Client went away mid-upload")
+            await stream_limiter.consume(len(data))
+            await self.up_limiter.consume(len(data))
+            self.bytes_received += len(data)
+            remaining -= len(data)
+        writer.write(self._head(200, 0))
+        await writer.drain()
+
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port, limit=READ_CHUNK)
+
+
+class ReferenceServerThread:
+    """
+    Runs a ReferenceServer on its own event loop thread (for benchmarks/tests).
+    Port 0 picks a free port; the bound one is available as `.port`.
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = 0,
+        rate_mbps: float | None = None,
+        stream_mbps: float | None = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.server = ReferenceServer(rate_mbps, stream_mbps)
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._aio_server: asyncio.AbstractServer | None = None
+
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._aio_server = self._loop.run_until_complete(self.server.serve(self.host, self.port))
+        self.port = self._aio_server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+
+    def start(self) -> "ReferenceServerThread":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+
+    def url(self, path: str) -> str:
+        return f"http://{self.host}:{self.port}{path}"
+
+
+    def stop(self) -> None:
+        """
+        Close the listener, cancel in-flight connection handlers and wait
+        for them to unwind, then stop the loop.
+        """
+        async def _shutdown() -> None:
+            if self._aio_server:
+                self._aio_server.close()
+            handlers = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in handlers:
+                task.cancel()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            self._loop.stop()
+        asyncio.run_coroutine_threadsafe(_shutdown(), self._loop)
+        self._thread.join(timeout=2.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Loopback reference server for throughput tests")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--rate-mbps", type=float, default=None, help="Shape aggregate rate per direction")
+    parser.add_argument("--stream-mbps", type=float, default=None, help="Cap each connection (per-flow window limit)")
+    args = parser.parse_args()
+
+    async def _serve() -> None:
+        server = await ReferenceServer(args.rate_mbps, args.stream_mbps).serve(args.host, args.port)
+        print(f"Serving on http://{args.host}:{args.port} (rate={args.rate_mbps or 'unlimited'} Mb/s, "
+              f"per stream={args.stream_mbps or 'unlimited'} Mb/s)")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
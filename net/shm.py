@@ -0,0 +1,237 @@
+import math
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+SEGMENT_NAME = "NetSpeedWidget"
+DEFAULT_CAPACITY = 256
+STALE_SEC = 30.0  # a segment whose newest sample is older than this may be taken over
+
+# Fixed layout of the shared segment (all little-endian):
+#
+#   offset  size  field
+#   0       4     magic b"NSWR"
+#   4       2     layout version (1)
+#   6       2     record size in bytes (20)
+#   8       4     capacity: number of record slots
+#   12      4     writer pid (0 = unknown)
+#   16      8     seq: u64 seqlock counter, odd while the writer is mid-update
+#   24      8     head: u64 count of records ever written; the newest record
+#                 is slot (head - 1) % capacity
+#   32      32    reserved (0)
+#   64      ...   capacity slots of: ts f64 (epoch s), down f32 (Mb/s),
+#                 up f32 (Mb/s), rtt f32 (ms, NaN = ping lost)
+#
+# Writer: seq += 1, write the slot, head += 1, seq += 1.
+# Reader: read seq (retry while odd), copy what it needs, re-read seq and
+# retry if it changed. There is one writer (the widget's sampler).
+MAGIC = b"NSWR"
+LAYOUT_VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+SEQ_OFFSET = 16
+HEAD_OFFSET = 24
+RECORDS_OFFSET = 64
+U64 = struct.Struct("<Q")
+RECORD = struct.Struct("<dfff")
+
+Sample = tuple[float, float, float, float | None]
+
+_MAX_SPINS = 10_000
+
+
+def segment_size(capacity: int) -> int:
+    return RECORDS_OFFSET + capacity * RECORD.size
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing segment without handing it to this process's
+    resource tracker (which would unlink it when a reader exits).
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        except Exception:
+            pass
+        return shm
+
+
+def _unlink(shm: shared_memory.SharedMemory) -> None:
+    """
+    Remove a segment opened with `_attach`. `SharedMemory.unlink` would
+    also unregister it from the resource tracker, which `_attach` already
+    did, and the tracker reports that as an error.
+    """
+    import _posixshmem
+    _posixshmem.shm_unlink(shm._name)  # type: ignore[attr-defined]
+
+
+def _live_writer(buf: memoryview) -> int | None:
+    """
+    Pid of the widget still publishing into an existing segment, or None
+    if it is stale: not our layout, its writer pid is gone, or (pid reused)
+    its newest sample is older than STALE_SEC. POSIX only: on Windows
+    `os.kill(pid, 0)` sends a console Ctrl+C instead of probing.
+    """
+    try:
+        magic, version, record_size, capacity, pid = HEADER.unpack_from(buf, 0)
+        (head,) = U64.unpack_from(buf, HEAD_OFFSET)
+        if magic != MAGIC or version != LAYOUT_VERSION or record_size != RECORD.size or not pid:
+            return None
+        if head and capacity:
+            (ts,) = struct.unpack_from("<d", buf, RECORDS_OFFSET + ((head - 1) % capacity) * RECORD.size)
+            if time.time() - ts > STALE_SEC:
+                return None
+        os.kill(pid, 0)
+    except PermissionError:
+        return pid  # exists, owned by another user
+    except (OSError, struct.error, ValueError, OverflowError):
+        return None
+    return pid
+
+
+class SampleRing:
+    """
+    Writer side: owns the named segment and publishes each sample into the
+    next ring slot under the seqlock. Publishing is a few `pack_into`
+    calls on the mapped buffer; no syscalls.
+    """
+
+    def __init__(self, name: str = SEGMENT_NAME, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.name = name
+        self.capacity = max(1, int(capacity))
+        size = segment_size(self.capacity)
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Windows drops a mapping with its last handle, so it is held by a running
+            # process. POSIX: another running widget owns it, or a crashed run left it behind
+            if sys.platform == "win32":
+                raise
+            existing = _attach(name)
+            try:
+                owner = _live_writer(existing.buf)
+            finally:
+                existing.close()
+            if owner:
+                raise FileExistsError(f"shared memory {name!r} is in use by pid {owner}")
+            _unlink(existing)
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._buf = self._shm.buf
+        self._seq = 0
+        self._head = 0
+        self._buf[:RECORDS_OFFSET] = bytes(RECORDS_OFFSET)
+        HEADER.pack_into(self._buf, 0, MAGIC, LAYOUT_VERSION, RECORD.size, self.capacity, os.getpid())
+
+
+    def publish(self, ts: float, down_mbps: float, up_mbps: float, rtt_ms: float | None) -> None:
+        buf = self._buf
+        slot = RECORDS_OFFSET + (self._head % self.capacity) * RECORD.size
+        self._seq += 1
+        U64.pack_into(buf, SEQ_OFFSET, self._seq)
+        RECORD.pack_into(buf, slot, ts, down_mbps, up_mbps, math.nan if rtt_ms is None else rtt_ms)
+        self._head += 1
+        U64.pack_into(buf, HEAD_OFFSET, self._head)
+        self._seq += 1
+        U64.pack_into(buf, SEQ_OFFSET, self._seq)
+
+
+    def close(self) -> None:
+        """
+        Release and remove the segment.
+        """
+        try:
+            self._buf.release()
+        except Exception:
+            pass
+        self._buf = None
+        try:
+            self._shm.close()
+            self._shm.unlink()
+        except Exception:
+            pass
+
+
+class SampleRingReader:
+    """
+    Reader side for any local process: maps the segment once, then reads
+    straight from shared memory under the seqlock (no syscalls per read).
+
+        reader = SampleRingReader()
+        ts, down, up, rtt = reader.latest()
+    """
+
+    def __init__(self, name: str = SEGMENT_NAME) -> None:
+        self._shm = _attach(name)
+        self._buf = self._shm.buf
+        magic, version, record_size, capacity, _ = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"Unsupported shared memory layout in {name!r}")
+        self.capacity: int = capacity
+
+
+    def _stable(self, read):
+        """
+        Run `read(head)` until it completes without a concurrent write.
+        """
+        buf = self._buf
+        for spin in range(_MAX_SPINS):
+            (before,) = U64.unpack_from(buf, SEQ_OFFSET)
+            if before & 1:
+                if spin > 100:
+                    time.sleep(0)
+                continue
+            (head,) = U64.unpack_from(buf, HEAD_OFFSET)
+            result = read(head)
+            (after,) = U64.unpack_from(buf, SEQ_OFFSET)
+            if before == after:
+                return result
+        raise TimeoutError("shared memory writer did not settle")
+
+
+    def _record(self, index: int) -> Sample:
+        ts, down, up, rtt = RECORD.unpack_from(self._buf, RECORDS_OFFSET + (index % self.capacity) * RECORD.size)
+        return ts, down, up, None if math.isnan(rtt) else rtt
+
+
+    def latest(self) -> Sample | None:
+        """
+        Newest sample, or None if nothing has been published yet.
+        """
+        return self._stable(lambda head: self._record(head - 1) if head else None)
+
+
+    def recent(self, count: int | None = None) -> list[Sample]:
+        """
+        Up to `count` newest samples (default: the whole ring), oldest first.
+        """
+        def _read(head: int) -> list[Sample]:
+            n = min(head, self.capacity, self.capacity if count is None else count)
+            return [self._record(i) for i in range(head - n, head)]
+        return self._stable(_read)
+
+
+    def head(self) -> int:
+        """
+        Total samples published; poll it to detect new data cheaply.
+        """
+        return U64.unpack_from(self._buf, HEAD_OFFSET)[0]
+
+
+    def close(self) -> None:
+        try:
+            self._buf.release()
+        except Exception:
+            pass
+        self._buf = None
+        try:
+            self._shm.close()
+        except Exception:
+            pass
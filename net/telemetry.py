@@ -0,0 +1,248 @@
+import errno
+import math
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+DEFAULT_PORT = 9750
+MAX_DATAGRAM = 1200           # stays under typical path MTUs, no IP fragmentation
+MAX_BUFFERED_RECORDS = 3600   # ~1 h of samples; the oldest are dropped beyond this
+FLUSH_SEC = 5.0
+RECONNECT_SEC = 10.0          # TCP: wait this long after a failed connect
+
+# Datagram (UDP payload, or one TCP frame after a u16 little-endian length):
+#   header  "<4sBBHI": magic b"NSWM", version 1, name length, record count, sequence
+#   name    "site/host" in UTF-8 (at most 255 bytes)
+#   records "<Bdfff" x count: kind, ts (epoch s), then
+#       kind 1 (sample):    down Mb/s, up Mb/s, rtt ms (NaN = ping lost)
+#       kind 2 (speedtest): down Mb/s, up Mb/s, added latency ms (NaN = not measured)
+# All records have the same size so a receiver decodes a batch with one
+# struct.iter_unpack call. The sequence number increases per datagram and
+# lets the receiver count datagrams lost in transit.
+MAGIC = b"NSWM"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+RECORD = struct.Struct("<Bdfff")
+FRAME_LENGTH = struct.Struct("<H")
+KIND_SAMPLE = 1
+KIND_SPEEDTEST = 2
+
+
+def parse_address(value: str, default_port: int = DEFAULT_PORT) -> tuple[str, int]:
+    """
+    "host:port" / "host" / "[v6]:port" / "[v6]" -> (host, port). A bare IPv6
+    address (several colons, no brackets) is the host with the default port.
+    """
+    value = value.strip()
+    if value.count(":") > 1 and not value.startswith("["):
+        return value, default_port
+    host, sep, port = value.rpartition(":")
+    if not sep or "]" in port:
+        return value.strip("[]"), default_port
+    return host.strip("[]"), int(port)
+
+
+def encode_datagram(name: bytes, seq: int, records: list[bytes]) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, len(name), len(records), seq & 0xFFFFFFFF) + name + b"".join(records)
+
+
+def decode_datagram(data: bytes | memoryview) -> tuple[str, int, list[tuple[int, float, float, float, float]]]:
+    """
+    (name, sequence, [(kind, ts, a, b, c), ...]); raises ValueError if malformed.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("Short datagram")
+    magic, version, name_len, count, seq = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a telemetry datagram")
+    start = HEADER.size + name_len
+    end = start + count * RECORD.size
+    if end != len(data):
+        raise ValueError("Record count does not match datagram size")
+    name = bytes(data[HEADER.size:start]).decode("utf-8", "replace")
+    return name, seq, list(RECORD.iter_unpack(memoryview(data)[start:end]))
+
+
+class TelemetrySender:
+    """
+    Batches samples and speedtest results into compact datagrams and pushes
+    them to an aggregator over UDP (default) or TCP.
+
+    `add_sample` / `add_speedtest` only pack a record into a bounded buffer
+    (drop-oldest: `dropped` counts what fell off); `flush()` sends whole
+    batches and never blocks: UDP datagrams that the socket refuses are
+    dropped, while TCP keeps records buffered until the connection accepts
+    them and reconnects at most every RECONNECT_SEC. Safe from any thread.
+
+    The aggregator's name is looked up by `resolve()` (blocking DNS, run it
+    off the event loop); `flush()` sends nothing until it has succeeded and
+    forgets the address after a socket error so it is looked up again.
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        name: str,
+        transport: str = "udp",
+        max_records: int = MAX_BUFFERED_RECORDS,
+    ) -> None:
+        self.address = address
+        self.transport = transport
+        self.name = name.encode("utf-8")[:255]
+        self.per_datagram = (MAX_DATAGRAM - HEADER.size - len(self.name)) // RECORD.size
+        self._records: deque[bytes] = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._target: tuple[int, tuple] | None = None  # (family, sockaddr) from resolve()
+        self._sock: socket.socket | None = None
+        self._connecting = False
+        self._retry_at = 0.0
+        self._out = bytearray()  # TCP: frame taken from the buffer but not yet fully written
+        self._out_records = 0
+        self._seq = 0
+        self.sent: int = 0      # datagrams (TCP: whole frames) handed to the socket
+        self.dropped: int = 0   # records lost to the buffer bound or a refused datagram
+
+
+    def add_sample(self, ts: float, down_mbps: float, up_mbps: float, rtt_ms: float | None) -> None:
+        self._add(RECORD.pack(KIND_SAMPLE, ts, down_mbps, up_mbps, math.nan if rtt_ms is None else rtt_ms))
+
+
+    def add_speedtest(self, ts: float, down_mbps: float, up_mbps: float, added_ms: float | None) -> None:
+        self._add(RECORD.pack(KIND_SPEEDTEST, ts, down_mbps, up_mbps, math.nan if added_ms is None else added_ms))
+
+
+    def _add(self, record: bytes) -> None:
+        with self._lock:
+            if len(self._records) == self._records.maxlen:
+                self.dropped += 1
+            self._records.append(record)
+
+
+    @property
+    def resolved(self) -> bool:
+        return self._target is not None
+
+
+    def resolve(self) -> bool:
+        """
+        Look up the aggregator address and cache it for `flush`. Blocking;
+        returns False if the lookup failed (records stay buffered).
+        """
+        kind = socket.SOCK_STREAM if self.transport == "tcp" else socket.SOCK_DGRAM
+        try:
+            family, _, _, _, sockaddr = socket.getaddrinfo(self.address[0], self.address[1], type=kind)[0]
+        except (OSError, UnicodeError, IndexError):
+            return False
+        with self._lock:
+            self._target = (family, sockaddr)
+        return True
+
+
+    def _records_in(self, datagram: bytes) -> int:
+        return (len(datagram) - HEADER.size - len(self.name)) // RECORD.size
+
+
+    def _take_batch(self) -> bytes | None:
+        """
+        Pop up to one datagram's worth of records (caller holds the lock).
+        """
+        if not self._records:
+            return None
+        n = min(self.per_datagram, len(self._records))
+        batch = [self._records.popleft() for _ in range(n)]
+        self._seq += 1
+        return encode_datagram(self.name, self._seq, batch)
+
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._target is None:
+                return
+            try:
+                if self.transport == "tcp":
+                    self._flush_tcp()
+                else:
+                    self._flush_udp()
+            except OSError:
+                self._close_socket()
+                self._target = None
+
+
+    def _flush_udp(self) -> None:
+        family, sockaddr = self._target
+        if self._sock is None:
+            self._sock = socket.socket(family, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+        while True:
+            datagram = self._take_batch()
+            if datagram is None:
+                return
+            try:
+                self._sock.sendto(datagram, sockaddr)
+                self.sent += 1
+            except (BlockingIOError, InterruptedError):
+                self.dropped += self._records_in(datagram)
+                return
+            except OSError:
+                self.dropped += self._records_in(datagram)
+                raise
+
+
+    def _flush_tcp(self) -> None:
+        if self._sock is None:
+            if time.monotonic() < self._retry_at:
+                return
+            self._retry_at = time.monotonic() + RECONNECT_SEC
+            family, sockaddr = self._target
+            self._sock = socket.socket(family, socket.SOCK_STREAM)
+            self._sock.setblocking(False)
+            err = self._sock.connect_ex(sockaddr)
+            if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", -1)):
+                raise OSError(err, "connect failed")
+            self._connecting = True
+        if self._connecting:
+            _, writable, failed = select.select([], [self._sock], [self._sock], 0)
+            if failed:
+                raise OSError("connect failed")
+            if not writable:
+                return  # still connecting; records stay buffered
+            err = self._sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                raise OSError(err, "connect failed")
+            self._connecting = False
+        while True:
+            if not self._out:
+                datagram = self._take_batch()
+                if datagram is None:
+                    return
+                self._out += FRAME_LENGTH.pack(len(datagram)) + datagram
+                self._out_records = self._records_in(datagram)
+            try:
+                written = self._sock.send(self._out)
+            except (BlockingIOError, InterruptedError):
+                return
+            del self._out[:written]
+            if not self._out:
+                self.sent += 1
+
+
+    def _close_socket(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._connecting = False
+        if self._out:
+            self.dropped += self._out_records  # a partial frame can't be resumed on a new connection
+            self._out.clear()
+
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._close_socket()
@@ -0,0 +1,396 @@
+import asyncio
+import concurrent.futures
+import ssl
+import time
+from typing import Any, Callable, NamedTuple
+from urllib.parse import urlsplit
+
+from net.autotune import StreamRamp
+from utils.cancel import CancelToken, Cancelled
+
+DEFAULT_STREAMS = 8
+DOWNLOAD_REQUEST_BYTES = 25 * 1024 * 1024
+UPLOAD_REQUEST_BYTES = 1 * 1024 * 1024
+READ_CHUNK = 256 * 1024
+WRITE_CHUNK = 64 * 1024
+SAMPLE_INTERVAL_SEC = 0.1
+WARMUP_MIN_SEC = 0.5
+WARMUP_MAX_SEC = 4.0
+STEADY_WINDOWS = 5          # windows compared for steady-state detection
+STEADY_SPREAD = 0.15        # (max - min) / mean below this counts as steady
+MEASURE_SEC = 6.0
+
+# One shared, never-mutated payload; upload bodies are slices of it
+_PAYLOAD = memoryview(bytes(WRITE_CHUNK))
+
+
+class PhaseResult(NamedTuple):
+    """
+    One direction of a throughput test.
+    """
+    mbps: float
+    streams: int
+    warmup_sec: float
+    measured_sec: float
+    bytes: int
+
+
+class ThroughputResult(NamedTuple):
+    down: PhaseResult
+    up: PhaseResult
+
+
+class Endpoint:
+    """
+    Parsed http(s) URL. A `{bytes}` placeholder in the path is replaced
+    with the requested payload size on each request.
+    """
+
+    def __init__(self, url: str) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported scheme in {url!r}")
+        self.url = url
+        self.secure = parts.scheme == "https"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.secure else 80)
+        self.target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.host_header = parts.netloc
+
+
+    def request_target(self, size: int) -> str:
+        return self.target.replace("{bytes}", str(size))
+
+
+class ConnectionPool:
+    """
+    Keep-alive connections to one endpoint, reused across requests and phases.
+    Connections interrupted mid-response are closed instead of being returned.
+    """
+
+    def __init__(self, endpoint: Endpoint) -> None:
+        self.endpoint = endpoint
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.opened: int = 0
+        self.reused: int = 0
+
+
+    async def acquire(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                self.reused += 1
+                return reader, writer
+            writer.close()
+        context = ssl.create_default_context() if self.endpoint.secure else None
+        reader, writer = await asyncio.open_connection(
+            self.endpoint.host, self.endpoint.port, ssl=context, limit=READ_CHUNK,
+        )
+        self.opened += 1
+        return reader, writer
+
+
+    def release(self, conn: tuple[asyncio.StreamReader, asyncio.StreamWriter], reusable: bool) -> None:
+        if reusable and not conn[1].is_closing():
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+
+
+    def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+async def _read_response(reader: asyncio.StreamReader, counter: list[int] | None) -> bool:
+    """
+    Read one HTTP/1.1 response, counting body bytes into `counter[0]`.
+    Returns True if the connection may be kept alive.
+    """
+    status = await reader.readline()
+    if not status:
+        raise ConnectionError("Connection closed")
+    if int(status.split()[1]) >= 400:
+        raise ConnectionError(status.decode("latin-1").strip())
+
+    length: int | None = None
+    chunked = False
+    keep_alive = not status.startswith(b"HTTP/1.0")
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        value = value.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding" and b"chunked" in value:
+            chunked = True
+        elif name == b"connection":
+            keep_alive = value == b"keep-alive" or (keep_alive and value != b"close")
+
+    async def _drain(n: int) -> None:
+        while n > 0:
+            data = await reader.read(min(n, READ_CHUNK))
+            if not data:
+                raise ConnectionError("Connection closed mid-body")
+            n -= len(data)
+            if counter is not None:
+                counter[0] += len(data)
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            await _drain(size)
+            await reader.readline()
+    elif length is not None:
+        await _drain(length)
+    else:
+        # Body delimited by connection close
+        while True:
+            data = await reader.read(READ_CHUNK)
+            if not data:
+                return False
+            if counter is not None:
+                counter[0] += len(data)
+    return keep_alive
+
+
+class ThroughputTester:
+    """
+    Multi-stream HTTP throughput tester built on asyncio streams.
+
+    `download(streams)` / `upload(streams)` each run N concurrent request
+    loops against the configured endpoints, sample the aggregate byte count
+    every SAMPLE_INTERVAL_SEC, wait for the rate to settle (warm-up), then
+    measure for MEASURE_SEC. With `max_streams` above `streams` the warm-up
+    also ramps: streams are doubled, each time waiting for the rate to
+    settle again, until a doubling stops paying off (see
+    `net.autotune.StreamRamp`); the measurement then runs at the chosen
+    count. Connections are pooled per endpoint and reused across requests
+    and phases.
+    """
+
+    def __init__(
+        self,
+        download_url: str,
+        upload_url: str | None = None,
+        measure_sec: float = MEASURE_SEC,
+        warmup_max_sec: float = WARMUP_MAX_SEC,
+        on_phase: Callable[[str], Any] | None = None,
+    ) -> None:
+        self.download_pool = ConnectionPool(Endpoint(download_url))
+        self.upload_pool = ConnectionPool(Endpoint(upload_url)) if upload_url else None
+        self.measure_sec = measure_sec
+        self.warmup_max_sec = warmup_max_sec
+        self._on_phase = on_phase
+
+
+    async def _download_loop(self, counter: list[int]) -> None:
+        pool = self.download_pool
+        endpoint = pool.endpoint
+        request = (
+            f"GET {endpoint.request_target(DOWNLOAD_REQUEST_BYTES)} HTTP/1.1\r\n"
+            f"Host: {endpoint.host_header}\r\n"
+            "Connection: keep-alive\r\n"
+            "Accept-Encoding: identity\r\n\r\n"
+        ).encode("ascii")
+        while True:
+            conn = await pool.acquire()
+            reusable = False
+            try:
+                conn[1].write(request)
+                reusable = await _read_response(conn[0], counter)
+            finally:
+                pool.release(conn, reusable)
+
+
+    async def _upload_loop(self, counter: list[int]) -> None:
+        pool = self.upload_pool
+        endpoint = pool.endpoint
+        head = (
+            f"POST {endpoint.request_target(UPLOAD_REQUEST_BYTES)} HTTP/1.1\r\n"
+            f"Host: {endpoint.host_header}\r\n"
+            "Connection: keep-alive\r\n"
+            "Content-Type: application/octet-stream\r\n"
+            f"Content-Length: {UPLOAD_REQUEST_BYTES}\r\n\r\n"
+        ).encode("ascii")
+        while True:
+            conn = await pool.acquire()
+            reusable = False
+            try:
+                reader, writer = conn
+                writer.write(head)
+                remaining = UPLOAD_REQUEST_BYTES
+                while remaining > 0:
+                    n = min(remaining, WRITE_CHUNK)
+                    writer.write(_PAYLOAD[:n])
+                    await writer.drain()
+                    remaining -= n
+                reusable = await _read_response(reader, None)
+                # Count only bodies the server acknowledged: bytes merely
+                # accepted by the local socket buffer would inflate the rate
+                counter[0] += UPLOAD_REQUEST_BYTES
+            finally:
+                pool.release(conn, reusable)
+
+
+    async def _settle(self, counter: list[int], tasks: list[asyncio.Task]) -> float:
+        """
+        Warm-up: wait until the last few window rates agree (or
+        warmup_max_sec passes). Returns the rate over the second half of
+        the wait in Mb/s, which is steadier than the last few windows when
+        uploads are only counted once per acknowledged request.
+        """
+        started = last_time = time.perf_counter()
+        last_bytes = counter[0]
+        rates: list[float] = []
+        marks: list[tuple[float, int]] = [(started, last_bytes)]
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL_SEC)
+            self._raise_if_all_failed(tasks)
+            now = time.perf_counter()
+            rates.append((counter[0] - last_bytes) / max(now - last_time, 1e-9))
+            last_time, last_bytes = now, counter[0]
+            marks.append((now, last_bytes))
+            elapsed = now - started
+            if elapsed >= self.warmup_max_sec:
+                break
+            if elapsed >= WARMUP_MIN_SEC and len(rates) >= STEADY_WINDOWS:
+                window = rates[-STEADY_WINDOWS:]
+                mean = sum(window) / len(window)
+                if mean > 0 and (max(window) - min(window)) / mean < STEADY_SPREAD:
+                    break
+        half_time, half_bytes = marks[len(marks) // 2]
+        return (last_bytes - half_bytes) * 8.0 / (max(last_time - half_time, 1e-9) * 1_000_000.0)
+
+
+    async def _run_phase(self, name: str, loop_fn: Callable, streams: int, max_streams: int | None = None) -> PhaseResult:
+        """
+        Run `streams` copies of `loop_fn` (ramping up to `max_streams`),
+        detect steady state, and measure.
+        """
+        if self._on_phase:
+            self._on_phase(name)
+        counter = [0]
+        tasks = [asyncio.create_task(loop_fn(counter)) for _ in range(max(1, streams))]
+        try:
+            started = time.perf_counter()
+            mbps = await self._settle(counter, tasks)
+            if max_streams and max_streams > len(tasks):
+                ramp = StreamRamp(len(tasks), max_streams)
+                trial = ramp.record(len(tasks), mbps)
+                while trial is not None:
+                    tasks += [asyncio.create_task(loop_fn(counter)) for _ in range(trial - len(tasks))]
+                    trial = ramp.record(trial, await self._settle(counter, tasks))
+                if ramp.streams < len(tasks):
+                    # The last doubling did not pay off: drop back and settle again
+                    extra = tasks[ramp.streams:]
+                    del tasks[ramp.streams:]
+                    for task in extra:
+                        task.cancel()
+                    await asyncio.gather(*extra, return_exceptions=True)
+                    await self._settle(counter, tasks)
+            warmup_sec = time.perf_counter() - started
+
+            # Steady state: measure total bytes over a fixed window
+            base_bytes, base_time = counter[0], time.perf_counter()
+            while time.perf_counter() - base_time < self.measure_sec:
+                await asyncio.sleep(SAMPLE_INTERVAL_SEC)
+                self._raise_if_all_failed(tasks)
+            measured_sec = time.perf_counter() - base_time
+            total = counter[0] - base_bytes
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        mbps = total * 8.0 / (measured_sec * 1_000_000.0)
+        return PhaseResult(mbps, len(tasks), warmup_sec, measured_sec, total)
+
+
+    def _raise_if_all_failed(self, tasks: list[asyncio.Task]) -> None:
+        if tasks and all(task.done() for task in tasks):
+            error = tasks[0].exception()
+            raise error if error else ConnectionError("All streams stopped")
+
+
+    async def download(self, streams: int = DEFAULT_STREAMS, max_streams: int | None = None) -> PhaseResult:
+        return await self._run_phase("download", self._download_loop, streams, max_streams)
+
+
+    async def upload(self, streams: int = DEFAULT_STREAMS, max_streams: int | None = None) -> PhaseResult:
+        if self.upload_pool is None:
+            raise ValueError("No upload endpoint configured")
+        return await self._run_phase("upload", self._upload_loop, streams, max_streams)
+
+
+    def close(self) -> None:
+        self.download_pool.close()
+        if self.upload_pool:
+            self.upload_pool.close()
+
+
+async def _watch_token(token: CancelToken, task: asyncio.Task) -> None:
+    """
+    Cancel `task` as soon as the token is cancelled or its deadline passes.
+    """
+    while not task.done():
+        if token.cancelled:
+            task.cancel()
+            return
+        await asyncio.sleep(0.05)
+
+
+def run_throughput_test(
+    download_url: str,
+    upload_url: str | None,
+    token: CancelToken,
+    streams: int = DEFAULT_STREAMS,
+    upload_streams: int | None = None,
+    max_streams: int | None = None,
+    max_upload_streams: int | None = None,
+    loop: asyncio.AbstractEventLoop | None = None,
+    **tester_kw: Any,
+) -> ThroughputResult:
+    """
+    Blocking helper: run download then upload on `loop` (the app's shared
+    loop, running on another thread) or, without one, on a private event
+    loop. Upload starts at `upload_streams` (default: `streams`); the `max_*`
+    bounds enable ramping per direction. Raises `Cancelled` if the token
+    fires first or the shared loop shuts down.
+    """
+    async def _main() -> ThroughputResult:
+        tester = ThroughputTester(download_url, upload_url, **tester_kw)
+        try:
+            down = await tester.download(streams, max_streams)
+            up = (
+                await tester.upload(upload_streams or streams, max_upload_streams)
+                if upload_url else PhaseResult(0.0, 0, 0.0, 0.0, 0)
+            )
+            return ThroughputResult(down, up)
+        finally:
+            tester.close()
+
+    async def _guarded() -> ThroughputResult:
+        main = asyncio.create_task(_main())
+        watcher = asyncio.create_task(_watch_token(token, main))
+        try:
+            return await main
+        except asyncio.CancelledError:
+            raise Cancelled()
+        finally:
+            watcher.cancel()
+
+    token.raise_if_cancelled()
+    if loop is None:
+        return asyncio.run(_guarded())
+    try:
+        return asyncio.run_coroutine_threadsafe(_guarded(), loop).result()
+    except concurrent.futures.CancelledError:
+        raise Cancelled()
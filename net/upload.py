@@ -0,0 +1,92 @@
+from typing import Any
+
+# Upload request sizes for speedtest-cli: larger bodies saturate the pipe
+# more consistently and reduce under-reporting
+SPEEDTEST_UPLOAD_SIZES = [
+    256 * 1024,
+    512 * 1024,
+    1 * 1024 * 1024,
+    2 * 1024 * 1024,
+    5 * 1024 * 1024,
+    10 * 1024 * 1024,
+    20 * 1024 * 1024,
+    30 * 1024 * 1024,
+]
+UPLOAD_READ_CHUNK = 64 * 1024  # largest slice handed out per read()
+
+# speedtest-cli bodies are b"content1=" followed by "0-9A-Z" repeated. Every
+# body is served from this one read-only buffer: for any offset into the
+# 36-byte cycle a full chunk follows, so a read is one memoryview slice
+_PREFIX = memoryview(b"content1=")
+_CHARS = b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_PATTERN = memoryview(_CHARS * (UPLOAD_READ_CHUNK // len(_CHARS) + 2))
+
+
+def streaming_upload_data(module: Any) -> type:
+    """
+    Subclass of `module.HTTPUploaderData` (speedtest-cli) that streams its
+    body instead of building it in memory.
+
+    The stock class materializes each body up front or on first read,
+    three copies deep (pattern string, slice, encoded bytes), so 8 threads
+    of 30 MB requests hold hundreds of MB. This one only tracks a position
+    and returns slices of the shared pattern, so memory stays flat whatever
+    the configured sizes. Timeout/shutdown handling and the per-read
+    `total` bookkeeping the library sums for its result are unchanged.
+    """
+    base = module.HTTPUploaderData
+    if getattr(base, "streaming", False):
+        return base
+    timeout_error = module.SpeedtestUploadTimeout
+
+    class StreamingUploaderData(base):
+        streaming = True
+
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            super().__init__(*args, **kwargs)
+            self._pos = 0
+            # threading.Event / CancelToken.as_event(); the library's own
+            # FakeShutdownEvent (no event passed) only has the old isSet()
+            event = self._shutdown_event
+            self._is_shutdown = getattr(event, "is_set", None) or event.isSet
+
+
+        def pre_allocate(self) -> None:
+            pass  # nothing to build
+
+
+        @property
+        def data(self) -> "StreamingUploaderData":
+            return self
+
+
+        def read(self, n: int = 10240) -> memoryview:
+            if self._is_shutdown() or module.timeit.default_timer() - self.start > self.timeout:
+                raise timeout_error()
+            pos = self._pos
+            n = min(n if n and n > 0 else UPLOAD_READ_CHUNK, UPLOAD_READ_CHUNK, int(self.length) - pos)
+            if n <= 0:
+                chunk = _PATTERN[:0]
+            elif pos < len(_PREFIX):
+                chunk = _PREFIX[pos:pos + n]
+            else:
+                offset = (pos - len(_PREFIX)) % len(_CHARS)
+                chunk = _PATTERN[offset:offset + n]
+            self._pos = pos + len(chunk)
+            self.total.append(len(chunk))
+            return chunk
+
+    return StreamingUploaderData
+
+
+def install_streaming_uploads(module: Any) -> bool:
+    """
+    Make speedtest-cli's `upload()` stream its bodies (see
+    `streaming_upload_data`). Idempotent; returns False if the library
+    doesn't have the expected internals, leaving it untouched.
+    """
+    try:
+        module.HTTPUploaderData = streaming_upload_data(module)
+        return True
+    except AttributeError:
+        return False
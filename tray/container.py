@@ -5,10 +5,15 @@ from PIL import Image, UnidentifiedImageError
 from pystray import Icon, Menu, MenuItem
 
 from utils import paths
-from utils.config import get_opacity
+from tray.sparkline import MODES as LIVE_ICON_MODES, SparklineIcon
+from utils.config import get_opacity, get_tray_icon_mode
 from utils.logger import info
+from utils.state import AppState, StateStore
 
 ICON_FILE = "icon.ico"
+REFRESH_INTERVAL_SEC = 0.25  # coalescing window for title/menu refreshes
+DIAGNOSTIC_LINES = 6  # max lines shown in the Diagnostics submenu
+TITLE_MAX_CHARS = 127  # Win32 tooltip (szTip) holds 128 WCHARs including the terminator
 
 
 class TrayController:
@@ -28,8 +33,19 @@ class TrayController:
         self.icon: Optional[Any] = None
         self.thread: Optional[threading.Thread] = None
         self.app.root.iconbitmap(paths.resource_path(ICON_FILE))
-        self._speedtest_check: bool = False
-        self._speedtest_summary: str = ""
+
+        # Menu callbacks read this in-memory snapshot only (never the config file)
+        self.state: StateStore = getattr(app, "state", None) or StateStore(opacity=get_opacity())
+        self._rendered_version: int = -1
+        self._rendered_title: str = ""
+        self._refresh_lock = threading.Lock()
+        self._refresh_timer: Any = None  # threading.Timer or runtime Timer; both have cancel()
+        self.refreshes: int = 0
+        self.state.subscribe(self._on_state_change)
+
+        # Optional live icon fed once per sampler tick (see `update_rate`)
+        mode = get_tray_icon_mode()
+        self._live_icon: SparklineIcon | None = SparklineIcon(mode) if mode in LIVE_ICON_MODES else None
 
 
     def _load_icon(self) -> Image.Image:
@@ -52,13 +68,18 @@ class TrayController:
 
         menu = Menu(
             MenuItem(lambda *_: self._menu_status_text(), None, enabled=False),
-            MenuItem("Check speedtest", self._on_check_speedtest, enabled=lambda *_: not self._speedtest_check),
+            MenuItem(lambda *_: self.state.snapshot().anomaly or "", None, enabled=False,
+                     visible=lambda *_: bool(self.state.snapshot().anomaly)),
+            MenuItem("Check speedtest", self._on_check_speedtest, enabled=lambda *_: not self.state.snapshot().speedtest_running),
             self._opacity_submenu(),
+            self._graph_window_submenu(),
+            self._diagnostics_submenu(),
             MenuItem("Show", lambda *_: self.app.ui_call(self.app.show_window)),
             MenuItem("Hide", lambda *_: self.app.ui_call(self.app.hide_window)),
             MenuItem("Quit", self.on_quit),
         )
-        self.icon = Icon(self.app_name, img, self.app_name, menu)
+        self.icon = Icon(self.app_name, img, self._title_for(self.state.snapshot()), menu)
+        self._rendered_title = self.icon.title
 
         # Run tray on its own thread so it doesn't block Tk's mainloop
         self.thread = threading.Thread(target=self.icon.run, daemon=True)
@@ -72,10 +93,15 @@ class TrayController:
         This is safe to call from the tray thread.
         """
         info("[TRAY] Quit requested")
+        with self._refresh_lock:
+            if self._refresh_timer:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
         if self.icon:
             self.icon.stop()
-        # Ensure Tk shutdown runs on its own main thread
-        self.app.ui_call(self.app.root.destroy)
+        # Ensure shutdown runs on Tk's main thread; prefer the app's full close
+        # so background work is cancelled before the window goes away
+        self.app.ui_call(getattr(self.app, "close", self.app.root.destroy))
 
 
     def _opacity_levels(self):
@@ -90,28 +116,22 @@ class TrayController:
         Pystray 'checked' callback that marks the current level.
         """
         def _checked(_item):
-            try:
-                return abs(get_opacity() - level) < 0.01
-            except Exception:
-                return False
+            return abs(self.state.snapshot().opacity - level) < 0.01
         return _checked
 
 
     def _make_set_opacity(self, level: float):
         """
-        Returns a handler that sets opacity via the Tk app and refreshes the tray menu.
+        Returns a handler that sets opacity via the Tk app.
+        The check mark moves once the app publishes the new opacity to the state store.
         """
         def _handler(_icon=None, _item=None):
             # Prefer the app API if available to keep UI thread safe and persist config
             if hasattr(self.app, "set_opacity"):
                 self.app.set_opacity(level)
                 info(f"[TRAY] Opacity chosen {level:.2f}")
-            # After change, refresh menu so the check moves
-            try:
-                if hasattr(self.icon, "update_menu"):
-                    self.icon.update_menu()
-            except Exception:
-                pass
+            else:
+                self.state.update(opacity=level)
         return _handler
 
 
@@ -132,49 +152,164 @@ class TrayController:
         return MenuItem("Opacity", Menu(*items))
 
 
-    def update_speedtest_summary(self, summary: str) -> None:
+    def _graph_window_submenu(self):
         """
-        Sets a short summary that appears in the tray title.
+        Builds the 'Graph window' submenu (10 s / 10 min / 1 h).
+        """
+        def _handler(seconds: int):
+            def _set(_icon=None, _item=None):
+                if hasattr(self.app, "set_graph_window"):
+                    self.app.set_graph_window(seconds)
+            return _set
+
+        def _checked(seconds: int):
+            return lambda _item: self.state.snapshot().graph_window == seconds
+
+        items = [
+            MenuItem(label, _handler(seconds), checked=_checked(seconds), radio=True)
+            for label, seconds in (("10 s", 10), ("10 min", 600), ("1 h", 3600))
+        ]
+        return MenuItem("Graph window", Menu(*items))
+
+
+    def _diagnostics_submenu(self):
+        """
+        Builds the read-only 'Diagnostics' submenu from the self-monitor lines
+        in the state snapshot, plus a toggle for tracemalloc tracking.
+        """
+        def _line(index: int):
+            def _text(_item):
+                lines = self.state.snapshot().diagnostics or ("Collecting...",)
+                return lines[index] if index < len(lines) else ""
+            return _text
+
+        def _visible(index: int):
+            def _check(_item):
+                return index < max(1, len(self.state.snapshot().diagnostics))
+            return _check
+
+        items = [MenuItem(_line(i), None, enabled=False, visible=_visible(i)) for i in range(DIAGNOSTIC_LINES)]
+        items.append(Menu.SEPARATOR)
+        items.append(MenuItem(
+            "Track allocations",
+            lambda *_: self.app.toggle_alloc_tracking() if hasattr(self.app, "toggle_alloc_tracking") else None,
+            checked=lambda _item: self.state.snapshot().alloc_tracking,
+        ))
+        return MenuItem("Diagnostics", Menu(*items))
+
+
+    def update_rate(self, down_mbps: float, up_mbps: float, dropped: bool = False) -> None:
         """
-        self._speedtest_summary = summary or ""
+        Feed one sample to the live icon, if enabled. The icon is only
+        replaced when its quantized picture changes. Safe from any thread.
+        """
+        if not self.icon or not self._live_icon:
+            return
         try:
-            if self.icon:
-                base = self.app_name
-                title = f"{base}\n{self._speedtest_summary}" if self._speedtest_summary else base
-                self.icon.title = title
-                self.icon.update_menu()
+            image = self._live_icon.update(down_mbps, up_mbps, dropped)
+            if image is not None:
+                self.icon.icon = image
         except Exception:
             pass
 
 
-    def start_speedtest_check(self) -> None:
+    def set_rate_scale(self, mbps: float | None) -> None:
         """
-        Marks speedtest as running.
+        Rate shown as a full-height bar (normally the last speedtest download).
         """
-        if self._speedtest_check:
+        if self._live_icon:
+            self._live_icon.set_scale(mbps)
+
+
+    def notify(self, message: str) -> None:
+        """
+        Show a desktop notification from the tray icon, where supported.
+        """
+        if not self.icon or not getattr(self.icon, "HAS_NOTIFICATION", False):
             return
-        self._speedtest_check = True
         try:
-            self.update_speedtest_summary("Speedtest is running...")
-            if getattr(self, "icon", None):
-                self.icon.update_menu()
+            self.icon.notify(message, self.app_name)
         except Exception:
             pass
 
 
+    def update_speedtest_summary(self, summary: str) -> None:
+        """
+        Sets a short summary that appears in the tray title.
+        """
+        self.state.update(speedtest_summary=summary or "")
+
+
+    def start_speedtest_check(self) -> None:
+        """
+        Marks speedtest as running.
+        """
+        self.state.update(speedtest_running=True, speedtest_summary="Speedtest is running...")
+
+
     def stop_speedtest_check(self) -> None:
         """
-        Clears running flag and refreshes the menu.
+        Clears running flag.
         The title will already hold the latest summary pushed by the app.
         """
-        self._speedtest_check = False
+        self.state.update(speedtest_running=False)
+
+
+    def _on_state_change(self, _state: AppState) -> None:
+        """
+        State store subscriber. Schedules one refresh per REFRESH_INTERVAL_SEC;
+        further changes inside that window are folded into the same refresh.
+        Uses the app's runtime timers when it has one, else a Timer thread.
+        """
+        with self._refresh_lock:
+            if self._refresh_timer is not None:
+                return
+            runtime = getattr(self.app, "runtime", None)
+            if runtime is not None:
+                self._refresh_timer = runtime.call_later(REFRESH_INTERVAL_SEC, self._refresh)
+                return
+            self._refresh_timer = threading.Timer(REFRESH_INTERVAL_SEC, self._refresh)
+            self._refresh_timer.daemon = True
+            self._refresh_timer.start()
+
+
+    def _refresh(self) -> None:
+        """
+        Push the latest snapshot to the icon: title if it changed, then one menu update.
+        """
+        with self._refresh_lock:
+            self._refresh_timer = None
+        snapshot = self.state.snapshot()
+        if not self.icon or snapshot.version == self._rendered_version:
+            return
         try:
-            if getattr(self, "icon", None):
-                self.icon.update_menu()
+            title = self._title_for(snapshot)
+            if title != self._rendered_title:
+                self.icon.title = title
+                self._rendered_title = title
+            self.icon.update_menu()
+            self._rendered_version = snapshot.version
+            self.refreshes += 1
         except Exception:
             pass
 
 
+    def _title_for(self, snapshot: AppState) -> str:
+        """
+        Tray tooltip: app name plus the speedtest summary and anomaly lines, if any.
+        Capped at TITLE_MAX_CHARS, since pystray rejects longer tooltips on Windows;
+        the anomaly line is dropped first (it is also shown in the menu), then the
+        rest is cut with an ellipsis.
+        """
+        lines = [self.app_name] + [line for line in (snapshot.speedtest_summary, snapshot.anomaly) if line]
+        title = "\n".join(lines)
+        if len(title) > TITLE_MAX_CHARS and snapshot.anomaly:
+            title = "\n".join(lines[:-1])
+        if len(title) > TITLE_MAX_CHARS:
+            title = title[:TITLE_MAX_CHARS - 1] + "\u2026"
+        return title
+
+
     def _on_check_speedtest(self, *_: Any) -> None:
         """
         Tray action handler. Asks the app to run a speedtest now.
@@ -187,4 +322,4 @@ class TrayController:
 
 
     def _menu_status_text(self) -> str:
-        return self._speedtest_summary or "Speedtest: --"
\ No newline at end of file
+        return self.state.snapshot().speedtest_summary or "Speedtest: --"
\ No newline at end of file
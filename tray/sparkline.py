@@ -0,0 +1,128 @@
+import math
+from collections import OrderedDict, deque
+
+from PIL import Image
+
+ICON_SIZE = 32           # pystray/Windows scale it down to the tray's 16 px at 100% DPI
+LEVELS = 16              # quantized bar heights; the icon is redrawn only when these change
+BAR_WIDTH = 2            # sparkline: pixels per sample, so ICON_SIZE // BAR_WIDTH samples shown
+DEFAULT_SCALE_MBPS = 100.0
+IMAGE_CACHE_SIZE = 128   # "bars" mode keeps this many finished icons (LRU)
+MODES = ("sparkline", "bars")
+
+# Palette of RGBA pixels; colors match the widget graph (lime down, cyan up, red ping loss)
+_CLEAR, _DOWN, _UP, _LOSS, _AXIS = range(5)
+_PALETTE = (b"\x00\x00\x00\x00", b"\x00\xff\x00\xff", b"\x00\xff\xff\xff", b"\xff\x00\x00\xff", b"\x5a\x5a\x5a\xff")
+
+
+def quantize(mbps: float, scale_mbps: float, levels: int = LEVELS) -> int:
+    """
+    Bar level 0..levels on a log scale up to `scale_mbps`, so light traffic
+    still shows while a saturated link fills the icon. Any traffic is >= 1.
+    """
+    if mbps <= 0.0:
+        return 0
+    level = math.ceil(levels * math.log1p(mbps) / math.log1p(scale_mbps))
+    return max(1, min(levels, level))
+
+
+class SparklineIcon:
+    """
+    Live tray icon image: a scrolling download sparkline ("sparkline") or
+    a download/upload bar pair ("bars").
+
+    Images are assembled from precomputed glyphs, one byte string of RGBA
+    pixels per (level, color) column, so an update is a bytes join plus one
+    `frombytes`/`transpose` with no drawing calls. Images are built
+    column-major and transposed once, because a column glyph is then one
+    contiguous run. `update` quantizes the sample and returns None when the
+    quantized picture is unchanged, which on an idle or steady link is most
+    ticks; pystray re-serializes the icon on every assignment, so skipping
+    those is the main saving. "bars" additionally caches finished images.
+    """
+
+    def __init__(
+        self,
+        mode: str = "sparkline",
+        size: int = ICON_SIZE,
+        levels: int = LEVELS,
+        bar_width: int = BAR_WIDTH,
+        scale_mbps: float = DEFAULT_SCALE_MBPS,
+    ) -> None:
+        self.mode = mode if mode in MODES else MODES[0]
+        self.size = size
+        self.levels = levels
+        self.bar_width = bar_width
+        self.scale_mbps = scale_mbps
+        self.updates: int = 0
+        self.regenerations: int = 0
+        self._glyphs = {
+            (level, color): self._column(level, color) for level in range(levels + 1) for color in (_DOWN, _UP, _LOSS)
+        }
+        self._wide = {key: glyph * bar_width for key, glyph in self._glyphs.items()}  # one sparkline sample
+        self._history: deque[tuple[int, int]] = deque([(0, _DOWN)] * (size // bar_width), maxlen=size // bar_width)
+        self._key: tuple | None = None
+        self._cache: OrderedDict[tuple, Image.Image] = OrderedDict()
+
+
+    def _column(self, level: int, color: int) -> bytes:
+        """
+        One pixel column, top to bottom: clear above the bar, the bar, and
+        a dim baseline pixel so an idle icon is still visible.
+        """
+        height = round(level * (self.size - 1) / self.levels)
+        return _PALETTE[_CLEAR] * (self.size - 1 - height) + _PALETTE[color] * height + _PALETTE[_AXIS]
+
+
+    def set_scale(self, scale_mbps: float | None) -> None:
+        """
+        Full-height rate, e.g. the last speedtest download.
+        """
+        if scale_mbps and scale_mbps > 0:
+            self.scale_mbps = float(scale_mbps)
+
+
+    def update(self, down_mbps: float, up_mbps: float, dropped: bool = False) -> Image.Image | None:
+        """
+        Feed one sample; returns a new RGBA image, or None if the icon
+        would look the same as the last one returned.
+        """
+        self.updates += 1
+        down = quantize(down_mbps, self.scale_mbps, self.levels)
+        if self.mode == "sparkline":
+            self._history.append((down, _LOSS if dropped else _DOWN))
+            key: tuple = tuple(self._history)
+        else:
+            key = (down, quantize(up_mbps, self.scale_mbps, self.levels), dropped)
+        if key == self._key:
+            return None
+        self._key = key
+        image = self._render(key)
+        self.regenerations += 1
+        return image
+
+
+    def _render(self, key: tuple) -> Image.Image:
+        if self.mode == "sparkline":
+            data = b"".join(map(self._wide.__getitem__, key))
+            return self._image(data, len(key) * self.bar_width)
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+            return image
+        down, up, dropped = key
+        half = self.size // 2
+        data = (
+            self._glyphs[(down, _LOSS if dropped else _DOWN)] * (half - 1)
+            + self._glyphs[(0, _DOWN)] * 2
+            + self._glyphs[(up, _UP)] * (self.size - half - 1)
+        )
+        image = self._image(data, self.size)
+        self._cache[key] = image
+        if len(self._cache) > IMAGE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return image
+
+
+    def _image(self, column_major: bytes, width: int) -> Image.Image:
+        return Image.frombytes("RGBA", (self.size, width), column_major).transpose(Image.Transpose.TRANSPOSE)
@@ -0,0 +1,236 @@
+import math
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, NamedTuple
+
+ALERT_QUEUE_SIZE = 64
+
+
+class Alert(NamedTuple):
+    """
+    A rule changing state: `firing` True when raised, False when it clears.
+    """
+    ts: float
+    rule: str
+    firing: bool
+    value: float
+    message: str
+
+
+class SlidingWindow:
+    """
+    Time-based sliding window over (ts, value) with O(1) amortized push and
+    O(1) mean/min/max: a running sum plus monotonic deques for min and max.
+    """
+
+    def __init__(self, window_sec: float) -> None:
+        self.window_sec = float(window_sec)
+        self._items: deque[tuple[float, float]] = deque()
+        self._mins: deque[tuple[float, float]] = deque()
+        self._maxs: deque[tuple[float, float]] = deque()
+        self._sum = 0.0
+        self._first_ts: float | None = None
+
+
+    def push(self, ts: float, value: float) -> None:
+        if self._first_ts is None:
+            self._first_ts = ts
+        self._items.append((ts, value))
+        self._sum += value
+        while self._mins and self._mins[-1][1] >= value:
+            self._mins.pop()
+        self._mins.append((ts, value))
+        while self._maxs and self._maxs[-1][1] <= value:
+            self._maxs.pop()
+        self._maxs.append((ts, value))
+        self._evict(ts - self.window_sec)
+
+
+    def _evict(self, cutoff: float) -> None:
+        items = self._items
+        while items and items[0][0] <= cutoff:
+            _, old = items.popleft()
+            self._sum -= old
+        while self._mins and self._mins[0][0] <= cutoff:
+            self._mins.popleft()
+        while self._maxs and self._maxs[0][0] <= cutoff:
+            self._maxs.popleft()
+
+
+    def full(self, ts: float) -> bool:
+        """
+        True once samples have been collected for (about) the whole window.
+        """
+        return self._first_ts is not None and ts - self._first_ts >= self.window_sec - 1.0
+
+
+    def reset(self) -> None:
+        self._items.clear()
+        self._mins.clear()
+        self._maxs.clear()
+        self._sum = 0.0
+        self._first_ts = None
+
+
+    def value(self, agg: str) -> float:
+        if not self._items:
+            return math.nan
+        if agg == "min":
+            return self._mins[0][1]
+        if agg == "max":
+            return self._maxs[0][1]
+        return self._sum / len(self._items)
+
+
+class Rule:
+    """
+    One configured rule (see `utils.config.get_alert_rules`).
+
+    Fires when the window aggregate crosses `threshold` (per `op`) and stays
+    raised until it crosses back past `clear` (hysteresis). After firing,
+    it cannot fire again for `cooldown_sec`.
+    """
+
+    def __init__(self, spec: Dict[str, Any]) -> None:
+        self.name: str = spec["name"]
+        self.metric: str = spec["metric"]
+        self.agg: str = spec["agg"]
+        self.op: str = spec["op"]
+        self.threshold: float = spec["threshold"]
+        self.clear: float = spec["clear"]
+        self.cooldown_sec: float = spec["cooldown_sec"]
+        self.window = SlidingWindow(spec["window_sec"])
+        self.firing: bool = False
+        self._last_fired: float = -math.inf
+
+
+    def _breached(self, value: float) -> bool:
+        return value < self.threshold if self.op == "<" else value > self.threshold
+
+
+    def _recovered(self, value: float) -> bool:
+        return value >= self.clear if self.op == "<" else value <= self.clear
+
+
+    def feed(self, ts: float, value: float) -> Alert | None:
+        """
+        Push one sample; return an Alert if the rule fires or clears.
+        """
+        self.window.push(ts, value)
+        if not self.window.full(ts):
+            return None
+        current = self.window.value(self.agg)
+        if not self.firing:
+            if self._breached(current) and ts - self._last_fired >= self.cooldown_sec:
+                self.firing = True
+                self._last_fired = ts
+                return Alert(ts, self.name, True, current, self._describe(current))
+        elif self._recovered(current):
+            self.firing = False
+            return Alert(ts, self.name, False, current, f"{self.name} cleared ({self.metric} {self.agg}={current:.3g})")
+        return None
+
+
+    def _describe(self, value: float) -> str:
+        window = f"{self.window.window_sec:g}s"
+        if self.metric == "loss":
+            return f"Ping loss {value * 100:.0f}% over {window}"
+        if self.metric in ("down_ratio", "up_ratio"):
+            direction = "Download" if self.metric == "down_ratio" else "Upload"
+            return f"{direction} at {value * 100:.0f}% of last speedtest for {window}"
+        return f"{self.name}: {self.metric} {self.agg}={value:.3g} {self.op} {self.threshold:g} over {window}"
+
+
+class RuleEngine:
+    """
+    Evaluates rules on the live sample stream, O(1) amortized per sample per
+    rule. `feed` runs in the sampler tick and only hands alerts to the
+    dispatcher; delivery (tray, log) happens after the tick.
+    """
+
+    def __init__(self, rules: Iterable[Dict[str, Any]], dispatcher: "AlertDispatcher") -> None:
+        self.rules = [Rule(spec) for spec in rules]
+        self.dispatcher = dispatcher
+        self._reference_down: float | None = None
+        self._reference_up: float | None = None
+
+
+    def set_reference(self, down_mbps: float | None, up_mbps: float | None) -> None:
+        """
+        Latest speedtest result, the base for the *_ratio metrics.
+        Ratio rules restart their windows so old ratios are not mixed in.
+        """
+        self._reference_down = down_mbps if down_mbps and down_mbps > 0 else None
+        self._reference_up = up_mbps if up_mbps and up_mbps > 0 else None
+        for rule in self.rules:
+            if rule.metric in ("down_ratio", "up_ratio"):
+                rule.window.reset()
+
+
+    def feed(self, ts: float, down_mbps: float, up_mbps: float, rtt_ms: float | None) -> None:
+        if not self.rules:
+            return
+        for rule in self.rules:
+            value = self._metric(rule.metric, down_mbps, up_mbps, rtt_ms)
+            if value is None:
+                continue
+            alert = rule.feed(ts, value)
+            if alert is not None:
+                self.dispatcher.submit(alert)
+
+
+    def _metric(self, name: str, down_mbps: float, up_mbps: float, rtt_ms: float | None) -> float | None:
+        if name == "down_mbps":
+            return down_mbps
+        if name == "up_mbps":
+            return up_mbps
+        if name == "rtt_ms":
+            return rtt_ms
+        if name == "loss":
+            return 0.0 if rtt_ms is not None else 1.0
+        if name == "down_ratio":
+            return down_mbps / self._reference_down if self._reference_down else None
+        if name == "up_ratio":
+            return up_mbps / self._reference_up if self._reference_up else None
+        return None
+
+
+class AlertDispatcher:
+    """
+    Bounded hand-off between rule evaluation and delivery. `submit` never
+    blocks: when ALERT_QUEUE_SIZE alerts are already waiting the new one is
+    dropped and counted. Handlers run one alert at a time; a failing
+    handler does not stop the rest.
+
+    `post` (the runtime's call_soon) delivers each alert as its own
+    callback after the current one returns, so the sampler tick that
+    raised it is never delayed. Submit from the thread `post` runs on.
+    """
+
+    def __init__(
+        self,
+        handlers: Iterable[Callable[[Alert], None]],
+        post: Callable[..., None],
+        maxsize: int = ALERT_QUEUE_SIZE,
+    ) -> None:
+        self.handlers = list(handlers)
+        self.maxsize = maxsize
+        self.post = post
+        self._pending: int = 0
+        self.dropped: int = 0
+
+
+    def submit(self, alert: Alert) -> None:
+        if self._pending >= self.maxsize:
+            self.dropped += 1
+            return
+        self._pending += 1
+        self.post(self._deliver, alert)
+
+
+    def _deliver(self, alert: Alert) -> None:
+        self._pending -= 1
+        for handler in self.handlers:
+            try:
+                handler(alert)
+            except Exception:
+                pass
@@ -0,0 +1,263 @@
+import json
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable
+
+from utils.alerts import Alert
+from utils.history import history_dir, write_json_atomic
+
+ANOMALY_FILE = "anomaly.json"
+ANOMALY_SAVE_SEC = 10 * 60
+HALF_LIFE_WEEKS = 2.0   # a slot's baseline forgets half its weight in this many weeks of updates
+MIN_COUNT = 10          # updates a slot needs before it is used for scoring
+Z_CLIP = 3.0            # values are clipped to mean +- Z_CLIP sigma before learning
+
+# Three levels per metric, most specific first: hour of week (Mon 00h = 0),
+# hour of day, and one global slot. All are updated on every value; scoring
+# uses the most specific level that has seen MIN_COUNT values, so a new
+# install starts flagging within hours and sharpens to weekly seasonality.
+_LEVELS = (("week", 168), ("day", 24), ("all", 1))
+_DAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+class SeasonalBaseline:
+    """
+    EWMA mean and variance per hour-of-week slot (with hour-of-day and
+    global fallbacks), O(1) per update and a fixed 3 x 193 floats of state.
+
+    `samples_per_hour` is how often the metric is fed; each level's
+    smoothing factor is derived from it so every slot has the same half-life
+    in weeks. Until a slot has 1/alpha values the update is a plain running
+    mean, so early estimates are not dominated by the first value.
+    """
+
+    def __init__(self, samples_per_hour: float, min_std: float) -> None:
+        self.min_std = min_std
+        self.alphas: list[float] = []
+        for _, slots in _LEVELS:
+            per_week = samples_per_hour * 168.0 / slots
+            self.alphas.append(1.0 - 0.5 ** (1.0 / max(1.0, HALF_LIFE_WEEKS * per_week)))
+        size = sum(slots for _, slots in _LEVELS)
+        self.mean = [0.0] * size
+        self.var = [0.0] * size
+        self.count = [0] * size
+
+
+    @staticmethod
+    def slots(how: int, hod: int) -> tuple[int, int, int]:
+        """
+        Flat indices of the three levels for hour of week `how` / hour of day `hod`.
+        """
+        return how, 168 + hod, 168 + 24
+
+
+    def expected(self, indices: tuple[int, int, int]) -> tuple[float, float] | None:
+        """
+        (mean, std) from the most specific warmed-up level, or None.
+        """
+        for index in indices:
+            if self.count[index] >= MIN_COUNT:
+                return self.mean[index], max(self.min_std, math.sqrt(self.var[index]))
+        return None
+
+
+    def update(self, indices: tuple[int, int, int], value: float) -> None:
+        for level, index in enumerate(indices):
+            count = self.count[index] + 1
+            self.count[index] = count
+            alpha = max(self.alphas[level], 1.0 / count)
+            diff = value - self.mean[index]
+            incr = alpha * diff
+            self.mean[index] += incr
+            self.var[index] = (1.0 - alpha) * (self.var[index] + diff * incr)
+
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"mean": list(self.mean), "var": list(self.var), "count": list(self.count)}
+
+
+    def load(self, data: Dict[str, Any]) -> None:
+        size = len(self.mean)
+        if all(len(data.get(key, ())) == size for key in ("mean", "var", "count")):
+            self.mean = [float(v) for v in data["mean"]]
+            self.var = [float(v) for v in data["var"]]
+            self.count = [int(v) for v in data["count"]]
+
+
+class AnomalyDetector:
+    """
+    One metric: scores each value against its seasonal baseline and keeps
+    a flag with hysteresis. It raises after `persist` consecutive values
+    beyond `z_on` standard deviations in the bad direction (`high_is_bad`)
+    and clears once a value is back within `z_off`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        unit: str,
+        high_is_bad: bool,
+        samples_per_hour: float,
+        min_std: float,
+        z_on: float,
+        z_off: float,
+        persist: int,
+    ) -> None:
+        self.name = name
+        self.label = label
+        self.unit = unit
+        self.sign = 1.0 if high_is_bad else -1.0
+        self.baseline = SeasonalBaseline(samples_per_hour, min_std)
+        self.z_on = z_on
+        self.z_off = z_off
+        self.persist = persist
+        self.firing: bool = False
+        self._streak = 0
+
+
+    def feed(self, ts: float, value: float, local: datetime) -> Alert | None:
+        indices = SeasonalBaseline.slots(local.weekday() * 24 + local.hour, local.hour)
+        expected = self.baseline.expected(indices)
+        alert: Alert | None = None
+        learn = value
+        if expected is not None:
+            mean, std = expected
+            z = self.sign * (value - mean) / std
+            if z >= self.z_on:
+                self._streak += 1
+                if not self.firing and self._streak >= self.persist:
+                    self.firing = True
+                    alert = Alert(
+                        ts, f"anomaly_{self.name}", True, z,
+                        f"{self.label} {value:.0f} {self.unit}, usually {mean:.0f}±{std:.0f} "
+                        f"for {_DAY_NAMES[local.weekday()]} {local.hour:02d}h",
+                    )
+            else:
+                self._streak = 0
+                if self.firing and z <= self.z_off:
+                    self.firing = False
+                    alert = Alert(ts, f"anomaly_{self.name}", False, z, f"{self.label} back to normal ({value:.0f} {self.unit})")
+            # Clipped (Huber-style) so one outage can't blow up the variance and
+            # clear itself; a lasting shift still widens the band and is absorbed
+            learn = min(max(value, mean - Z_CLIP * std), mean + Z_CLIP * std)
+        self.baseline.update(indices, learn)
+        return alert
+
+
+class AnomalyMonitor:
+    """
+    Seasonal anomaly detection over the sampler stream and speedtest results.
+
+    Per-second samples are folded into per-minute RTT means and loss ratios
+    (O(1) per sample) and each minute is scored; speedtest results are
+    scored as they arrive. Per-second throughput itself is not scored: it
+    follows what the user is doing, while speedtests measure what the link
+    can do. Baselines persist in history/anomaly.json, and an empty model
+    is seeded from the speedtest log.
+    """
+
+    def __init__(self, z_threshold: float = 3.0, path: str | None = None) -> None:
+        self.path = path or os.path.join(history_dir(), ANOMALY_FILE)
+        z_off = z_threshold / 2.0
+        self.rtt = AnomalyDetector("rtt", "Ping", "ms", True, 60.0, 2.0, z_threshold, z_off, 5)
+        self.loss = AnomalyDetector("loss", "Ping loss", "%", True, 60.0, 2.0, z_threshold, z_off, 3)
+        self.down = AnomalyDetector("speedtest_down", "Speedtest download", "Mb/s", False, 0.25, 2.0, z_threshold, z_off, 1)
+        self.up = AnomalyDetector("speedtest_up", "Speedtest upload", "Mb/s", False, 0.25, 1.0, z_threshold, z_off, 1)
+        self.detectors = (self.rtt, self.loss, self.down, self.up)
+        self._minute: int | None = None
+        self._rtt_sum = 0.0
+        self._rtt_count = 0
+        self._probes = 0
+        self._loaded = self._load()
+
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for detector in self.detectors:
+                detector.baseline.load(data.get(detector.name, {}))
+            return True
+        except Exception:
+            return False
+
+
+    def seed_speedtests(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Learn speedtest baselines from saved results if nothing was restored.
+        Returns the number of records used.
+        """
+        if self._loaded:
+            return 0
+        used = 0
+        for record in records:
+            try:
+                ts = float(record["ts"])
+                local = datetime.fromtimestamp(ts)
+                for detector, key in ((self.down, "down_mbps"), (self.up, "up_mbps")):
+                    detector.feed(ts, float(record[key]), local)
+                used += 1
+            except Exception:
+                continue
+        self.down.firing = self.up.firing = False  # history is not news
+        return used
+
+
+    def feed_sample(self, ts: float, rtt_ms: float | None) -> list[Alert]:
+        """
+        One sampler tick; scores the previous minute when a new one starts.
+        """
+        minute = int(ts // 60)
+        alerts: list[Alert] = []
+        if minute != self._minute:
+            if self._minute is not None and self._probes:
+                local = datetime.fromtimestamp(self._minute * 60)
+                end = self._minute * 60.0 + 60.0
+                loss = self.loss.feed(end, 100.0 * (self._probes - self._rtt_count) / self._probes, local)
+                if loss:
+                    alerts.append(loss)
+                if self._rtt_count:
+                    rtt = self.rtt.feed(end, self._rtt_sum / self._rtt_count, local)
+                    if rtt:
+                        alerts.append(rtt)
+            self._minute = minute
+            self._rtt_sum, self._rtt_count, self._probes = 0.0, 0, 0
+        self._probes += 1
+        if rtt_ms is not None:
+            self._rtt_sum += rtt_ms
+            self._rtt_count += 1
+        return alerts
+
+
+    def feed_speedtest(self, ts: float, down_mbps: float, up_mbps: float) -> list[Alert]:
+        local = datetime.fromtimestamp(ts)
+        alerts = [self.down.feed(ts, down_mbps, local), self.up.feed(ts, up_mbps, local)]
+        return [alert for alert in alerts if alert]
+
+
+    def status(self) -> str:
+        """
+        Short tray line naming the metrics currently flagged ("" if none).
+        """
+        flagged = [d.label for d in self.detectors if d.firing]
+        return "Unusual: " + ", ".join(flagged) if flagged else ""
+
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Copy of the baselines; call on the feeding thread, `write` it anywhere.
+        """
+        return {d.name: d.baseline.to_dict() for d in self.detectors}
+
+
+    def write(self, data: Dict[str, Any]) -> None:
+        try:
+            write_json_atomic(self.path, data)
+        except Exception:
+            pass
+
+
+    def save(self) -> None:
+        self.write(self.snapshot())
@@ -0,0 +1,200 @@
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import IO, Iterable, Iterator
+
+BLOCK_SAMPLES = 3600  # one hour at 1 Hz: the seek and decode unit
+
+# Sealed sample archive ("NSWA"), Gorilla-style but byte-aligned:
+#   header  "<4sB3x": magic, version 1
+#   blocks  independently decodable sample runs (see below)
+#   index   "<ddQII" x blocks: first ts, last ts, file offset, samples, bytes
+#   footer  "<QI4s": index offset, block count, magic
+#
+# Within a block each sample is a u16 control word of four nibbles, then
+# the bytes they announce, little-endian:
+#   bits 0-3    timestamp: byte count (0-9) of the zigzag delta-of-delta
+#               of the float64 bit pattern (epoch times between 2004 and
+#               2038 share one exponent, so the bits are fixed-point with
+#               2^-22 s resolution and a steady 1 Hz cadence gives ~0)
+#   bits 4-15   down, up, rtt: XOR of the float32 bits with the previous
+#               value, as a code from _XOR_CODES (0 = unchanged) naming how
+#               many trailing zero bytes were dropped and how many remain
+# Each block starts from zero state, so a reader seeks via the index and
+# decodes one block at a time. Round trips are bit-exact (NaN included).
+MAGIC = b"NSWA"
+VERSION = 1
+HEADER = struct.Struct("<4sB3x")
+INDEX_ENTRY = struct.Struct("<ddQII")
+FOOTER = struct.Struct("<QI4s")
+_CONTROL = struct.Struct("<H")
+
+# (trailing zero bytes, meaningful bytes) for codes 1..10
+_XOR_CODES = [(0, 0)] + [(t, n) for t in range(4) for n in range(1, 5 - t)]
+_XOR_CODE_OF = {pair: code for code, pair in enumerate(_XOR_CODES) if code}
+
+Sample = tuple[float, float, float, float]
+
+
+def _bits(rows: list[Sample]) -> tuple[memoryview, memoryview, memoryview, memoryview]:
+    """
+    Column-wise bit patterns: int64 for timestamps, uint32 for the rates.
+    """
+    ts, down, up, rtt = zip(*rows)
+    return (
+        memoryview(array("d", ts)).cast("B").cast("q"),
+        memoryview(array("f", down)).cast("B").cast("I"),
+        memoryview(array("f", up)).cast("B").cast("I"),
+        memoryview(array("f", rtt)).cast("B").cast("I"),
+    )
+
+
+def encode_block(rows: list[Sample]) -> bytes:
+    out = bytearray()
+    pack_control = _CONTROL.pack
+    prev_delta = 0
+    prev = [0, 0, 0]
+    ts_bits, *value_bits = _bits(rows)
+    prev_ts = ts_bits[0]
+    for i in range(len(rows)):
+        delta = ts_bits[i] - prev_ts
+        dod = delta - prev_delta
+        prev_ts, prev_delta = ts_bits[i], delta
+        zigzag = dod << 1 if dod >= 0 else ((-dod) << 1) - 1
+        ts_len = (zigzag.bit_length() + 7) >> 3
+        control = ts_len
+        payload = zigzag.to_bytes(ts_len, "little")
+        for column in range(3):
+            value = value_bits[column][i]
+            xor = value ^ prev[column]
+            prev[column] = value
+            if xor:
+                trailing = ((xor & -xor).bit_length() - 1) >> 3
+                xor >>= trailing << 3
+                n = (xor.bit_length() + 7) >> 3
+                control |= _XOR_CODE_OF[(trailing, n)] << (4 + 4 * column)
+                payload += xor.to_bytes(n, "little")
+        out += pack_control(control)
+        out += payload
+    return bytes(out)
+
+
+def decode_block(data: bytes, count: int, first_ts: float) -> list[Sample]:
+    ts_bits = array("q")
+    columns = (array("I"), array("I"), array("I"))
+    (prev_ts,) = struct.unpack("<q", struct.pack("<d", first_ts))
+    prev_delta = 0
+    prev = [0, 0, 0]
+    from_bytes = int.from_bytes
+    codes = _XOR_CODES
+    pos = 0
+    for _ in range(count):
+        control = data[pos] | (data[pos + 1] << 8)
+        pos += 2
+        n = control & 0xF
+        if n:
+            zigzag = from_bytes(data[pos:pos + n], "little")
+            pos += n
+            prev_delta += -((zigzag + 1) >> 1) if zigzag & 1 else zigzag >> 1
+        prev_ts += prev_delta
+        ts_bits.append(prev_ts)
+        control >>= 4
+        for column in range(3):
+            code = control & 0xF
+            control >>= 4
+            if code:
+                trailing, n = codes[code]
+                prev[column] ^= from_bytes(data[pos:pos + n], "little") << (trailing << 3)
+                pos += n
+            columns[column].append(prev[column])
+    if pos != len(data):
+        raise ValueError("Archive block length does not match its contents")
+    return list(zip(
+        memoryview(ts_bits).cast("B").cast("d").tolist(),
+        memoryview(columns[0]).cast("B").cast("f").tolist(),
+        memoryview(columns[1]).cast("B").cast("f").tolist(),
+        memoryview(columns[2]).cast("B").cast("f").tolist(),
+    ))
+
+
+class ArchiveWriter:
+    """
+    Streams time-ordered samples into an archive file, one block per
+    BLOCK_SAMPLES rows; the index and footer are written by `close()`.
+    Only the current block is held in memory.
+    """
+
+    def __init__(self, f: IO[bytes], block_samples: int = BLOCK_SAMPLES) -> None:
+        self._f = f
+        self.block_samples = block_samples
+        self._rows: list[Sample] = []
+        self._index: list[tuple[float, float, int, int, int]] = []
+        self.samples: int = 0
+        f.write(HEADER.pack(MAGIC, VERSION))
+
+
+    def write(self, rows: Iterable[Sample]) -> None:
+        for row in rows:
+            self._rows.append(row)
+            if len(self._rows) >= self.block_samples:
+                self._flush_block()
+
+
+    def _flush_block(self) -> None:
+        if not self._rows:
+            return
+        data = encode_block(self._rows)
+        self._index.append((self._rows[0][0], self._rows[-1][0], self._f.tell(), len(self._rows), len(data)))
+        self._f.write(data)
+        self.samples += len(self._rows)
+        self._rows = []
+
+
+    def close(self) -> None:
+        self._flush_block()
+        index_offset = self._f.tell()
+        for entry in self._index:
+            self._f.write(INDEX_ENTRY.pack(*entry))
+        self._f.write(FOOTER.pack(index_offset, len(self._index), MAGIC))
+
+
+class ArchiveReader:
+    """
+    Seekable reader: loads the block index, then `iter_chunks` decodes only
+    the blocks overlapping [start, end), one at a time.
+    """
+
+    def __init__(self, f: IO[bytes]) -> None:
+        self._f = f
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a sample archive")
+        f.seek(-FOOTER.size, os.SEEK_END)
+        index_offset, blocks, magic = FOOTER.unpack(f.read(FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError("Truncated sample archive")
+        f.seek(index_offset)
+        raw = f.read(blocks * INDEX_ENTRY.size)
+        self.index = list(INDEX_ENTRY.iter_unpack(raw))
+        self._last_ts = [entry[1] for entry in self.index]
+
+
+    @property
+    def samples(self) -> int:
+        return sum(entry[3] for entry in self.index)
+
+
+    def iter_chunks(self, start: float = float("-inf"), end: float = float("inf")) -> Iterator[list[Sample]]:
+        """
+        Yield decoded blocks as lists of (ts, down, up, rtt) with start <= ts < end.
+        """
+        for first_ts, last_ts, offset, count, length in self.index[bisect_left(self._last_ts, start):]:
+            if first_ts >= end:
+                return
+            self._f.seek(offset)
+            rows = decode_block(self._f.read(length), count, first_ts)
+            if first_ts < start or last_ts >= end:
+                rows = [row for row in rows if start <= row[0] < end]
+            if rows:
+                yield rows
@@ -0,0 +1,172 @@
+import subprocess
+import threading
+import time
+import weakref
+from typing import Any
+
+
+class Cancelled(Exception):
+    """
+    Raised when work is abandoned because its token was cancelled or its
+    time budget ran out.
+    """
+
+
+class CancelToken:
+    """
+    Cooperative cancellation flag with an optional monotonic deadline.
+
+    Tokens form a tree: `child(budget)` returns a token that is cancelled when
+    its parent is, and whose deadline never exceeds the parent's. Waiting on a
+    token (`wait`) wakes immediately on cancel, so loops can use it as a sleep.
+    """
+
+    def __init__(self, deadline: float | None = None, parent: "CancelToken | None" = None) -> None:
+        self._event = threading.Event()
+        self._children: "weakref.WeakSet[CancelToken]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.parent = parent
+        if parent is not None and parent.deadline is not None:
+            deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+        self.deadline = deadline
+
+
+    def child(self, budget_sec: float | None = None) -> "CancelToken":
+        """
+        New token linked to this one, optionally limited to `budget_sec` from now.
+        """
+        deadline = time.monotonic() + budget_sec if budget_sec is not None else None
+        token = CancelToken(deadline, parent=self)
+        with self._lock:
+            self._children.add(token)
+        if self._event.is_set():
+            token.cancel()
+        return token
+
+
+    def cancel(self) -> None:
+        """
+        Cancel this token and every child derived from it.
+        """
+        self._event.set()
+        with self._lock:
+            children = list(self._children)
+        for token in children:
+            token.cancel()
+
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        True once cancelled or past the deadline.
+        """
+        if self._event.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+    def remaining(self) -> float | None:
+        """
+        Seconds left before the deadline (None if unbounded, 0 if cancelled).
+        """
+        if self._event.is_set():
+            return 0.0
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Sleep up to `timeout` seconds (clamped to the deadline).
+        Returns True if the token is cancelled when the wait ends.
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.cancelled
+
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise Cancelled()
+
+
+    def as_event(self) -> "_TokenEvent":
+        """
+        Adapter exposing `is_set()`/`isSet()` for libraries that accept a
+        `threading.Event`-like shutdown flag (e.g. speedtest-cli). It also
+        reports set once the deadline passes.
+        """
+        return _TokenEvent(self)
+
+
+class _TokenEvent:
+    """
+    Read-only Event look-alike backed by a CancelToken.
+    """
+
+    def __init__(self, token: CancelToken) -> None:
+        self._token = token
+
+
+    def is_set(self) -> bool:
+        return self._token.cancelled
+
+    isSet = is_set
+
+
+    def set(self) -> None:
+        self._token.cancel()
+
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._token.wait(timeout)
+
+
+def run_cancellable(
+    cmd: list[str],
+    token: CancelToken,
+    timeout: float | None = None,
+    poll_sec: float = 0.05,
+    **popen_kw: Any,
+) -> subprocess.CompletedProcess:
+    """
+    `subprocess.run` replacement that kills the child when `token` is cancelled
+    (or its deadline passes) or after `timeout` seconds.
+
+    Raises `Cancelled` on cancellation and `subprocess.TimeoutExpired` on timeout.
+    Output is captured as text when `capture_output=True` is passed.
+    """
+    capture = popen_kw.pop("capture_output", False)
+    if capture:
+        popen_kw.setdefault("stdout", subprocess.PIPE)
+        popen_kw.setdefault("stderr", subprocess.PIPE)
+    check = popen_kw.pop("check", False)
+
+    token.raise_if_cancelled()
+    started = time.monotonic()
+    process = subprocess.Popen(cmd, **popen_kw)
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=poll_sec)
+                break
+            except subprocess.TimeoutExpired:
+                if token.cancelled:
+                    raise Cancelled()
+                if timeout is not None and time.monotonic() - started >= timeout:
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+    except BaseException:
+        process.kill()
+        try:
+            process.communicate(timeout=1.0)
+        except Exception:
+            pass
+        raise
+
+    result = subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+    if check:
+        result.check_returncode()
+    return result
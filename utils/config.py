@@ -1,5 +1,7 @@
 import os
 import json
+import socket
+import threading
 import time
 from typing import Any, Dict
 
@@ -7,6 +9,9 @@ from utils.paths import config_path
 
 CONFIG_FILE = "config.json"
 
+# Serializes read-modify-write cycles from the UI, tray and worker threads
+_lock = threading.RLock()
+
 
 def load_config() -> Dict[str, Any]:
     """
@@ -26,10 +31,19 @@ def load_config() -> Dict[str, Any]:
 def save_config(config: Dict[str, Any]) -> None:
     """
     Save the given configuration dictionary to the JSON config file.
+
+    Writes to a temp file and atomically swaps it in, so a process killed
+    mid-write never leaves a truncated config behind.
     """
+    target = config_path(CONFIG_FILE)
+    tmp = f"{target}.tmp"
     try:
-        with open(config_path(CONFIG_FILE), "w", encoding="utf-8") as file_stream:
-            json.dump(config, file_stream, indent=2)
+        with _lock:
+            with open(tmp, "w", encoding="utf-8") as file_stream:
+                json.dump(config, file_stream, indent=2)
+                file_stream.flush()
+                os.fsync(file_stream.fileno())
+            os.replace(tmp, target)
     except Exception:
         # Fail silently if writing fails
         pass
@@ -53,9 +67,10 @@ def set_opacity(value: float) -> float:
     Persists UI opacity to config and returns the clamped value.
     """
     clamped = max(0.40, min(1.00, float(value)))
-    config = load_config()
-    config["opacity"] = clamped
-    save_config(config)
+    with _lock:
+        config = load_config()
+        config["opacity"] = clamped
+        save_config(config)
     return clamped
 
 
@@ -63,6 +78,8 @@ def get_speedtest(default: Dict[str, Any] | None = None) -> Dict[str, Any] | Non
     """
     Returns the last saved speedtest dict or default.
     Dict looks like: {"down_mbps": float, "up_mbps": float, "ts": float}
+    plus "latency" (see `net.latency.LatencyProbe.result`) when loaded
+    latency was measured.
     """
     try:
         config = load_config()
@@ -74,16 +91,387 @@ def get_speedtest(default: Dict[str, Any] | None = None) -> Dict[str, Any] | Non
         return default
 
 
-def set_speedtest(down_mbps: float, up_mbps: float, ts: float | None = None) -> Dict[str, Any]:
+def set_speedtest(
+    down_mbps: float,
+    up_mbps: float,
+    ts: float | None = None,
+    latency: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
     """
     Saves a compact speedtest snapshot. Returns the saved dict.
     """
-    payload = {
+    payload: Dict[str, Any] = {
         "down_mbps": round(float(down_mbps), 2),
         "up_mbps": round(float(up_mbps), 2),
         "ts": float(ts if ts is not None else time.time()),
     }
-    config = load_config()
-    config["speedtest"] = payload
-    save_config(config)
-    return payload
\ No newline at end of file
+    if latency:
+        payload["latency"] = latency
+    with _lock:
+        config = load_config()
+        config["speedtest"] = payload
+        save_config(config)
+    return payload
+
+
+def get_throughput_endpoint() -> Dict[str, Any] | None:
+    """
+    Returns settings for the native multi-stream throughput tester, or None
+    if no endpoint is configured. "streams" is None for "auto" (the
+    default: tuned per network, see `net.autotune`) or a fixed count.
+    Dict looks like: {"download_url": str, "upload_url": str | None, "streams": int | None}
+    """
+    try:
+        section = load_config().get("throughput")
+        if not isinstance(section, dict) or not section.get("download_url"):
+            return None
+        streams = section.get("streams", "auto")
+        return {
+            "download_url": str(section["download_url"]),
+            "upload_url": str(section["upload_url"]) if section.get("upload_url") else None,
+            "streams": None if streams == "auto" else max(1, int(streams)),
+        }
+    except Exception:
+        return None
+
+
+MAX_TUNED_NETWORKS = 16
+
+
+def get_stream_tuning(network: str | None, backend: str) -> Dict[str, Any] | None:
+    """
+    Returns the stream counts last chosen on `network` (see
+    `net.autotune.network_identity`) by `backend` ("native", "speedtest"),
+    or None if that network/backend was never tuned.
+    Dict looks like: {"download": int, "upload": int, "ts": float}
+    """
+    try:
+        tuned = load_config().get("stream_tuning", {}).get(network or "", {}).get(backend)
+        if isinstance(tuned, dict) and {"download", "upload", "ts"} <= set(tuned.keys()):
+            return tuned
+        return None
+    except Exception:
+        return None
+
+
+def set_stream_tuning(network: str | None, backend: str, download: int, upload: int) -> None:
+    """
+    Persists chosen stream counts for `network`; only the
+    MAX_TUNED_NETWORKS most recently tuned networks are kept.
+    """
+    if not network:
+        return
+    with _lock:
+        config = load_config()
+        networks = config.get("stream_tuning")
+        if not isinstance(networks, dict):
+            networks = {}
+        entry = networks.pop(network, None)
+        if not isinstance(entry, dict):
+            entry = {}
+        entry[backend] = {"download": int(download), "upload": int(upload), "ts": time.time()}
+        networks[network] = entry  # re-inserted last: dict order is recency
+        for stale in list(networks)[:-MAX_TUNED_NETWORKS]:
+            del networks[stale]
+        config["stream_tuning"] = networks
+        save_config(config)
+
+
+SELFMON_DEFAULTS: Dict[str, Any] = {
+    "interval_sec": 60.0,
+    "budgets": {
+        "cpu_percent": 2.0,
+        "rss_mb": 80.0,
+        "threads": 12,
+        "handles": 600,
+        "wakeups_per_sec": 5.0,
+        "after_calls_per_sec": 5.0,
+    },
+}
+
+
+def get_selfmon_settings() -> Dict[str, Any]:
+    """
+    Returns self-monitor settings with user overrides merged over defaults.
+    Dict looks like: {"interval_sec": float, "budgets": {metric: limit}}
+    """
+    settings = {"interval_sec": SELFMON_DEFAULTS["interval_sec"], "budgets": dict(SELFMON_DEFAULTS["budgets"])}
+    try:
+        section = load_config().get("selfmon")
+        if not isinstance(section, dict):
+            return settings
+        if "interval_sec" in section:
+            settings["interval_sec"] = max(5.0, float(section["interval_sec"]))
+        for key, value in (section.get("budgets") or {}).items():
+            if key in settings["budgets"]:
+                settings["budgets"][key] = float(value)
+        return settings
+    except Exception:
+        return settings
+
+
+GRAPH_WINDOWS = (10, 600, 3600)  # seconds: 10 s, 10 min, 1 h
+GRAPH_MODES = ("minmax", "lttb")
+
+
+def get_graph_window(default: int = 10) -> int:
+    """
+    Returns the graph time window in seconds (one of GRAPH_WINDOWS).
+    """
+    try:
+        value = int(load_config().get("graph_window_sec", default))
+        return value if value in GRAPH_WINDOWS else default
+    except Exception:
+        return default
+
+
+def set_graph_window(seconds: int) -> int:
+    """
+    Persists the graph time window and returns the stored value.
+    """
+    value = int(seconds) if int(seconds) in GRAPH_WINDOWS else GRAPH_WINDOWS[0]
+    with _lock:
+        config = load_config()
+        config["graph_window_sec"] = value
+        save_config(config)
+    return value
+
+
+def get_graph_mode(default: str = "minmax") -> str:
+    """
+    Returns the long-window decimation mode: "minmax" (default) or "lttb".
+    """
+    value = load_config().get("graph_decimation", default)
+    return value if value in GRAPH_MODES else default
+
+
+TRAY_ICON_MODES = ("static", "sparkline", "bars")
+
+
+def get_tray_icon_mode(default: str = "static") -> str:
+    """
+    Returns the tray icon style: "static" (default, icon.ico), "sparkline"
+    (scrolling download graph) or "bars" (live download/upload bars).
+    Set e.g. {"tray_icon": "sparkline"}.
+    """
+    value = load_config().get("tray_icon", default)
+    return value if value in TRAY_ICON_MODES else default
+
+
+def get_structured_log_enabled(default: bool = False) -> bool:
+    """
+    Whether the JSON-lines event log (events.jsonl) is written next to log.txt.
+    Enable with {"structured_log": true}.
+    """
+    return bool(load_config().get("structured_log", default))
+
+
+COUNTER_BACKENDS = ("auto", "psutil", "procfs", "iftable")
+
+
+def get_counter_backend(default: str = "auto") -> str:
+    """
+    Network counter source: "auto" (fastest available), "psutil",
+    "procfs" (Linux /proc/net/dev) or "iftable" (Windows GetIfTable2).
+    """
+    value = load_config().get("counter_backend", default)
+    return value if value in COUNTER_BACKENDS else default
+
+
+ALERT_METRICS = ("down_mbps", "up_mbps", "rtt_ms", "loss", "down_ratio", "up_ratio")
+ALERT_AGGREGATES = ("mean", "min", "max")
+
+# Download below 20% of the last speedtest for a full minute; >5% ping loss over a minute
+ALERT_RULE_DEFAULTS: list[Dict[str, Any]] = [
+    {"name": "slow_download", "metric": "down_ratio", "agg": "max", "window_sec": 60, "op": "<",
+     "threshold": 0.20, "clear": 0.30, "cooldown_sec": 900},
+    {"name": "ping_loss", "metric": "loss", "agg": "mean", "window_sec": 60, "op": ">",
+     "threshold": 0.05, "clear": 0.02, "cooldown_sec": 900},
+]
+
+
+def get_alert_rules() -> list[Dict[str, Any]]:
+    """
+    Returns validated alert rules from the "alerts" list (defaults if absent;
+    an empty list disables alerts). Invalid entries are skipped.
+    Each rule looks like:
+      {"name": str, "metric": one of ALERT_METRICS, "agg": "mean" | "min" | "max",
+       "window_sec": float, "op": "<" | ">", "threshold": float,
+       "clear": float (hysteresis level, defaults to threshold), "cooldown_sec": float}
+    """
+    try:
+        section = load_config().get("alerts", ALERT_RULE_DEFAULTS)
+    except Exception:
+        section = ALERT_RULE_DEFAULTS
+    if not isinstance(section, list):
+        return [dict(rule) for rule in ALERT_RULE_DEFAULTS]
+
+    rules = []
+    for raw in section:
+        try:
+            rule = {
+                "name": str(raw["name"]),
+                "metric": str(raw["metric"]),
+                "agg": str(raw.get("agg", "mean")),
+                "window_sec": max(1.0, float(raw.get("window_sec", 60))),
+                "op": str(raw.get("op", "<")),
+                "threshold": float(raw["threshold"]),
+                "clear": float(raw.get("clear", raw["threshold"])),
+                "cooldown_sec": max(0.0, float(raw.get("cooldown_sec", 600))),
+            }
+        except Exception:
+            continue
+        if rule["metric"] in ALERT_METRICS and rule["agg"] in ALERT_AGGREGATES and rule["op"] in ("<", ">"):
+            rules.append(rule)
+    return rules
+
+
+def get_ipc_enabled(default: bool = False) -> bool:
+    """
+    Whether the local control socket / named pipe (net.ipc) is served.
+    Off by default: the Windows pipe uses the default security descriptor,
+    so other local accounts could connect. Enable with {"ipc": true}.
+    """
+    return bool(load_config().get("ipc", default))
+
+
+def get_history_archive_enabled(default: bool = True) -> bool:
+    """
+    Whether finished days of sample history are compressed into sealed
+    archives (utils.archive, ~half the size). Disable with {"history_archive": false}
+    to keep raw fixed-width day files for external tools.
+    """
+    return bool(load_config().get("history_archive", default))
+
+
+def get_shared_memory_enabled(default: bool = True) -> bool:
+    """
+    Whether live samples are published to the "NetSpeedWidget" shared
+    memory ring (net.shm). Disable with {"shared_memory": false}.
+    """
+    return bool(load_config().get("shared_memory", default))
+
+
+def get_microburst_settings() -> Dict[str, Any] | None:
+    """
+    Returns high-resolution capture settings, or None when disabled (default).
+    Enable with {"microburst": {"enabled": true}}. Dict looks like:
+      {"interval_ms": 10-50, "saturation_ratio": float,
+       "down_threshold_mbps": float | None, "up_threshold_mbps": float | None}
+    Without explicit thresholds, saturation_ratio x the last speedtest is used.
+    """
+    try:
+        section = load_config().get("microburst")
+        if not isinstance(section, dict) or not section.get("enabled"):
+            return None
+
+        def _optional(key: str) -> float | None:
+            value = section.get(key)
+            return float(value) if value is not None else None
+
+        return {
+            "interval_ms": max(10.0, min(50.0, float(section.get("interval_ms", 20)))),
+            "saturation_ratio": max(0.05, float(section.get("saturation_ratio", 0.8))),
+            "down_threshold_mbps": _optional("down_threshold_mbps"),
+            "up_threshold_mbps": _optional("up_threshold_mbps"),
+        }
+    except Exception:
+        return None
+
+
+def get_trace_path() -> str | None:
+    """
+    Path of the counter trace to record this session (raw counters + probe
+    results for `python -m utils.replay`), or None (default) to not record.
+    Set {"trace_file": "trace.nswt"}; relative paths are under the app folder.
+    """
+    value = load_config().get("trace_file")
+    if not value:
+        return None
+    return str(value) if os.path.isabs(str(value)) else config_path(str(value))
+
+
+def get_usage_settings() -> Dict[str, Any]:
+    """
+    Returns data-usage accounting settings (accounting is always on; quotas
+    are off by default). Set e.g.
+      {"usage": {"monthly_quota_gb": 500, "daily_quota_gb": 30, "warn_ratio": 0.9,
+                 "interfaces": ["Ethernet"], "checkpoint_sec": 300}}
+    Quotas count sent + received bytes on `interfaces` (default: all but
+    loopback). A warning is raised once per period when usage is projected
+    to reach warn_ratio x quota, and once when it is exceeded.
+    Dict looks like: {"daily_quota_bytes": int | None, "monthly_quota_bytes": int | None,
+                      "warn_ratio": float, "interfaces": list[str] | None, "checkpoint_sec": float}
+    """
+    defaults: Dict[str, Any] = {
+        "daily_quota_bytes": None,
+        "monthly_quota_bytes": None,
+        "warn_ratio": 1.0,
+        "interfaces": None,
+        "checkpoint_sec": 300.0,
+    }
+    try:
+        section = load_config().get("usage")
+        if not isinstance(section, dict):
+            return defaults
+
+        def _quota(key: str) -> int | None:
+            value = section.get(key)
+            return int(float(value) * 1e9) if value else None
+
+        interfaces = section.get("interfaces")
+        return {
+            "daily_quota_bytes": _quota("daily_quota_gb"),
+            "monthly_quota_bytes": _quota("monthly_quota_gb"),
+            "warn_ratio": max(0.1, min(1.0, float(section.get("warn_ratio", 1.0)))),
+            "interfaces": [str(i) for i in interfaces] if isinstance(interfaces, list) else None,
+            "checkpoint_sec": max(30.0, float(section.get("checkpoint_sec", 300.0))),
+        }
+    except Exception:
+        return defaults
+
+
+def get_anomaly_settings() -> Dict[str, Any] | None:
+    """
+    Returns seasonal anomaly detection settings, or None when disabled.
+    On by default; {"anomaly": {"enabled": false}} turns it off, and
+    "z_threshold" (default 3.0) sets how many standard deviations from the
+    hour-of-week baseline count as unusual.
+    Dict looks like: {"z_threshold": float}
+    """
+    try:
+        section = load_config().get("anomaly")
+        if not isinstance(section, dict):
+            return {"z_threshold": 3.0}
+        if not section.get("enabled", True):
+            return None
+        return {"z_threshold": max(1.5, float(section.get("z_threshold", 3.0)))}
+    except Exception:
+        return {"z_threshold": 3.0}
+
+
+def get_telemetry_settings() -> Dict[str, Any] | None:
+    """
+    Returns fleet telemetry push settings, or None when disabled (default).
+    Set e.g.
+      {"telemetry": {"enabled": true, "address": "10.0.0.5:9750", "transport": "udp",
+                     "site": "office-berlin", "host": "desk-17", "flush_sec": 5}}
+    Samples and speedtests are sent as "site/host" to a `net.aggregator`
+    listening on address; host defaults to the machine name.
+    Dict looks like: {"address": str, "transport": "udp" | "tcp", "name": str, "flush_sec": float}
+    """
+    try:
+        section = load_config().get("telemetry")
+        if not isinstance(section, dict) or not section.get("enabled") or not section.get("address"):
+            return None
+        site = str(section.get("site") or "default").replace("/", "-")
+        host = str(section.get("host") or socket.gethostname())
+        transport = str(section.get("transport", "udp")).lower()
+        return {
+            "address": str(section["address"]),
+            "transport": transport if transport in ("udp", "tcp") else "udp",
+            "name": f"{site}/{host}",
+            "flush_sec": max(1.0, float(section.get("flush_sec", 5.0))),
+        }
+    except Exception:
+        return None
@@ -0,0 +1,175 @@
+from typing import Any, Callable, Iterable
+
+# Poll cadence for the hover guard (milliseconds)
+POLL_MIN_MS: int = 120
+POLL_MAX_MS: int = 1000
+POLL_BACKOFF: float = 2.0
+
+
+class CursorSource:
+    """
+    Returns the global cursor position in screen pixels.
+    """
+
+    def position(self) -> tuple[int, int]:
+        raise NotImplementedError
+
+
+class Win32CursorSource(CursorSource):
+    """
+    Cursor position via `win32api.GetCursorPos`.
+    """
+
+    def __init__(self) -> None:
+        import win32api
+        self._get_cursor_pos = win32api.GetCursorPos
+
+
+    def position(self) -> tuple[int, int]:
+        return self._get_cursor_pos()
+
+
+class TkCursorSource(CursorSource):
+    """
+    Cursor position via Tk (`winfo_pointerxy`), used on X11 and anywhere
+    pywin32 is unavailable. Must be called on the Tk main thread.
+    """
+
+    def __init__(self, root: Any) -> None:
+        self._root = root
+
+
+    def position(self) -> tuple[int, int]:
+        return self._root.winfo_pointerxy()
+
+
+class FakeCursorSource(CursorSource):
+    """
+    Scripted cursor for tests. Replays `positions` in order and then keeps
+    returning the last one; `move_to` overrides the current position.
+    """
+
+    def __init__(self, positions: Iterable[tuple[int, int]] = ((0, 0),)) -> None:
+        self._positions = list(positions) or [(0, 0)]
+        self.reads: int = 0
+
+
+    def move_to(self, x: int, y: int) -> None:
+        self._positions = [(x, y)]
+
+
+    def position(self) -> tuple[int, int]:
+        self.reads += 1
+        if len(self._positions) > 1:
+            return self._positions.pop(0)
+        return self._positions[0]
+
+
+def default_cursor_source(root: Any) -> CursorSource:
+    """
+    Prefer the Win32 API when available, else fall back to Tk.
+    """
+    try:
+        return Win32CursorSource()
+    except Exception:
+        return TkCursorSource(root)
+
+
+class Rect:
+    """
+    Inclusive screen rectangle used as the hover hit test.
+    """
+
+    __slots__ = ("left", "top", "right", "bottom")
+
+    def __init__(self, x: int, y: int, width: int, height: int) -> None:
+        self.left = x
+        self.top = y
+        self.right = x + width
+        self.bottom = y + height
+
+
+    def contains(self, x: int, y: int) -> bool:
+        return self.left <= x <= self.right and self.top <= y <= self.bottom
+
+
+class HoverGuard:
+    """
+    Waits for the cursor to leave the (hidden) widget and then calls `on_leave`.
+
+    Polls with an adaptive interval: while the cursor stays parked at the same
+    spot the delay doubles up to POLL_MAX_MS, and it snaps back to POLL_MIN_MS
+    as soon as the cursor moves. `schedule(ms, fn)` is typically `root.after`.
+    """
+
+    def __init__(
+        self,
+        source: CursorSource,
+        schedule: Callable[[int, Callable[[], None]], Any],
+        on_leave: Callable[[], None],
+        min_interval_ms: int = POLL_MIN_MS,
+        max_interval_ms: int = POLL_MAX_MS,
+        backoff: float = POLL_BACKOFF,
+    ) -> None:
+        self.source = source
+        self._schedule = schedule
+        self._on_leave = on_leave
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.backoff = backoff
+
+        self.rect = Rect(0, 0, 0, 0)
+        self.active: bool = False
+        self.polls: int = 0
+        self._interval: float = float(min_interval_ms)
+        self._last_pos: tuple[int, int] | None = None
+        # Bumped on every start so polls left over from a previous run die out
+        self._generation: int = 0
+
+
+    def set_rect(self, x: int, y: int, width: int, height: int) -> None:
+        """
+        Update the hit-test rectangle (call when the window moves/resizes).
+        """
+        self.rect = Rect(x, y, width, height)
+
+
+    def start(self) -> bool:
+        """
+        Begin guarding. Returns False if a guard is already running.
+        """
+        if self.active:
+            return False
+        self.active = True
+        self.polls = 0
+        self._interval = float(self.min_interval_ms)
+        self._last_pos = None
+        self._generation += 1
+        self._poll(self._generation)
+        return True
+
+
+    def stop(self) -> None:
+        """
+        Cancel guarding; any pending poll becomes a no-op.
+        """
+        self.active = False
+
+
+    def _poll(self, generation: int) -> None:
+        if not self.active or generation != self._generation:
+            return
+
+        self.polls += 1
+        pos = self.source.position()
+        if not self.rect.contains(*pos):
+            self.active = False
+            self._on_leave()
+            return
+
+        if pos == self._last_pos:
+            self._interval = min(self.max_interval_ms, self._interval * self.backoff)
+        else:
+            self._interval = float(self.min_interval_ms)
+        self._last_pos = pos
+        self._schedule(int(self._interval), lambda: self._poll(generation))
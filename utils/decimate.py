@@ -0,0 +1,159 @@
+import math
+from collections import deque
+
+# (x in [0, 1] across the window, value, ping-loss flag)
+Point = tuple[float, float, bool]
+
+MODES = ("minmax", "lttb")
+
+
+class _Bucket:
+    """
+    Samples that fall into one fixed-size, absolutely aligned bucket.
+    """
+
+    __slots__ = ("values", "loss")
+
+    def __init__(self) -> None:
+        self.values: list[float] = []
+        self.loss: bool = False
+
+
+class DecimatedSeries:
+    """
+    Fixed-window series reduced to roughly one point per pixel.
+
+    Buckets are aligned to the absolute sample count, so once a bucket is full
+    its reduced points never change: they are computed once when the bucket
+    seals and cached. Each tick only the newest (open) bucket is recomputed.
+
+    Modes:
+      - "minmax": each bucket emits its min and max (in time order), which
+        keeps every spike; use about width/2 buckets.
+      - "lttb": each bucket emits the point forming the largest triangle with
+        the previously chosen point and the next bucket's average; use about
+        width buckets. A bucket's choice is final once its successor seals.
+
+    A bucket containing any ping loss flags all its points, so red spans are
+    never decimated away.
+    """
+
+    def __init__(self, window: int, target_points: int, mode: str = "minmax") -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown decimation mode {mode!r}")
+        self.window = max(2, int(window))
+        self.mode = mode
+        per_bucket = 2 if mode == "minmax" else 1
+        max_buckets = max(2, target_points // per_bucket)
+        self.bucket_size = max(1, math.ceil(self.window / max_buckets))
+        self.buckets = math.ceil(self.window / self.bucket_size)
+
+        self._count = 0
+        self._sealed: deque[_Bucket] = deque(maxlen=self.buckets)
+        # Cached reduced points per sealed bucket: (offset in bucket, value)
+        self._cached: deque[list[tuple[int, float]]] = deque(maxlen=self.buckets)
+        self._open = _Bucket()
+
+
+    def append(self, value: float, loss: bool) -> None:
+        bucket = self._open
+        bucket.values.append(value)
+        bucket.loss = bucket.loss or loss
+        self._count += 1
+        if len(bucket.values) >= self.bucket_size:
+            self._seal()
+
+
+    def _seal(self) -> None:
+        bucket = self._open
+        self._sealed.append(bucket)
+        if self.mode == "minmax":
+            self._cached.append(self._reduce_minmax(bucket))
+        else:
+            self._cached.append([])
+            # The previous bucket's LTTB choice can now be made final
+            if len(self._sealed) >= 2:
+                self._cached[-2] = self._reduce_lttb(len(self._sealed) - 2, self._average(bucket))
+        self._open = _Bucket()
+
+
+    def _reduce_minmax(self, bucket: _Bucket) -> list[tuple[int, float]]:
+        values = bucket.values
+        i_min = min(range(len(values)), key=values.__getitem__)
+        i_max = max(range(len(values)), key=values.__getitem__)
+        return [(i, values[i]) for i in sorted({i_min, i_max})]
+
+
+    def _average(self, bucket: _Bucket) -> tuple[float, float]:
+        """
+        (offset, value) centroid of a bucket, offsets relative to its start.
+        """
+        values = bucket.values
+        return (len(values) - 1) / 2.0, sum(values) / len(values)
+
+
+    def _reduce_lttb(self, index: int, next_avg: tuple[float, float]) -> list[tuple[int, float]]:
+        """
+        LTTB choice for sealed bucket `index` given the next bucket's centroid.
+        """
+        bucket = self._sealed[index]
+        values = bucket.values
+        if index > 0 and self._cached[index - 1]:
+            prev_offset, ay = self._cached[index - 1][0]
+            ax = prev_offset - self.bucket_size
+        else:
+            ax, ay = 0.0, values[0]
+        cx = next_avg[0] + self.bucket_size
+        cy = next_avg[1]
+        best, best_area = 0, -1.0
+        for i, y in enumerate(values):
+            area = abs((ax - cx) * (y - ay) - (ax - i) * (cy - ay))
+            if area > best_area:
+                best, best_area = i, area
+        return [(best, values[best])]
+
+
+    def points(self) -> list[Point]:
+        """
+        Reduced points for the window, oldest first.
+        """
+        buckets = list(self._sealed)
+        reduced = list(self._cached)
+        if self._open.values:
+            buckets.append(self._open)
+            if self.mode == "minmax":
+                reduced.append(self._reduce_minmax(self._open))
+            else:
+                reduced.append([(len(self._open.values) - 1, self._open.values[-1])])
+        newest = len(self._sealed) - 1
+        if self.mode == "lttb" and newest >= 0 and not reduced[newest]:
+            # Newest sealed bucket: provisional choice against the open bucket,
+            # or the series' last point when nothing follows it yet
+            if self._open.values:
+                reduced[newest] = self._reduce_lttb(newest, self._average(self._open))
+            else:
+                last = self._sealed[-1].values
+                reduced[newest] = [(len(last) - 1, last[-1])]
+        if len(buckets) > self.buckets:
+            buckets, reduced = buckets[-self.buckets:], reduced[-self.buckets:]
+
+        span = max(1, self.buckets * self.bucket_size - 1)
+        out: list[Point] = []
+        for position, (bucket, chosen) in enumerate(zip(buckets, reduced)):
+            base = position * self.bucket_size
+            for offset, value in chosen:
+                out.append((min(1.0, (base + offset) / span), value, bucket.loss))
+        return out
+
+
+    def peak(self) -> float:
+        """
+        Largest value currently inside the window.
+        """
+        sealed = list(self._sealed)
+        if self._open.values:
+            sealed = sealed[-(self.buckets - 1):] if self.buckets > 1 else []
+        peak = max((max(b.values) for b in sealed), default=0.0)
+        if self._open.values:
+            peak = max(peak, max(self._open.values))
+        return peak
@@ -0,0 +1,168 @@
+import argparse
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from itertools import islice
+from typing import IO, Any, Dict, Iterable, Iterator
+
+from utils.history import iter_sample_chunks, iter_speedtests
+
+CHUNK_ROWS = 4096
+
+# Compact columnar format ("NSWC"):
+#   header: magic, version u8, column count u8, then per column:
+#           name length u8, name (ascii), array typecode (1 ascii char)
+#   chunks: row count u32, then each column as a packed little-endian array
+#   footer: row count 0
+COLUMNAR_MAGIC = b"NSWC"
+COLUMNAR_VERSION = 1
+
+SAMPLE_COLUMNS = (("ts", "d"), ("down_mbps", "f"), ("up_mbps", "f"), ("rtt_ms", "f"))
+SPEEDTEST_COLUMNS = (("ts", "d"), ("down_mbps", "f"), ("up_mbps", "f"))
+
+
+def _chunks(rows: Iterable[tuple], size: int = CHUNK_ROWS) -> Iterator[list[tuple]]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _row_chunks(kind: str, start: float, end: float) -> Iterator[list[tuple]]:
+    """
+    Chunked row source for an export kind (the first stage of the pipeline).
+    """
+    if kind == "samples":
+        return iter_sample_chunks(start, end)
+    if kind == "speedtests":
+        rows = ((float(r["ts"]), float(r["down_mbps"]), float(r["up_mbps"])) for r in iter_speedtests(start, end))
+        return _chunks(rows)
+    raise ValueError(f"Unknown export kind {kind!r}")
+
+
+def _columns(kind: str) -> tuple[tuple[str, str], ...]:
+    return SAMPLE_COLUMNS if kind == "samples" else SPEEDTEST_COLUMNS
+
+
+def write_csv(chunks: Iterable[list[tuple]], columns: tuple[tuple[str, str], ...], out: IO[str]) -> int:
+    """
+    Write row chunks as CSV, one `write` per chunk. Returns rows written.
+    NaN (e.g. lost ping) is written as an empty field.
+    """
+    out.write(",".join(name for name, _ in columns) + "\n")
+    row_format = ",".join(["%.3f"] * len(columns)) + "\n"
+    total = 0
+    for chunk in chunks:
+        out.write("".join(map(row_format.__mod__, chunk)).replace("nan", ""))
+        total += len(chunk)
+    return total
+
+
+def write_columnar(chunks: Iterable[list[tuple]], columns: tuple[tuple[str, str], ...], out: IO[bytes]) -> int:
+    """
+    Write row chunks in the compact NSWC columnar format. Returns rows written.
+    """
+    header = bytearray(COLUMNAR_MAGIC)
+    header += struct.pack("<BB", COLUMNAR_VERSION, len(columns))
+    for name, typecode in columns:
+        encoded = name.encode("ascii")
+        header += struct.pack("<B", len(encoded)) + encoded + typecode.encode("ascii")
+    out.write(header)
+
+    total = 0
+    for chunk in chunks:
+        parts = [struct.pack("<I", len(chunk))]
+        for (_, typecode), values in zip(columns, zip(*chunk)):
+            column = array(typecode, values)
+            if sys.byteorder != "little":
+                column.byteswap()
+            parts.append(column.tobytes())
+        out.write(b"".join(parts))
+        total += len(chunk)
+    out.write(struct.pack("<I", 0))
+    return total
+
+
+def read_columnar(src: IO[bytes]) -> Iterator[Dict[str, array]]:
+    """
+    Stream an NSWC file back as one {column: array} dict per chunk.
+    """
+    if src.read(4) != COLUMNAR_MAGIC:
+        raise ValueError("Not an NSWC file")
+    version, ncols = struct.unpack("<BB", src.read(2))
+    if version != COLUMNAR_VERSION:
+        raise ValueError(f"Unsupported NSWC version {version}")
+    columns = []
+    for _ in range(ncols):
+        (length,) = struct.unpack("<B", src.read(1))
+        columns.append((src.read(length).decode("ascii"), src.read(1).decode("ascii")))
+
+    while True:
+        (count,) = struct.unpack("<I", src.read(4))
+        if count == 0:
+            return
+        chunk: Dict[str, array] = {}
+        for name, typecode in columns:
+            column = array(typecode)
+            column.frombytes(src.read(count * column.itemsize))
+            if sys.byteorder != "little":
+                column.byteswap()
+            chunk[name] = column
+        yield chunk
+
+
+def export(kind: str, start: float, end: float, fmt: str, out: Any) -> int:
+    """
+    Export `kind` ("samples" or "speedtests") for [start, end) as "csv"
+    (text stream) or "columnar" (binary stream). Returns rows written.
+    """
+    chunks = _row_chunks(kind, start, end)
+    if fmt == "csv":
+        return write_csv(chunks, _columns(kind), out)
+    if fmt == "columnar":
+        return write_columnar(chunks, _columns(kind), out)
+    raise ValueError(f"Unknown export format {fmt!r}")
+
+
+def _parse_time(value: str) -> float:
+    """
+    Accept epoch seconds or an ISO 8601 date/datetime (UTC if no zone given).
+    """
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Export NetSpeed Widget history")
+    parser.add_argument("--kind", choices=("samples", "speedtests"), default="samples")
+    parser.add_argument("--format", choices=("csv", "columnar"), default="csv")
+    parser.add_argument("--from", dest="start", required=True, help="epoch seconds or ISO date/time (UTC)")
+    parser.add_argument("--to", dest="end", default=None, help="epoch seconds or ISO date/time (UTC); default now")
+    parser.add_argument("-o", "--output", default="-", help="output file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    start = _parse_time(args.start)
+    end = _parse_time(args.end) if args.end else time.time()
+    binary = args.format == "columnar"
+
+    if args.output == "-":
+        out = sys.stdout.buffer if binary else sys.stdout
+        count = export(args.kind, start, end, args.format, out)
+    else:
+        mode = "wb" if binary else "w"
+        with open(args.output, mode, **({} if binary else {"encoding": "utf-8", "newline": ""})) as out:
+            count = export(args.kind, start, end, args.format, out)
+    print(f"Exported {count} {args.kind} rows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
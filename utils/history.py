@@ -0,0 +1,285 @@
+import json
+import math
+import os
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator
+
+from utils.archive import ArchiveReader, ArchiveWriter
+from utils.paths import config_path
+
+HISTORY_DIR = "history"
+SPEEDTEST_FILE = "speedtests.jsonl"
+FLUSH_EVERY = 10  # records buffered before hitting the disk
+SEAL_INTERVAL_SEC = 60 * 60  # how often finished day files are looked for and sealed
+
+# ts (epoch seconds), down Mb/s, up Mb/s, rtt ms (NaN = ping lost)
+RECORD = struct.Struct("<dfff")
+READ_CHUNK_RECORDS = 4096
+
+Sample = tuple[float, float, float, float]
+
+
+def history_dir() -> str:
+    """
+    Folder holding per-day sample files and the speedtest log.
+    """
+    path = config_path(HISTORY_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """
+    Replace `path` with `data` as compact JSON: temp file, fsync, os.replace,
+    so a crash leaves either the old or the new file, never a torn one.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _day_key(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def samples_path(day: str) -> str:
+    """
+    Raw fixed-width sample file for a UTC day ("YYYY-MM-DD").
+    """
+    return os.path.join(history_dir(), f"samples-{day}.bin")
+
+
+def archive_path(day: str) -> str:
+    """
+    Sealed, compressed sample file for a UTC day (see `utils.archive`).
+    """
+    return os.path.join(history_dir(), f"samples-{day}.nsa")
+
+
+class HistoryWriter:
+    """
+    Appends 1 Hz samples as fixed-width little-endian records, one file per
+    UTC day. Fixed width keeps reads seekable without an index. Finished
+    days are later compressed by `seal_history`.
+    """
+
+    def __init__(self) -> None:
+        self._day: str | None = None
+        self._file = None
+        self._pending: int = 0
+
+
+    def append(self, ts: float, down_mbps: float, up_mbps: float, rtt_ms: float | None) -> None:
+        try:
+            day = _day_key(ts)
+            if day != self._day:
+                self._roll(day)
+            self._file.write(RECORD.pack(ts, down_mbps, up_mbps, math.nan if rtt_ms is None else rtt_ms))
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY:
+                self._file.flush()
+                self._pending = 0
+        except Exception:
+            # History must never break the sampler
+            pass
+
+
+    @property
+    def open_day(self) -> str | None:
+        """
+        UTC day of the file currently open for appending.
+        """
+        return self._day
+
+
+    def _roll(self, day: str) -> None:
+        self.close()
+        path = samples_path(day)
+        self._file = open(path, "ab")
+        # Drop a torn trailing record left by a crash so records stay aligned
+        size = self._file.tell()
+        if size % RECORD.size:
+            self._file.truncate(size - size % RECORD.size)
+        self._day = day
+
+
+    def close(self) -> None:
+        if self._file:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+        self._file = None
+        self._day = None
+        self._pending = 0
+
+
+def append_speedtest(record: Dict[str, Any]) -> None:
+    """
+    Append one speedtest result (as saved by `config.set_speedtest`) to the log.
+    """
+    try:
+        with open(os.path.join(history_dir(), SPEEDTEST_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    except Exception:
+        pass
+
+
+def _days_between(start: float, end: float) -> Iterator[str]:
+    day = datetime.fromtimestamp(start, timezone.utc).date()
+    last = datetime.fromtimestamp(end, timezone.utc).date()
+    while day <= last:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+def _read_raw(path: str) -> Iterator[list[Sample]]:
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(READ_CHUNK_RECORDS * RECORD.size)
+            rows = list(RECORD.iter_unpack(buf[: len(buf) - len(buf) % RECORD.size]))
+            if not rows:
+                return
+            yield rows
+
+
+def seal_day(day: str) -> bool:
+    """
+    Compress a finished day's raw file into its archive and remove the raw
+    file. The archive is written to a temp file, decoded and compared with
+    the source before it replaces anything, so a failure leaves the raw
+    file in place. Rows already archived for that day (a raw file reopened
+    after a clock change, or left by a crash mid-seal) are merged in.
+    """
+    raw, sealed = samples_path(day), archive_path(day)
+    if not os.path.exists(raw):
+        return False
+    rows: list[Sample] = []
+    if os.path.exists(sealed):
+        with open(sealed, "rb") as f:
+            for chunk in ArchiveReader(f).iter_chunks():
+                rows.extend(chunk)
+    for chunk in _read_raw(raw):
+        rows.extend(chunk)
+    rows = sorted({row[0]: row for row in rows}.values())
+    expected = b"".join(RECORD.pack(*row) for row in rows)
+    tmp = sealed + ".tmp"
+    with open(tmp, "w+b") as f:
+        writer = ArchiveWriter(f)
+        writer.write(rows)
+        writer.close()
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        decoded = b"".join(RECORD.pack(*row) for chunk in ArchiveReader(f).iter_chunks() for row in chunk)
+    if decoded != expected:
+        os.remove(tmp)
+        return False
+    os.replace(tmp, sealed)
+    os.remove(raw)
+    return True
+
+
+def seal_history(open_day: str | None = None) -> int:
+    """
+    Seal every raw day file except today's (UTC) and `open_day` (the file
+    a HistoryWriter may still append to). Returns the number sealed.
+    """
+    keep = {_day_key(time.time()), open_day}
+    sealed = 0
+    for name in sorted(os.listdir(history_dir())):
+        if not (name.startswith("samples-") and name.endswith(".bin")):
+            continue
+        day = name[len("samples-"):-len(".bin")]
+        if day in keep:
+            continue
+        try:
+            sealed += seal_day(day)
+        except Exception:
+            pass  # retried on the next pass
+    return sealed
+
+
+def _first_index_at_or_after(f, count: int, ts: float) -> int:
+    """
+    Binary search a day file for the first record with timestamp >= ts.
+    """
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        f.seek(mid * RECORD.size)
+        if RECORD.unpack(f.read(RECORD.size))[0] < ts:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def iter_sample_chunks(start: float, end: float | None = None) -> Iterator[list[Sample]]:
+    """
+    Stream (ts, down, up, rtt) samples with start <= ts < end as lists of up
+    to READ_CHUNK_RECORDS rows, in time order. The first record is located by
+    binary search and only one chunk is held in memory at a time. Sealed
+    days are read from their archive (block index, one decoded block at a
+    time), plus any raw rows written after sealing.
+    """
+    end = time.time() if end is None else end
+    for day in _days_between(start, end):
+        sealed = archive_path(day)
+        if os.path.exists(sealed):
+            try:
+                with open(sealed, "rb") as f:
+                    yield from ArchiveReader(f).iter_chunks(start, end)
+            except (OSError, ValueError):
+                pass
+        path = samples_path(day)
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            count = os.fstat(f.fileno()).st_size // RECORD.size
+            index = _first_index_at_or_after(f, count, start)
+            f.seek(index * RECORD.size)
+            while index < count:
+                n = min(READ_CHUNK_RECORDS, count - index)
+                buf = f.read(n * RECORD.size)
+                index += n
+                rows = list(RECORD.iter_unpack(buf[: len(buf) - len(buf) % RECORD.size]))
+                if rows and rows[-1][0] >= end:
+                    rows = [row for row in rows if row[0] < end]
+                    if rows:
+                        yield rows
+                    return
+                if rows:
+                    yield rows
+
+
+def iter_samples(start: float, end: float | None = None) -> Iterator[Sample]:
+    """
+    Row-by-row view over `iter_sample_chunks`.
+    """
+    for rows in iter_sample_chunks(start, end):
+        yield from rows
+
+
+def iter_speedtests(start: float, end: float | None = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream saved speedtest records with start <= ts < end.
+    """
+    end = time.time() if end is None else end
+    path = os.path.join(history_dir(), SPEEDTEST_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                ts = float(record["ts"])
+            except Exception:
+                continue
+            if start <= ts < end:
+                yield record
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator
+
+from utils.paths import config_path
+
+JSON_LOG_FILE: str = "events.jsonl"
+_TS_PREFIX = b'{"ts":'
+
+
+class JsonLogSink:
+    """
+    Append-only JSON-lines event log: one object per line with `ts` (epoch
+    seconds) always first, then `event`, then `value` and any extra fields.
+
+    Lines are written in time order, which lets `query_events` binary-search
+    the file by timestamp instead of scanning it.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or config_path(JSON_LOG_FILE)
+        self._lock = threading.Lock()
+        self._file = None
+
+
+    def write(self, event: str, value: Any = None, ts: float | None = None, **fields: Any) -> None:
+        record: Dict[str, Any] = {"event": event}
+        if value is not None:
+            record["value"] = value
+        record.update(fields)
+        body = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str)
+        try:
+            with self._lock:
+                # Stamped under the lock so lines from different threads stay in time order
+                stamp = json.dumps(round(time.time() if ts is None else ts, 3))
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(f'{{"ts":{stamp},{body[1:]}\n')
+                self._file.flush()
+        except Exception:
+            # Logging must never break the app.
+            pass
+
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+                self._file = None
+
+
+def _line_ts(line: bytes) -> float | None:
+    """
+    Timestamp of a log line without a full JSON parse.
+    """
+    if line.startswith(_TS_PREFIX):
+        end = line.find(b",", len(_TS_PREFIX))
+        try:
+            return float(line[len(_TS_PREFIX):end])
+        except ValueError:
+            pass
+    try:
+        return float(json.loads(line)["ts"])
+    except Exception:
+        return None
+
+
+def _next_line_start(f, offset: int) -> int:
+    """
+    Offset of the first line that starts at or after `offset`.
+    """
+    if offset <= 0:
+        return 0
+    f.seek(offset - 1)
+    f.readline()
+    return f.tell()
+
+
+def seek_time(f, ts: float) -> int:
+    """
+    Byte offset of the first line with timestamp >= `ts`, found by binary
+    search over file offsets: O(log size) line reads, no full scan.
+    """
+    size = os.fstat(f.fileno()).st_size
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        pos = _next_line_start(f, mid)
+        if pos >= size:
+            hi = mid
+            continue
+        f.seek(pos)
+        line_ts = _line_ts(f.readline())
+        if line_ts is not None and line_ts >= ts:
+            hi = mid
+        else:
+            # Every offset up to `pos` lands on this (too old) line
+            lo = max(pos, mid) + 1
+    return _next_line_start(f, lo)
+
+
+def query_events(
+    start: float,
+    end: float | None = None,
+    events: Iterable[str] | None = None,
+    path: str | None = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield records with start <= ts < end, optionally limited to `events`.
+    Seeks straight to `start`; only lines inside the range are parsed.
+    """
+    path = path or config_path(JSON_LOG_FILE)
+    wanted = set(events) if events else None
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        f.seek(seek_time(f, start))
+        for line in f:
+            ts = _line_ts(line)
+            if ts is None:
+                continue
+            if end is not None and ts >= end:
+                return
+            if wanted is not None and not any(f'"event":"{name}"'.encode() in line for name in wanted):
+                continue
+            try:
+                record = json.loads(line)
+            except Exception:
+                continue
+            if wanted is None or record.get("event") in wanted:
+                yield record
+
+
+def _parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Query the structured NetSpeed Widget event log")
+    parser.add_argument("--from", dest="start", required=True, help="epoch seconds or ISO date/time (UTC)")
+    parser.add_argument("--to", dest="end", default=None, help="epoch seconds or ISO date/time (UTC)")
+    parser.add_argument("--event", action="append", help="event type to include (repeatable)")
+    parser.add_argument("--path", default=None, help=f"log file (default: {JSON_LOG_FILE} in the app folder)")
+    args = parser.parse_args(argv)
+
+    end = _parse_time(args.end) if args.end else None
+    for record in query_events(_parse_time(args.start), end, args.event, args.path):
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
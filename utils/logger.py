@@ -1,11 +1,15 @@
 import platform
 import sys
 from datetime import datetime, timezone
+from typing import Any
 
+from utils.jsonlog import JsonLogSink
 from utils.paths import config_path
 
 LOG_FILE: str = "log.txt"
 
+_event_sink: JsonLogSink | None = None
+
 
 def save_log(message: str, has_time: bool = True, is_title: bool = False) -> str:
     """
@@ -63,6 +67,32 @@ def warn(msg: str) -> None:
     save_log(f"[WARN] {msg}", has_time=True)
 
 
+def enable_structured_log(path: str | None = None) -> None:
+    """
+    Start mirroring `event(...)` calls to the JSON-lines event log.
+    """
+    global _event_sink
+    if _event_sink is None:
+        _event_sink = JsonLogSink(path)
+
+
+def close_structured_log() -> None:
+    global _event_sink
+    sink, _event_sink = _event_sink, None
+    if sink:
+        sink.close()
+
+
+def event(name: str, value: Any = None, **fields: Any) -> None:
+    """
+    Structured event (e.g. "ping_drop", "speedtest"). A no-op unless the
+    structured log is enabled; the text log keeps its own info/warn lines.
+    """
+    sink = _event_sink
+    if sink is not None:
+        sink.write(name, value, **fields)
+
+
 def _now_iso() -> str:
     """
     Current UTC time in ISO 8601.
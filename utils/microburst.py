@@ -0,0 +1,197 @@
+import struct
+import threading
+import time
+from typing import Callable, NamedTuple
+
+from net.counters import CounterSource
+from utils.cancel import CancelToken
+
+DEFAULT_INTERVAL_MS = 20
+BURST_RING_SLOTS = 1024
+
+# One finished burst: start ts (epoch s), duration ms, peak Mb/s, mean Mb/s
+# while above threshold, direction (0 = down, 1 = up). 24 bytes per slot.
+BURST_RECORD = struct.Struct("<dfffB3x")
+DOWN, UP = 0, 1
+
+
+class Burst(NamedTuple):
+    ts: float
+    duration_ms: float
+    peak_mbps: float
+    mean_mbps: float
+    direction: int
+
+
+class BurstSummary(NamedTuple):
+    """
+    Per-second digest of the high-resolution samples; the only thing the
+    normal (1 Hz) UI path sees.
+    """
+    ts: float
+    down_peak_mbps: float
+    up_peak_mbps: float
+    down_peak_to_mean: float
+    up_peak_to_mean: float
+    down_above_ms: float
+    up_above_ms: float
+    bursts: int
+
+
+class BurstRing:
+    """
+    Fixed-size ring of finished bursts packed into one bytearray.
+    """
+
+    def __init__(self, slots: int = BURST_RING_SLOTS) -> None:
+        self.slots = slots
+        self._buf = bytearray(slots * BURST_RECORD.size)
+        self._lock = threading.Lock()
+        self.count: int = 0  # bursts ever recorded
+
+
+    def add(self, burst: Burst) -> None:
+        with self._lock:
+            BURST_RECORD.pack_into(self._buf, (self.count % self.slots) * BURST_RECORD.size, *burst)
+            self.count += 1
+
+
+    def recent(self, n: int | None = None) -> list[Burst]:
+        """
+        Up to `n` newest bursts (default all kept), oldest first.
+        """
+        with self._lock:
+            total = min(self.count, self.slots, self.slots if n is None else n)
+            first = self.count - total
+            return [
+                Burst(*BURST_RECORD.unpack_from(self._buf, (i % self.slots) * BURST_RECORD.size))
+                for i in range(first, self.count)
+            ]
+
+
+class _Direction:
+    """
+    Accumulators for one direction: the current second plus an open burst.
+    """
+
+    __slots__ = ("threshold", "peak", "total", "ticks", "above_sec", "burst_start", "burst_peak", "burst_sum", "burst_ticks", "burst_sec")
+
+    def __init__(self) -> None:
+        self.threshold: float | None = None
+        self.burst_start: float | None = None
+        self.reset_second()
+
+
+    def reset_second(self) -> None:
+        self.peak = 0.0
+        self.total = 0.0
+        self.ticks = 0
+        self.above_sec = 0.0
+
+
+class MicroburstCapture:
+    """
+    High-resolution capture on a dedicated thread.
+
+    Reads a private counter source every `interval_ms` (10-50 ms), tracks
+    per-direction peak and mean, time spent above the saturation threshold,
+    and bursts (contiguous runs above it), which go into a compact
+    `BurstRing`. Once per second it builds a `BurstSummary` and hands it to
+    `on_summary`; nothing else leaves the thread.
+    """
+
+    def __init__(
+        self,
+        source: CounterSource,
+        token: CancelToken,
+        interval_ms: float = DEFAULT_INTERVAL_MS,
+        on_summary: Callable[[BurstSummary], None] | None = None,
+    ) -> None:
+        self.source = source
+        self.token = token
+        self.interval = max(10.0, min(50.0, float(interval_ms))) / 1000.0
+        self.on_summary = on_summary
+        self.ring = BurstRing()
+        self.last_summary: BurstSummary | None = None
+        self._dirs = (_Direction(), _Direction())
+        self._bursts_this_second = 0
+
+
+    def set_thresholds(self, down_mbps: float | None, up_mbps: float | None) -> None:
+        """
+        Rates above which a tick counts as saturated (None disables burst
+        detection for that direction; peak and mean are still tracked).
+        """
+        self._dirs[DOWN].threshold = down_mbps if down_mbps and down_mbps > 0 else None
+        self._dirs[UP].threshold = up_mbps if up_mbps and up_mbps > 0 else None
+
+
+    def run(self) -> None:
+        """
+        Capture loop; returns when the token is cancelled.
+        """
+        interval = self.interval
+        prev_sent, prev_recv = self.source.read()
+        prev_t = time.monotonic()
+        next_tick = prev_t + interval
+        second_end = prev_t + 1.0
+        while not self.token.wait(max(0.0, next_tick - time.monotonic())):
+            sent, recv = self.source.read()
+            now = time.monotonic()
+            dt = now - prev_t
+            if dt > 0:
+                wall = time.time()
+                self._tick(self._dirs[DOWN], DOWN, (recv - prev_recv) * 8e-6 / dt, dt, wall)
+                self._tick(self._dirs[UP], UP, (sent - prev_sent) * 8e-6 / dt, dt, wall)
+            prev_sent, prev_recv, prev_t = sent, recv, now
+            next_tick += interval
+            if next_tick < now:
+                next_tick = now + interval  # fell behind (suspend, load): don't catch up
+            if now >= second_end:
+                self._emit_summary()
+                second_end = now + 1.0
+        self.source.close()
+
+
+    def _tick(self, d: _Direction, direction: int, mbps: float, dt: float, wall: float) -> None:
+        d.ticks += 1
+        d.total += mbps
+        if mbps > d.peak:
+            d.peak = mbps
+        if d.threshold is None:
+            return
+        if mbps > d.threshold:
+            d.above_sec += dt
+            if d.burst_start is None:
+                d.burst_start, d.burst_peak, d.burst_sum, d.burst_ticks, d.burst_sec = wall - dt, 0.0, 0.0, 0, 0.0
+            d.burst_peak = max(d.burst_peak, mbps)
+            d.burst_sum += mbps
+            d.burst_ticks += 1
+            d.burst_sec += dt
+        elif d.burst_start is not None:
+            self.ring.add(Burst(d.burst_start, d.burst_sec * 1000.0, d.burst_peak, d.burst_sum / d.burst_ticks, direction))
+            self._bursts_this_second += 1
+            d.burst_start = None
+
+
+    def _emit_summary(self) -> None:
+        down, up = self._dirs
+        summary = BurstSummary(
+            ts=time.time(),
+            down_peak_mbps=down.peak,
+            up_peak_mbps=up.peak,
+            down_peak_to_mean=down.peak / (down.total / down.ticks) if down.total > 0 else 0.0,
+            up_peak_to_mean=up.peak / (up.total / up.ticks) if up.total > 0 else 0.0,
+            down_above_ms=down.above_sec * 1000.0,
+            up_above_ms=up.above_sec * 1000.0,
+            bursts=self._bursts_this_second,
+        )
+        down.reset_second()
+        up.reset_second()
+        self._bursts_this_second = 0
+        self.last_summary = summary
+        if self.on_summary:
+            try:
+                self.on_summary(summary)
+            except Exception:
+                pass
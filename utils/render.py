@@ -0,0 +1,118 @@
+from typing import Any, Sequence
+
+# (x0, y0, x1, y1, color) in whole canvas pixels
+Segment = tuple[int, int, int, int, str]
+
+
+def graph_segments(
+    points: Sequence[tuple[float, float, bool]],
+    max_speed: float,
+    width: int,
+    height: int,
+    base_color: str,
+    offset_y: int,
+) -> list[Segment]:
+    """
+    Map decimated series points (x as a 0..1 fraction of the window, value,
+    ping-loss flag) onto one half of a `width` x `height` graph, one
+    segment per point pair. Segments ending on a lost ping are red.
+    """
+    n = len(points)
+    if n < 2:
+        return []
+
+    half = height // 2
+    pts: list[tuple[int, int]] = []
+    for x, val, _ in points:
+        y = (half - (val / max_speed) * (half - 2)) + offset_y
+        pts.append((round(x * width), round(y)))
+
+    segments = []
+    for i in range(1, n):
+        x0, y0 = pts[i - 1]
+        x1, y1 = pts[i]
+        segments.append((x0, y0, x1, y1, "red" if points[i][2] else base_color))
+    return segments
+
+
+class RenderCache:
+    """
+    Dirty-checking layer between the widget and Tk.
+
+    Remembers the last text pushed to each label and the last geometry of each
+    graph line, and only issues Tk calls for values that actually changed after
+    formatting. An idle link therefore costs no X11/GDI traffic at all.
+    """
+
+    def __init__(self) -> None:
+        self._texts: dict[str, str] = {}
+        # tag -> list of (canvas item id, last drawn segment)
+        self._lines: dict[str, list[tuple[int, Segment]]] = {}
+        self.applied: int = 0
+        self.skipped: int = 0
+
+
+    def set_text(self, widget: Any, text: str) -> bool:
+        """
+        Configure `text` on a label only when it differs from the last value.
+        Returns True if a Tk call was made.
+        """
+        key = str(widget)
+        if self._texts.get(key) == text:
+            self.skipped += 1
+            return False
+        widget.config(text=text)
+        self._texts[key] = text
+        self.applied += 1
+        return True
+
+
+    def draw_segments(self, canvas: Any, tag: str, segments: list[Segment]) -> int:
+        """
+        Bring the line items under `tag` in sync with `segments`.
+
+        Existing items are moved/recolored in place instead of deleting and
+        recreating the whole canvas. Returns the number of Tk operations issued.
+        """
+        items = self._lines.setdefault(tag, [])
+
+        # Fast path: nothing moved since the last tick
+        if len(items) == len(segments) and all(last == seg for (_, last), seg in zip(items, segments)):
+            self.skipped += len(segments)
+            return 0
+
+        ops = 0
+        for i, seg in enumerate(segments):
+            x0, y0, x1, y1, color = seg
+            if i < len(items):
+                item_id, last = items[i]
+                if last == seg:
+                    self.skipped += 1
+                    continue
+                if last[:4] != seg[:4]:
+                    canvas.coords(item_id, x0, y0, x1, y1)
+                    ops += 1
+                if last[4] != color:
+                    canvas.itemconfigure(item_id, fill=color)
+                    ops += 1
+                items[i] = (item_id, seg)
+            else:
+                item_id = canvas.create_line(x0, y0, x1, y1, fill=color, width=2, tags=(tag,))
+                items.append((item_id, seg))
+                ops += 1
+
+        # Series got shorter (e.g. window change): drop surplus items
+        for item_id, _ in items[len(segments):]:
+            canvas.delete(item_id)
+            ops += 1
+        del items[len(segments):]
+
+        self.applied += ops
+        return ops
+
+
+    def stats(self) -> dict[str, int]:
+        """
+        Counters of applied vs skipped updates since startup.
+        """
+        return {"applied": self.applied, "skipped": self.skipped}
@@ -0,0 +1,158 @@
+import argparse
+import hashlib
+import struct
+import time
+from typing import Any, NamedTuple
+
+from utils.decimate import DecimatedSeries
+from utils.render import RenderCache, graph_segments
+from utils.sampler import SPEEDTEST_INTERVAL_SEC, SPEEDTEST_STARTUP_GRACE_SEC, Sampler, SpeedtestGate
+from utils.trace import TraceReader
+
+GRAPH_WIDTH = 150
+GRAPH_HEIGHT = 35
+REPLAY_SPEEDTEST_SEC = 30.0  # virtual duration of a gated speedtest run
+_DIGEST_RECORD = struct.Struct("<dddd")
+
+
+class NullCanvas:
+    """
+    Stand-in for the Tk canvas: accepts the calls `RenderCache` makes and
+    counts them, so rendering cost can be measured without a display.
+    """
+
+    def __init__(self) -> None:
+        self._next_id = 0
+        self.calls: int = 0
+
+
+    def create_line(self, *_: Any, **__: Any) -> int:
+        self.calls += 1
+        self._next_id += 1
+        return self._next_id
+
+
+    def coords(self, *_: Any) -> None:
+        self.calls += 1
+
+
+    def itemconfigure(self, *_: Any, **__: Any) -> None:
+        self.calls += 1
+
+
+    def delete(self, *_: Any) -> None:
+        self.calls += 1
+
+
+class ReplayResult(NamedTuple):
+    ticks: int
+    trace_sec: float
+    elapsed_sec: float
+    speedtests: int
+    events: dict[str, int]
+    render_applied: int
+    render_skipped: int
+    digest: str  # sha1 over every sample; equal inputs + code give equal digests
+
+    @property
+    def speedup(self) -> float:
+        return self.trace_sec / self.elapsed_sec if self.elapsed_sec > 0 else float("inf")
+
+
+def replay(
+    path: str,
+    window: int = 10,
+    mode: str = "minmax",
+    speedtest_interval_sec: float = SPEEDTEST_INTERVAL_SEC,
+    speedtest_sec: float = REPLAY_SPEEDTEST_SEC,
+    last_speedtest_ts: float | None = None,
+) -> ReplayResult:
+    """
+    Feed a recorded trace through the same sampling, graph decimation,
+    segment mapping/render cache and speedtest gating the widget uses, as
+    fast as possible. Time comes from the trace, never from the clock.
+
+    A tick is a counters reading followed by its probe result (the order
+    the sampler tick records them in).
+    """
+    reader = TraceReader(path)
+    down_series = DecimatedSeries(window, GRAPH_WIDTH, mode)
+    up_series = DecimatedSeries(window, GRAPH_WIDTH, mode)
+    render = RenderCache()
+    canvas = NullCanvas()
+    digest = hashlib.sha1()
+    events: dict[str, int] = {}
+    sampler: Sampler | None = None
+    gate: SpeedtestGate | None = None
+    speedtest_ends: float | None = None
+    pending: tuple[int, int] | None = None
+    ticks = speedtests = 0
+    first_ts = last_ts = 0.0
+
+    started = time.perf_counter()
+    for record in reader:
+        if record[0] == "counters":
+            _, mono, sent, recv = record
+            if sampler is None:
+                sampler = Sampler(sent, recv)  # baseline read at startup
+                first_ts = reader.wall_time(mono)
+                gate = SpeedtestGate(speedtest_interval_sec, SPEEDTEST_STARTUP_GRACE_SEC, last_speedtest_ts, first_ts)
+            else:
+                pending = (sent, recv)
+            continue
+        if pending is None or sampler is None or gate is None:
+            continue
+
+        _, mono, rtt_ms = record
+        ts = reader.wall_time(mono)
+        sample, tick_events = sampler.step(ts, pending[0], pending[1], rtt_ms)
+        pending = None
+        for name, _ in tick_events:
+            events[name] = events.get(name, 0) + 1
+        digest.update(_DIGEST_RECORD.pack(sample.ts, sample.down_mbps, sample.up_mbps, -1.0 if rtt_ms is None else rtt_ms))
+
+        down_series.append(sample.down_mbps, sample.dropped)
+        up_series.append(sample.up_mbps, sample.dropped)
+        max_speed = max(down_series.peak(), up_series.peak(), 1.0)
+        render.draw_segments(canvas, "down", graph_segments(down_series.points(), max_speed, GRAPH_WIDTH, GRAPH_HEIGHT, "lime", 0))
+        render.draw_segments(canvas, "up", graph_segments(up_series.points(), max_speed, GRAPH_WIDTH, GRAPH_HEIGHT, "cyan", GRAPH_HEIGHT // 2))
+
+        if speedtest_ends is not None and ts >= speedtest_ends:
+            gate.finish(ts)
+            speedtest_ends = None
+        if gate.due(ts) and gate.try_start():
+            speedtests += 1
+            speedtest_ends = ts + speedtest_sec
+
+        ticks += 1
+        last_ts = ts
+
+    return ReplayResult(
+        ticks=ticks,
+        trace_sec=max(0.0, last_ts - first_ts),
+        elapsed_sec=time.perf_counter() - started,
+        speedtests=speedtests,
+        events=events,
+        render_applied=render.applied,
+        render_skipped=render.skipped,
+        digest=digest.hexdigest(),
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay a NetSpeed Widget counter trace faster than real time")
+    parser.add_argument("trace")
+    parser.add_argument("--window", type=int, default=10, help="graph window in seconds")
+    parser.add_argument("--mode", choices=("minmax", "lttb"), default="minmax")
+    args = parser.parse_args(argv)
+
+    result = replay(args.trace, args.window, args.mode)
+    print(
+        f"ticks={result.ticks} trace={result.trace_sec:.0f}s replay={result.elapsed_sec:.2f}s "
+        f"(x{result.speedup:.0f}) speedtests={result.speedtests} events={result.events} "
+        f"render applied={result.render_applied} skipped={result.render_skipped} digest={result.digest}"
+    )
+
+
+if __name__ == "__main__":
+    main()
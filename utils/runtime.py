@@ -0,0 +1,237 @@
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from utils.logger import warn
+
+# Worker pools by job kind, so a long job never delays the 1 Hz ping:
+#   ping          the per-tick ping (ticks never overlap, so one is enough)
+#   worker        one speedtest provider at a time + short disk reads (IPC)
+#   housekeeping  history sealing, sketch writes (may run for minutes)
+DEFAULT_POOLS: Dict[str, int] = {"ping": 1, "worker": 2, "housekeeping": 1}
+
+
+class Timer:
+    """
+    Handle for work scheduled on a `Runtime`. `cancel()` is safe from any thread.
+    """
+
+    def __init__(self, runtime: "Runtime") -> None:
+        self._runtime = runtime
+        self._handle: asyncio.Handle | asyncio.Task | None = None
+        self.cancelled: bool = False
+
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        handle = self._handle
+        if handle is not None:
+            self._runtime.call_soon(handle.cancel)
+
+
+class Runtime:
+    """
+    One asyncio event loop on one background thread that owns every timer
+    and background activity of the app.
+
+    - Timers (`call_later`, `call_at_wall`, `every`) live in the loop's
+      single timer heap, so the thread sleeps until the earliest deadline
+      and callbacks run one at a time in deadline order.
+    - Blocking work goes to small bounded thread pools via `run_blocking`,
+      one pool per kind of job (DEFAULT_POOLS); results come back to the loop.
+    - Everything that touches shared scheduling state runs on the loop
+      thread; other threads (Tk, tray, IPC clients) hand work over with
+      `call_soon`. Tk widgets are only touched through the app's `ui_call`,
+      which goes through Tk's own `after` queue.
+    """
+
+    def __init__(self, pools: Dict[str, int] | None = None, on_wakeup: Callable[[], None] | None = None) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.executors = {
+            name: concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"nsw-{name}")
+            for name, workers in (pools or DEFAULT_POOLS).items()
+        }
+        self.loop.set_default_executor(self.executors["worker"])
+        self.on_wakeup = on_wakeup  # called once per timer callback (self-monitor)
+        self.busy: int = 0  # blocking calls currently running on the pool
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="nsw-runtime")
+        self._stopping = False
+
+
+    def start(self) -> None:
+        self._thread.start()
+
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            tasks = [t for t in asyncio.all_tasks(self.loop) if not t.done()]
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+
+    def in_loop(self) -> bool:
+        return threading.current_thread() is self._thread
+
+
+    def call_soon(self, fn: Callable[..., Any], *args: Any) -> None:
+        """
+        Run `fn(*args)` on the loop thread as soon as possible (any thread).
+        """
+        if self._stopping or self.loop.is_closed():
+            return
+        try:
+            if self.in_loop():
+                self.loop.call_soon(fn, *args)
+            else:
+                self.loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass  # loop closed during shutdown
+
+
+    def call_later(self, delay: float, fn: Callable[..., Any], *args: Any) -> Timer:
+        """
+        Run `fn(*args)` on the loop thread after `delay` seconds (any thread).
+        """
+        timer = Timer(self)
+
+        def _arm() -> None:
+            if not timer.cancelled:
+                timer._handle = self.loop.call_later(max(0.0, delay), self._fire, timer, fn, args)
+
+        self.call_soon(_arm)
+        return timer
+
+
+    def call_at_wall(self, wall_ts: float, fn: Callable[..., Any], *args: Any) -> Timer:
+        """
+        `call_later` for an epoch timestamp (e.g. a persisted due time).
+        """
+        return self.call_later(wall_ts - time.time(), fn, *args)
+
+
+    def _fire(self, timer: Timer, fn: Callable[..., Any], args: tuple) -> None:
+        if timer.cancelled:
+            return
+        self._count_wakeup()
+        try:
+            result = fn(*args)
+            if inspect.isawaitable(result):
+                self.loop.create_task(self._guard(fn, result))
+        except Exception as exc:
+            warn(f"[APP] Timer {_name(fn)} failed ({type(exc).__name__}: {exc})")
+
+
+    async def _guard(self, fn: Callable[..., Any], awaitable: Awaitable[Any]) -> None:
+        try:
+            await awaitable
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            warn(f"[APP] Timer {_name(fn)} failed ({type(exc).__name__}: {exc})")
+
+
+    def _count_wakeup(self) -> None:
+        if self.on_wakeup is not None:
+            try:
+                self.on_wakeup()
+            except Exception:
+                pass
+
+
+    def every(
+        self,
+        interval: float | Callable[[], float],
+        fn: Callable[[], Any],
+        first_delay: float | None = None,
+    ) -> Timer:
+        """
+        Run `fn` periodically at a fixed rate. If it returns an awaitable the
+        next run waits for it, so runs never overlap; a run that overshoots
+        its slot starts the next one immediately without piling up.
+        `interval` may be a callable to re-read it every period.
+        """
+        timer = Timer(self)
+        period = interval if callable(interval) else (lambda: interval)
+
+        async def _periodic() -> None:
+            next_at = self.loop.time() + (period() if first_delay is None else first_delay)
+            last_error = None  # a failing 1 Hz tick is logged once, not every second
+            while not timer.cancelled:
+                await asyncio.sleep(max(0.0, next_at - self.loop.time()))
+                if timer.cancelled:
+                    return
+                self._count_wakeup()
+                try:
+                    result = fn()
+                    if inspect.isawaitable(result):
+                        await result
+                    last_error = None
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                    if error != last_error:
+                        warn(f"[APP] Periodic {_name(fn)} failed ({error})")
+                    last_error = error
+                next_at = max(next_at + period(), self.loop.time())
+
+        def _arm() -> None:
+            if not timer.cancelled:
+                timer._handle = self.loop.create_task(_periodic())
+
+        self.call_soon(_arm)
+        return timer
+
+
+    async def run_blocking(self, fn: Callable[..., Any], *args: Any, pool: str = "worker") -> Any:
+        """
+        Await `fn(*args)` on the named bounded pool (see DEFAULT_POOLS).
+        """
+        return await self.loop.run_in_executor(self.executors[pool], self._call_counted, fn, args)
+
+
+    def _call_counted(self, fn: Callable[..., Any], args: tuple) -> Any:
+        with self._idle:
+            self.busy += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._idle:
+                self.busy -= 1
+                self._idle.notify_all()
+
+
+    def stop(self, timeout: float) -> bool:
+        """
+        Stop the loop and the worker pool, waiting at most `timeout` seconds
+        in total for the loop thread and for blocking calls to return (they
+        are expected to be cancelled via tokens). Queued calls are dropped.
+        Returns True if everything ended in time.
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+        self._stopping = True
+        try:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        except RuntimeError:
+            pass
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        with self._idle:
+            self._idle.wait_for(lambda: self.busy == 0, max(0.0, deadline - time.monotonic()))
+            idle = self.busy == 0
+        return idle and not self._thread.is_alive()
+
+
+def _name(fn: Callable[..., Any]) -> str:
+    return getattr(fn, "__qualname__", None) or repr(fn)
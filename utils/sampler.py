@@ -0,0 +1,107 @@
+import threading
+from typing import Any, NamedTuple
+
+PEAK_LOG_MIN_MBPS = 1.0  # peaks below this are noise, not worth a log line
+SPEEDTEST_INTERVAL_SEC = 4 * 60 * 60  # 4 hours
+SPEEDTEST_STARTUP_GRACE_SEC = 20 # 20 seconds
+
+
+class Sample(NamedTuple):
+    """
+    One sampler tick: rates over the tick and the ping result (None = lost).
+    """
+    ts: float
+    down_mbps: float
+    up_mbps: float
+    rtt_ms: float | None
+
+    @property
+    def dropped(self) -> bool:
+        return self.rtt_ms is None
+
+
+class Sampler:
+    """
+    Turns raw counter readings and probe results into `Sample`s and
+    notable transitions, independent of where the readings come from
+    (a live counter source or a replayed trace).
+
+    `step` returns the sample plus (event, value) pairs:
+    "peak_up" / "peak_down" for new maxima, "ping_drop" / "ping_restore"
+    on ping state edges.
+    """
+
+    def __init__(self, bytes_sent: int, bytes_recv: int) -> None:
+        self.last_bytes_sent = bytes_sent
+        self.last_bytes_recv = bytes_recv
+        self.max_up_seen: float = 0.0
+        self.max_down_seen: float = 0.0
+        self.last_ping_ok: bool = True
+
+
+    def step(self, ts: float, bytes_sent: int, bytes_recv: int, rtt_ms: float | None) -> tuple[Sample, list[tuple[str, Any]]]:
+        # The tick is paced to ~1 s, so the byte delta is the per-second rate
+        up_mbps = (bytes_sent - self.last_bytes_sent) * 8.0 / 1_000_000.0
+        down_mbps = (bytes_recv - self.last_bytes_recv) * 8.0 / 1_000_000.0
+        self.last_bytes_sent = bytes_sent
+        self.last_bytes_recv = bytes_recv
+
+        events: list[tuple[str, Any]] = []
+        if up_mbps > self.max_up_seen and up_mbps >= PEAK_LOG_MIN_MBPS:
+            self.max_up_seen = up_mbps
+            events.append(("peak_up", up_mbps))
+        if down_mbps > self.max_down_seen and down_mbps >= PEAK_LOG_MIN_MBPS:
+            self.max_down_seen = down_mbps
+            events.append(("peak_down", down_mbps))
+
+        ok = rtt_ms is not None
+        if ok and not self.last_ping_ok:
+            events.append(("ping_restore", rtt_ms))
+        elif not ok and self.last_ping_ok:
+            events.append(("ping_drop", None))
+        self.last_ping_ok = ok
+
+        return Sample(ts, down_mbps, up_mbps, rtt_ms), events
+
+
+class SpeedtestGate:
+    """
+    When the periodic speedtest may run.
+
+    Policy:
+        - With a saved result at `last_ts`, the first run is due at
+          `last_ts + interval`; if that is already past, after a short
+          startup grace instead (no immediate run at startup).
+        - Without a saved result, after the startup grace.
+        - Only one run at a time; the next one is due `interval` after a
+          run finishes.
+    """
+
+    def __init__(self, interval_sec: float, grace_sec: float, last_ts: float | None, now: float) -> None:
+        self.interval_sec = interval_sec
+        self.grace_sec = grace_sec
+        self.running: bool = False
+        self._lock = threading.Lock()
+        due = last_ts + interval_sec if last_ts is not None else now
+        self.next_due: float = due if due > now else now + grace_sec
+
+
+    def due(self, now: float) -> bool:
+        return not self.running and now >= self.next_due
+
+
+    def try_start(self) -> bool:
+        """
+        Claim the single run slot. False if a run is already active.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+            return True
+
+
+    def finish(self, now: float) -> None:
+        with self._lock:
+            self.running = False
+            self.next_due = now + self.interval_sec
@@ -0,0 +1,169 @@
+import threading
+import time
+import tracemalloc
+from typing import Dict, NamedTuple
+
+import psutil
+
+
+class SelfSample(NamedTuple):
+    """
+    One reading of the widget's own footprint. Rates are per second since
+    the previous reading.
+    """
+    ts: float
+    cpu_percent: float
+    rss_mb: float
+    threads: int
+    handles: int
+    ctx_switches_per_sec: float
+    wakeups_per_sec: float
+    after_calls_per_sec: float
+    tracemalloc_peak_mb: float | None
+
+
+class SelfMonitor:
+    """
+    Samples this process via psutil (CPU%, RSS, threads, handles/fds,
+    context switches) and keeps counters the app bumps for Tk `after`
+    callbacks and sampler wakeups. Readings are compared to budgets; each
+    exceeded budget is reported once until it drops back under.
+    """
+
+    def __init__(self, budgets: Dict[str, float]) -> None:
+        self.budgets = dict(budgets)
+        self._process = psutil.Process()
+        self._process.cpu_percent(None)  # prime; first real call returns a delta
+        self._lock = threading.Lock()
+        self.after_calls: int = 0
+        self.wakeups: int = 0
+        self.last: SelfSample | None = None
+        self._prev_time = time.monotonic()
+        self._prev_ctx = self._ctx_switches()
+        self._prev_after = 0
+        self._prev_wakeups = 0
+        self._over_budget: set[str] = set()
+
+
+    def count_after(self) -> None:
+        """
+        Record one Tk `after` callback scheduled by the app.
+        """
+        with self._lock:
+            self.after_calls += 1
+
+
+    def count_wakeup(self) -> None:
+        """
+        Record one wakeup of a background loop (sampler, scheduler, ...).
+        """
+        with self._lock:
+            self.wakeups += 1
+
+
+    def _ctx_switches(self) -> int:
+        try:
+            ctx = self._process.num_ctx_switches()
+            return ctx.voluntary + ctx.involuntary
+        except Exception:
+            return 0
+
+
+    def _handles(self) -> int:
+        try:
+            if hasattr(self._process, "num_handles"):
+                return self._process.num_handles()
+            return self._process.num_fds()
+        except Exception:
+            return 0
+
+
+    def sample(self) -> SelfSample:
+        """
+        Take a reading and store it as `last`.
+        """
+        now = time.monotonic()
+        with self._process.oneshot():
+            cpu = self._process.cpu_percent(None)
+            rss_mb = self._process.memory_info().rss / (1024 * 1024)
+            threads = self._process.num_threads()
+            handles = self._handles()
+            ctx = self._ctx_switches()
+        with self._lock:
+            after_calls, wakeups = self.after_calls, self.wakeups
+
+        elapsed = max(now - self._prev_time, 1e-6)
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if tracemalloc.is_tracing() else None
+        sample = SelfSample(
+            ts=time.time(),
+            cpu_percent=cpu,
+            rss_mb=rss_mb,
+            threads=threads,
+            handles=handles,
+            ctx_switches_per_sec=(ctx - self._prev_ctx) / elapsed,
+            wakeups_per_sec=(wakeups - self._prev_wakeups) / elapsed,
+            after_calls_per_sec=(after_calls - self._prev_after) / elapsed,
+            tracemalloc_peak_mb=peak,
+        )
+        self._prev_time, self._prev_ctx = now, ctx
+        self._prev_after, self._prev_wakeups = after_calls, wakeups
+        self.last = sample
+        return sample
+
+
+    def check_budgets(self, sample: SelfSample) -> list[str]:
+        """
+        Return a message for each budget newly exceeded by `sample`.
+        """
+        messages = []
+        for field, limit in self.budgets.items():
+            value = getattr(sample, field, None)
+            if value is None:
+                continue
+            if value > limit:
+                if field not in self._over_budget:
+                    self._over_budget.add(field)
+                    messages.append(f"{field}={value:.2f} exceeds budget {limit:g}")
+            else:
+                self._over_budget.discard(field)
+        return messages
+
+
+    def start_tracemalloc(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+    def stop_tracemalloc(self) -> float | None:
+        """
+        Stop tracing and return the peak traced memory in MB.
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+        return peak
+
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+
+def format_sample(sample: SelfSample | None) -> list[str]:
+    """
+    Short lines for the tray diagnostics view and the log.
+    """
+    if sample is None:
+        return ["Collecting..."]
+    lines = [
+        f"CPU {sample.cpu_percent:.1f}%",
+        f"RSS {sample.rss_mb:.1f} MB",
+        f"Threads {sample.threads} | Handles {sample.handles}",
+        f"Ctx switches {sample.ctx_switches_per_sec:.1f}/s",
+        f"Wakeups {sample.wakeups_per_sec:.2f}/s | Tk after {sample.after_calls_per_sec:.2f}/s",
+    ]
+    if sample.tracemalloc_peak_mb is not None:
+        lines.append(f"tracemalloc peak {sample.tracemalloc_peak_mb:.2f} MB")
+    return lines
+
@@ -0,0 +1,497 @@
+import argparse
+import math
+import os
+import struct
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator
+
+from utils.history import history_dir
+
+RELATIVE_ACCURACY = 0.01   # every reported quantile is within 1% of a true sample value
+MAX_BINS = 2048            # beyond this the lowest bins are collapsed (never hit for Mb/s or ms)
+SKETCH_SAVE_SEC = 10 * 60
+HOURS_KEEP = 72            # hourly sketches are dropped after this many hours; days/months stay
+KEEP_MONTHS = 24           # month files older than this are deleted
+METRICS = ("down", "up", "rtt")
+LEVELS = ("hour", "day", "month")
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Sketch file, one per local month: history/sketches-YYYY-MM.nsq
+#   header  "<4sBd": magic b"NSWQ", version 1, relative accuracy
+#   entries "<BBB" metric index, level index, key length; key (ascii, e.g.
+#           "2025-10-14T09", "2025-10-14", "2025-10"); "<I" payload length; payload
+# Payload (one sketch): "<ddd" min, max, sum, then varints: zero count,
+# bin count, and per bin the zigzag delta of its index from the previous
+# bin, then its count. A month of hourly/daily sketches for all metrics is
+# typically 100-300 KB; only sketches changed since the last save are re-encoded.
+MAGIC = b"NSWQ"
+VERSION = 1
+HEADER = struct.Struct("<4sBd")
+ENTRY = struct.Struct("<BBB")
+LENGTH = struct.Struct("<I")
+STATS = struct.Struct("<ddd")
+
+
+def _put_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data: bytes, pos: int) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+class DDSketch:
+    """
+    Quantile sketch with relative-error guarantees (DDSketch): positive
+    values fall into logarithmic bins gamma^(i-1) < v <= gamma^i, with
+    gamma = (1 + a) / (1 - a), so any quantile is reported within a
+    relative accuracy `a` of an actual value. Zero and negative values are
+    counted separately (idle throughput is mostly zeros).
+
+    Adding is O(1); merging two sketches with the same accuracy is exact
+    (bin counts add), so per-hour sketches combine into days, months and
+    hosts without losing accuracy.
+    """
+
+    __slots__ = ("accuracy", "gamma", "_log_gamma", "bins", "zero", "count", "min", "max", "sum")
+
+    def __init__(self, accuracy: float = RELATIVE_ACCURACY) -> None:
+        self.accuracy = accuracy
+        self.gamma = (1.0 + accuracy) / (1.0 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero: int = 0
+        self.count: int = 0
+        self.min: float = math.inf
+        self.max: float = -math.inf
+        self.sum: float = 0.0
+
+
+    def index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+
+    def add(self, value: float, index: int | None = None) -> None:
+        """
+        Add one value; `index` may be passed when the caller already
+        computed it (the same value going into several sketches).
+        """
+        if value != value:
+            return  # NaN
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 0.0:
+            self.zero += 1
+            return
+        key = self.index(value) if index is None else index
+        bins = self.bins
+        bins[key] = bins.get(key, 0) + 1
+        if len(bins) > MAX_BINS:
+            self._collapse()
+
+
+    def _collapse(self) -> None:
+        keys = sorted(self.bins)
+        merged = sum(self.bins.pop(key) for key in keys[: len(keys) - MAX_BINS + 1])
+        lowest = keys[len(keys) - MAX_BINS]
+        self.bins[lowest] = self.bins.get(lowest, 0) + merged
+
+
+    def merge(self, other: "DDSketch") -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches with different accuracy cannot be merged")
+        bins = self.bins
+        if not bins:
+            bins.update(other.bins)
+        else:
+            for key, n in other.bins.items():
+                bins[key] = bins.get(key, 0) + n
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(bins) > MAX_BINS:
+            self._collapse()
+
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Value at quantile q (0..1), or None for an empty sketch.
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero:
+            return 0.0
+        seen = self.zero
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                value = 2.0 * self.gamma ** key / (self.gamma + 1.0)
+                return min(self.max, max(self.min, value))
+        return self.max
+
+
+    def quantiles(self, qs: Iterable[float] = DEFAULT_QUANTILES) -> Dict[str, float | None]:
+        """
+        {"p50": ..., "p95": ...} in one pass over the bins.
+        """
+        qs = sorted(qs)
+        result: Dict[str, float | None] = {f"p{q * 100:g}": None for q in qs}
+        if not self.count:
+            return result
+        ranks = [(f"p{q * 100:g}", q * (self.count - 1)) for q in qs]
+        seen = self.zero
+        i = 0
+        while i < len(ranks) and ranks[i][1] < seen:
+            result[ranks[i][0]] = 0.0
+            i += 1
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            while i < len(ranks) and ranks[i][1] < seen:
+                value = 2.0 * self.gamma ** key / (self.gamma + 1.0)
+                result[ranks[i][0]] = min(self.max, max(self.min, value))
+                i += 1
+            if i == len(ranks):
+                break
+        return result
+
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(STATS.pack(self.min, self.max, self.sum))
+        _put_varint(out, self.zero)
+        _put_varint(out, len(self.bins))
+        previous = 0
+        for key in sorted(self.bins):
+            delta = key - previous
+            _put_varint(out, delta << 1 if delta >= 0 else ((-delta) << 1) - 1)
+            _put_varint(out, self.bins[key])
+            previous = key
+        return bytes(out)
+
+
+    @classmethod
+    def from_bytes(cls, data: bytes, accuracy: float = RELATIVE_ACCURACY) -> "DDSketch":
+        sketch = cls(accuracy)
+        sketch.min, sketch.max, sketch.sum = STATS.unpack_from(data)
+        sketch.zero, pos = _get_varint(data, STATS.size)
+        n, pos = _get_varint(data, pos)
+        key = 0
+        count = sketch.zero
+        for _ in range(n):
+            zigzag, pos = _get_varint(data, pos)
+            key += -((zigzag + 1) >> 1) if zigzag & 1 else zigzag >> 1
+            value, pos = _get_varint(data, pos)
+            sketch.bins[key] = value
+            count += value
+        sketch.count = count
+        return sketch
+
+
+def _keys(local: datetime) -> tuple[str, str, str]:
+    return local.strftime("%Y-%m-%dT%H"), local.strftime("%Y-%m-%d"), local.strftime("%Y-%m")
+
+
+class SketchStore:
+    """
+    Per-metric DDSketches per local hour, day and month, fed from the
+    sampler stream and persisted in one file per month next to the history.
+
+    Each sample computes its bin index once per metric and bumps the three
+    period sketches it belongs to (the current ones are cached), so
+    maintenance costs a few microseconds per tick. Queries merge the
+    coarsest stored periods that tile the range: a calendar month is one
+    stored sketch, "last 30 days" about 30 day sketches plus hourly edges.
+    Month files are read on first use and each stored sketch is decoded
+    only when a query touches it.
+    """
+
+    def __init__(self, directory: str | None = None, accuracy: float = RELATIVE_ACCURACY) -> None:
+        self.directory = directory or history_dir()
+        self.accuracy = accuracy
+        self._probe = DDSketch(accuracy)  # shared bin-index computation
+        # (metric, level, key) -> sketch; hour/day/month keys identify the period.
+        # Sketches read from disk stay encoded until a query or sample needs them.
+        self._sketches: Dict[tuple[int, int, str], DDSketch] = {}
+        self._encoded: Dict[tuple[int, int, str], bytes] = {}
+        self._dirty: set[tuple[int, int, str]] = set()
+        self._loaded_months: set[str] = set()
+        self._hour_end = -math.inf
+        self._hour_start = math.inf
+        self._current: list[tuple[DDSketch, DDSketch, DDSketch]] = []
+
+
+    def path(self, month: str) -> str:
+        return os.path.join(self.directory, f"sketches-{month}.nsq")
+
+
+    def _get(self, entry: tuple[int, int, str]) -> DDSketch | None:
+        sketch = self._sketches.get(entry)
+        if sketch is None:
+            payload = self._encoded.get(entry)
+            if payload is not None:
+                sketch = self._sketches[entry] = DDSketch.from_bytes(payload, self.accuracy)
+        return sketch
+
+
+    def _sketch(self, metric: int, level: int, key: str) -> DDSketch:
+        entry = (metric, level, key)
+        sketch = self._get(entry)
+        if sketch is None:
+            sketch = self._sketches[entry] = DDSketch(self.accuracy)
+        return sketch
+
+
+    def _enter_hour(self, ts: float) -> None:
+        local = datetime.fromtimestamp(ts).replace(minute=0, second=0, microsecond=0)
+        keys = _keys(local)
+        self._load_month(keys[2])
+        self._hour_start = local.timestamp()
+        self._hour_end = (local + timedelta(hours=1)).timestamp()
+        self._current = [tuple(self._sketch(m, level, keys[level]) for level in range(3)) for m in range(len(METRICS))]
+        self._dirty.update((m, level, keys[level]) for m in range(len(METRICS)) for level in range(3))
+
+
+    def add_sample(self, ts: float, down_mbps: float, up_mbps: float, rtt_ms: float | None) -> None:
+        if not self._hour_start <= ts < self._hour_end:
+            self._enter_hour(ts)
+        index = self._probe.index
+        for metric, value in enumerate((down_mbps, up_mbps, rtt_ms)):
+            if value is None or value != value:
+                continue
+            bin_index = index(value) if value > 0.0 else None
+            for sketch in self._current[metric]:
+                sketch.add(value, bin_index)
+
+
+    def _periods(self, start: float, end: float | None) -> Iterator[tuple[int, str, str]]:
+        """
+        (level, key, month) tiling [start, end): whole months, then whole
+        days, then hours; edges older than HOURS_KEEP use their whole day.
+        With end None (up to now) the current, still open periods are used
+        whole, since nothing has been recorded after now.
+        """
+        open_ended = end is None or end >= time.time()
+        cursor = datetime.fromtimestamp(start).replace(minute=0, second=0, microsecond=0)
+        last = datetime.fromtimestamp(time.time() if end is None else end)
+        hours_from = datetime.fromtimestamp(time.time() - HOURS_KEEP * 3600)
+        while cursor < last:
+            hour_key, day_key, month_key = _keys(cursor)
+            day_start = cursor.replace(hour=0)
+            month_start = day_start.replace(day=1)
+            next_month = (month_start + timedelta(days=32)).replace(day=1)
+            next_day = day_start + timedelta(days=1)
+            if cursor == month_start and (next_month <= last or open_ended):
+                yield 2, month_key, month_key
+                cursor = next_month
+            elif cursor == day_start and (next_day <= last or open_ended) or cursor < hours_from:
+                yield 1, day_key, month_key
+                cursor = next_day
+            else:
+                yield 0, hour_key, month_key
+                cursor += timedelta(hours=1)
+
+
+    def sketch_for(self, metric: str, start: float, end: float | None = None) -> DDSketch:
+        """
+        Merged sketch of `metric` ("down", "up", "rtt") over [start, end)
+        (end None = now), at hour resolution (day resolution for edges older than HOURS_KEEP).
+        """
+        m = METRICS.index(metric)
+        merged = DDSketch(self.accuracy)
+        for level, key, month in self._periods(start, end):
+            self._load_month(month)
+            sketch = self._get((m, level, key))
+            if sketch is not None:
+                merged.merge(sketch)
+        return merged
+
+
+    def percentiles(
+        self,
+        metric: str,
+        start: float,
+        end: float | None = None,
+        qs: Iterable[float] = DEFAULT_QUANTILES,
+    ) -> Dict[str, float | int | None]:
+        """
+        {"count", "mean", "p50", "p95", "p99", ...} for `metric` over [start, end).
+        """
+        sketch = self.sketch_for(metric, start, end)
+        result: Dict[str, float | int | None] = {"count": sketch.count, "mean": sketch.sum / sketch.count if sketch.count else None}
+        result.update(sketch.quantiles(qs))
+        return result
+
+
+    def missing_months(self, start: float, end: float | None = None) -> list[str]:
+        """
+        Months a query over [start, end) touches that are not read yet.
+        """
+        return sorted({month for _, _, month in self._periods(start, end)} - self._loaded_months)
+
+
+    def read_months(self, months: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Raw file contents for `months` (b"" when missing). Touches no state,
+        so it can run on a worker thread; hand the result to `add_months`
+        on the thread that feeds samples.
+        """
+        contents: Dict[str, bytes] = {}
+        for month in months:
+            try:
+                with open(self.path(month), "rb") as f:
+                    contents[month] = f.read()
+            except OSError:
+                contents[month] = b""
+        return contents
+
+
+    def add_months(self, contents: Dict[str, bytes]) -> None:
+        for month, data in contents.items():
+            self._load_month(month, data)
+
+
+    def _load_month(self, month: str, data: bytes | None = None) -> None:
+        if month in self._loaded_months:
+            return
+        self._loaded_months.add(month)
+        try:
+            if data is None:
+                with open(self.path(month), "rb") as f:
+                    data = f.read()
+            magic, version, accuracy = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or accuracy != self.accuracy:
+                return
+            pos = HEADER.size
+            while pos < len(data):
+                metric, level, key_len = ENTRY.unpack_from(data, pos)
+                pos += ENTRY.size
+                key = data[pos:pos + key_len].decode("ascii")
+                pos += key_len
+                (length,) = LENGTH.unpack_from(data, pos)
+                pos += LENGTH.size
+                payload = data[pos:pos + length]
+                pos += length
+                entry = (metric, level, key)
+                existing = self._sketches.get(entry)
+                if existing is not None:  # samples added before the file was read
+                    existing.merge(DDSketch.from_bytes(payload, self.accuracy))
+                    self._dirty.add(entry)
+                else:
+                    self._encoded[entry] = payload
+        except (OSError, struct.error, ValueError, IndexError):
+            pass  # first run for this month, or unreadable: start empty
+
+
+    def snapshot(self, now: float | None = None) -> Dict[str, bytes]:
+        """
+        Encode months with changes since the last snapshot into file
+        contents ({path: bytes}); only changed sketches are re-encoded.
+        Expired hourly sketches are dropped first. Call on the thread that
+        feeds samples, then write with `write_snapshot` anywhere.
+        """
+        now = time.time() if now is None else now
+        expired = datetime.fromtimestamp(now - HOURS_KEEP * 3600).strftime("%Y-%m-%dT%H")
+        months = {entry[2][:7] for entry in self._dirty}
+        for entry in [e for e in self._sketches.keys() | self._encoded.keys() if e[1] == 0 and e[2] < expired]:
+            self._sketches.pop(entry, None)
+            self._encoded.pop(entry, None)
+            months.add(entry[2][:7])
+        for entry in self._dirty:
+            sketch = self._sketches.get(entry)
+            if sketch is not None:
+                self._encoded[entry] = sketch.to_bytes()
+        self._dirty = set(self._current_entries())  # still being fed
+        files: Dict[str, bytes] = {}
+        for month in months:
+            out = bytearray(HEADER.pack(MAGIC, VERSION, self.accuracy))
+            for entry in sorted(e for e in self._encoded if e[2][:7] == month):
+                payload = self._encoded[entry]
+                key = entry[2].encode("ascii")
+                out += ENTRY.pack(entry[0], entry[1], len(key)) + key + LENGTH.pack(len(payload)) + payload
+            files[self.path(month)] = bytes(out)
+        return files
+
+
+    def _current_entries(self) -> Iterator[tuple[int, int, str]]:
+        if self._hour_end == -math.inf:
+            return
+        keys = _keys(datetime.fromtimestamp(self._hour_start))
+        for m in range(len(METRICS)):
+            for level in range(3):
+                yield (m, level, keys[level])
+
+
+    def save(self) -> None:
+        try:
+            write_snapshot(self.snapshot(), self.directory)
+        except Exception:
+            pass
+
+
+def write_snapshot(files: Dict[str, bytes], directory: str | None = None) -> None:
+    """
+    Write `SketchStore.snapshot()` output (temp file + os.replace per month)
+    and delete month files older than KEEP_MONTHS.
+    """
+    for path, data in files.items():
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    directory = directory or history_dir()
+    months = sorted(name for name in os.listdir(directory) if name.startswith("sketches-") and name.endswith(".nsq"))
+    for name in months[:-KEEP_MONTHS]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def _parse_day(value: str) -> float:
+    return datetime.strptime(value, "%Y-%m-%d").timestamp()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Throughput/RTT percentiles from NetSpeed Widget sketches")
+    parser.add_argument("--metric", choices=METRICS, default="down")
+    parser.add_argument("--days", type=float, default=30.0, help="range ending now (ignored with --from)")
+    parser.add_argument("--from", dest="start", type=_parse_day, default=None, help="YYYY-MM-DD (local)")
+    parser.add_argument("--to", dest="end", type=_parse_day, default=None, help="YYYY-MM-DD (local, exclusive)")
+    parser.add_argument("dirs", nargs="*", help="history folders to merge, e.g. copied from several hosts (default: this one)")
+    args = parser.parse_args(argv)
+
+    start = args.start
+    if start is None:
+        start = (args.end if args.end is not None else time.time()) - args.days * 86400.0
+    started = time.perf_counter()
+    sketch = DDSketch()
+    for directory in args.dirs or [None]:
+        sketch.merge(SketchStore(directory).sketch_for(args.metric, start, args.end))
+    result = {"count": sketch.count, **sketch.quantiles()}
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    unit = "ms" if args.metric == "rtt" else "Mb/s"
+    values = "  ".join(f"{k} {v:.2f}" for k, v in result.items() if k.startswith("p") and v is not None)
+    print(f"{args.metric} ({unit}), {result['count']} samples: {values or 'no data'}  [{elapsed_ms:.1f} ms incl. load]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import threading
+from typing import Callable, NamedTuple
+
+
+class AppState(NamedTuple):
+    """
+    Immutable snapshot of the bits of app state the tray renders
+    (including the self-monitor's diagnostics lines).
+    `version` increases by one on every effective change.
+    """
+    version: int = 0
+    opacity: float = 0.72
+    speedtest_running: bool = False
+    speedtest_summary: str = ""
+    diagnostics: tuple[str, ...] = ()
+    alloc_tracking: bool = False
+    graph_window: int = 10
+    anomaly: str = ""
+
+
+class StateStore:
+    """
+    In-memory, versioned holder for `AppState`.
+
+    Writers call `update(...)` from any thread; readers grab `snapshot()`,
+    which is a plain attribute read of an immutable tuple and never touches
+    disk. Subscribers are called (outside the lock) after each effective change.
+    """
+
+    def __init__(self, **initial) -> None:
+        self._lock = threading.Lock()
+        self._state = AppState(**initial)
+        self._subscribers: list[Callable[[AppState], None]] = []
+
+
+    def snapshot(self) -> AppState:
+        """
+        Current state. Safe to call from any thread.
+        """
+        return self._state
+
+
+    def update(self, **changes) -> AppState:
+        """
+        Apply field changes. No-op (no version bump, no notify) if nothing differs.
+        """
+        with self._lock:
+            current = self._state
+            if all(getattr(current, key) == value for key, value in changes.items()):
+                return current
+            self._state = current._replace(version=current.version + 1, **changes)
+            state = self._state
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(state)
+            except Exception:
+                pass
+        return state
+
+
+    def subscribe(self, callback: Callable[[AppState], None]) -> Callable[[], None]:
+        """
+        Register a change callback. Returns a function that unsubscribes it.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def _unsubscribe() -> None:
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return _unsubscribe
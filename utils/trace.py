@@ -0,0 +1,137 @@
+import struct
+import threading
+import time
+from typing import IO, Iterator
+
+from net.counters import CounterSource
+
+# Trace file ("NSWT"), little-endian:
+#   header:  magic, version u8, 3 pad bytes, wall clock f64 and monotonic
+#            clock f64 taken together when recording started
+#   records: kind u8, monotonic timestamp f64, then
+#            kind 1 (counters): bytes_sent u64, bytes_recv u64   (25 bytes)
+#            kind 2 (probe):    rtt ms f32, NaN = lost           (13 bytes)
+# A 1 Hz recording is ~38 bytes per second (~3.3 MB per day).
+TRACE_MAGIC = b"NSWT"
+TRACE_VERSION = 1
+HEADER = struct.Struct("<4sB3xdd")
+KIND_COUNTERS = 1
+KIND_PROBE = 2
+COUNTERS_RECORD = struct.Struct("<BdQQ")
+PROBE_RECORD = struct.Struct("<Bdf")
+_RECORD_SIZES = {KIND_COUNTERS: COUNTERS_RECORD.size, KIND_PROBE: PROBE_RECORD.size}
+READ_BLOCK = 1 << 20
+
+# ("counters", mono, bytes_sent, bytes_recv) or ("probe", mono, rtt_ms | None)
+TraceEvent = tuple
+
+
+class TraceRecorder:
+    """
+    Appends raw counter readings and probe results, each with its monotonic
+    timestamp, to a trace file for later replay.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: IO[bytes] | None = open(path, "wb")
+        self._lock = threading.Lock()
+        self._file.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, time.time(), time.monotonic()))
+
+
+    def counters(self, mono: float, bytes_sent: int, bytes_recv: int) -> None:
+        self._write(COUNTERS_RECORD.pack(KIND_COUNTERS, mono, bytes_sent, bytes_recv))
+
+
+    def probe(self, mono: float, rtt_ms: float | None) -> None:
+        self._write(PROBE_RECORD.pack(KIND_PROBE, mono, float("nan") if rtt_ms is None else rtt_ms))
+
+
+    def _write(self, record: bytes) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(record)
+            except Exception:
+                pass
+
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+                self._file = None
+
+
+class RecordingCounterSource(CounterSource):
+    """
+    Wraps a live counter source and records every reading it returns.
+    """
+
+    def __init__(self, inner: CounterSource, recorder: TraceRecorder) -> None:
+        self.inner = inner
+        self.recorder = recorder
+        self.name = inner.name
+
+
+    def read(self) -> tuple[int, int]:
+        sent, recv = self.inner.read()
+        self.recorder.counters(time.monotonic(), sent, recv)
+        return sent, recv
+
+
+    def read_interfaces(self) -> dict[str, tuple[int, int]]:
+        return self.inner.read_interfaces()  # not part of the trace
+
+
+    def close(self) -> None:
+        self.inner.close()
+        self.recorder.close()
+
+
+class TraceReader:
+    """
+    Streams a trace file back as events, reading it in 1 MB blocks.
+    `wall_origin`/`mono_origin` map monotonic timestamps to wall time.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, self.wall_origin, self.mono_origin = HEADER.unpack(f.read(HEADER.size))
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"{path} is not a version {TRACE_VERSION} NSWT trace")
+
+
+    def wall_time(self, mono: float) -> float:
+        return self.wall_origin + (mono - self.mono_origin)
+
+
+    def __iter__(self) -> Iterator[TraceEvent]:
+        with open(self.path, "rb") as f:
+            f.seek(HEADER.size)
+            pending = b""
+            while True:
+                block = f.read(READ_BLOCK)
+                if not block:
+                    return  # a torn trailing record (crash mid-write) is ignored
+                data = pending + block
+                pos, end = 0, len(data)
+                while pos < end:
+                    size = _RECORD_SIZES.get(data[pos])
+                    if size is None:
+                        raise ValueError(f"Corrupt trace record at block offset {pos}")
+                    if pos + size > end:
+                        break
+                    if data[pos] == KIND_COUNTERS:
+                        _, mono, sent, recv = COUNTERS_RECORD.unpack_from(data, pos)
+                        yield ("counters", mono, sent, recv)
+                    else:
+                        _, mono, rtt = PROBE_RECORD.unpack_from(data, pos)
+                        yield ("probe", mono, None if rtt != rtt else rtt)
+                    pos += size
+                pending = data[pos:]
@@ -0,0 +1,250 @@
+import argparse
+import copy
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from net.counters import is_loopback
+from utils.alerts import Alert
+from utils.history import history_dir, write_json_atomic
+
+USAGE_FILE = "usage.json"
+USAGE_INTERVAL_SEC = 10.0        # per-interface counters are read at this cadence
+CHECKPOINT_SEC = 300.0           # default time between checkpoints to disk
+KEEP_DAYS = 62
+KEEP_MONTHS = 24
+MIN_PROJECTION_SEC = 60 * 60     # observe at least this long before projecting a period
+
+# usage.json (rewritten whole on each checkpoint, via a temp file + os.replace):
+#   {"version": 1, "ts": last checkpoint,
+#    "days":   {"YYYY-MM-DD": {"since": ts, "ifaces": {name: [sent, recv]}}},
+#    "months": {"YYYY-MM":    {"since": ts, "ifaces": {name: [sent, recv]}}},
+#    "warned": ["day:YYYY-MM-DD:projected", "month:YYYY-MM:exceeded", ...]}
+# Periods are local calendar days/months (what metered plans bill on).
+# "since" is when accounting for that period started, so projections for a
+# period first seen mid-way use only the observed part.
+
+
+def usage_path() -> str:
+    return os.path.join(history_dir(), USAGE_FILE)
+
+
+def _period_keys(ts: float) -> tuple[str, str]:
+    local = datetime.fromtimestamp(ts)
+    return local.strftime("%Y-%m-%d"), local.strftime("%Y-%m")
+
+
+def _period_end(kind: str, key: str) -> float:
+    if kind == "day":
+        return (datetime.strptime(key, "%Y-%m-%d") + timedelta(days=1)).timestamp()
+    year, month = map(int, key.split("-"))
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return datetime(year, month, 1).timestamp()
+
+
+class UsageMeter:
+    """
+    Running byte totals per interface, per local day and per month.
+
+    `update` is fed per-interface counters (`CounterSource.read_interfaces`)
+    and adds the deltas since the previous reading to today's and this
+    month's totals. A counter that went backwards (adapter reset, driver
+    reload, 32-bit wrap) restarted from zero, so its new value is the delta.
+    Interfaces seen for the first time only set a baseline.
+
+    Totals are checkpointed every `checkpoint_sec` with an atomic replace
+    (`snapshot` on the feeding thread, `write` anywhere, or `checkpoint()`
+    for both) and restored on construction; at most one checkpoint
+    interval is lost on a crash. Quota projections use only the
+    running totals: used + (used / observed time) x time left in the period.
+    """
+
+    def __init__(self, settings: Dict[str, Any], path: str | None = None) -> None:
+        self.path = path or usage_path()
+        self.daily_quota = settings.get("daily_quota_bytes")
+        self.monthly_quota = settings.get("monthly_quota_bytes")
+        self.warn_ratio: float = settings.get("warn_ratio", 1.0)
+        self.interfaces: list[str] | None = settings.get("interfaces")
+        self.checkpoint_sec: float = settings.get("checkpoint_sec", CHECKPOINT_SEC)
+        self.days: Dict[str, Dict[str, Any]] = {}
+        self.months: Dict[str, Dict[str, Any]] = {}
+        self.warned: set[str] = set()
+        self._last: Dict[str, tuple[int, int]] = {}
+        self._dirty = False
+        self._load()
+
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.days = dict(data.get("days", {}))
+            self.months = dict(data.get("months", {}))
+            self.warned = set(data.get("warned", []))
+        except Exception:
+            pass  # first run or unreadable: start empty
+
+
+    def counted(self, interface: str) -> bool:
+        """
+        Whether an interface counts toward quotas (configured list, else
+        everything except loopback). Totals are kept for all interfaces.
+        """
+        if self.interfaces is not None:
+            return interface in self.interfaces
+        return not is_loopback(interface)
+
+
+    def update(self, ts: float, counters: Dict[str, tuple[int, int]]) -> list[Alert]:
+        """
+        Account one reading; returns quota alerts that became due.
+        """
+        day_key, month_key = _period_keys(ts)
+        day = self.days.setdefault(day_key, {"since": ts, "ifaces": {}})
+        month = self.months.setdefault(month_key, {"since": ts, "ifaces": {}})
+        for name, (sent, recv) in counters.items():
+            last = self._last.get(name)
+            self._last[name] = (sent, recv)
+            if last is None:
+                continue
+            d_sent = sent - last[0] if sent >= last[0] else sent
+            d_recv = recv - last[1] if recv >= last[1] else recv
+            if not d_sent and not d_recv:
+                continue
+            for period in (day, month):
+                totals = period["ifaces"].setdefault(name, [0, 0])
+                totals[0] += d_sent
+                totals[1] += d_recv
+            self._dirty = True
+
+        return self._check_quotas(ts, day_key, month_key)
+
+
+    def used(self, kind: str, key: str) -> int:
+        """
+        Bytes (sent + received) on counted interfaces for one period.
+        """
+        period = (self.days if kind == "day" else self.months).get(key)
+        if not period:
+            return 0
+        return sum(s + r for name, (s, r) in period["ifaces"].items() if self.counted(name))
+
+
+    def projected(self, kind: str, key: str, ts: float) -> float | None:
+        """
+        Projected bytes at the end of the period, or None until it has been
+        observed for MIN_PROJECTION_SEC.
+        """
+        period = (self.days if kind == "day" else self.months).get(key)
+        if not period:
+            return None
+        observed = ts - period["since"]
+        if observed < MIN_PROJECTION_SEC:
+            return None
+        used = self.used(kind, key)
+        return used + used / observed * max(0.0, _period_end(kind, key) - ts)
+
+
+    def _check_quotas(self, ts: float, day_key: str, month_key: str) -> list[Alert]:
+        alerts: list[Alert] = []
+        for kind, key, quota in (("day", day_key, self.daily_quota), ("month", month_key, self.monthly_quota)):
+            if not quota:
+                continue
+            used = self.used(kind, key)
+            label = "Daily" if kind == "day" else "Monthly"
+            if used >= quota:
+                if self._warn_once(f"{kind}:{key}:exceeded"):
+                    alerts.append(Alert(ts, f"quota_{kind}", True, used / quota, f"{label} data quota exceeded: {_gb(used)} of {_gb(quota)}"))
+                continue
+            projected = self.projected(kind, key, ts)
+            if projected is not None and projected >= quota * self.warn_ratio:
+                if self._warn_once(f"{kind}:{key}:projected"):
+                    alerts.append(Alert(
+                        ts, f"quota_{kind}", True, projected / quota,
+                        f"{label} data usage on track for {_gb(projected)} of {_gb(quota)} quota ({_gb(used)} so far)",
+                    ))
+        return alerts
+
+
+    def _warn_once(self, key: str) -> bool:
+        if key in self.warned:
+            return False
+        self.warned.add(key)
+        self._dirty = True
+        return True
+
+
+    def summary(self, ts: float | None = None) -> Dict[str, Any]:
+        """
+        Today's and this month's counted bytes, projections and quotas.
+        """
+        ts = time.time() if ts is None else ts
+        day_key, month_key = _period_keys(ts)
+        return {
+            "day": {"key": day_key, "bytes": self.used("day", day_key), "projected": self.projected("day", day_key, ts), "quota": self.daily_quota},
+            "month": {"key": month_key, "bytes": self.used("month", month_key), "projected": self.projected("month", month_key, ts), "quota": self.monthly_quota},
+        }
+
+
+    def snapshot(self, ts: float | None = None) -> Dict[str, Any] | None:
+        """
+        Prune expired periods and return a copy of the usage.json contents,
+        or None if nothing changed since the last snapshot. Call on the
+        thread that feeds `update`, then `write` it anywhere.
+        """
+        ts = time.time() if ts is None else ts
+        if not self._dirty:
+            return None
+        for table, keep in ((self.days, KEEP_DAYS), (self.months, KEEP_MONTHS)):
+            for key in sorted(table)[:-keep]:
+                del table[key]
+        current = {f"{kind}:{key}" for kind, key in zip(("day", "month"), _period_keys(ts))}
+        self.warned = {w for w in self.warned if w.rsplit(":", 1)[0] in current}
+        self._dirty = False
+        return copy.deepcopy({"version": 1, "ts": ts, "days": self.days, "months": self.months, "warned": sorted(self.warned)})
+
+
+    def write(self, data: Dict[str, Any]) -> None:
+        """
+        Write a `snapshot` to disk atomically (see `write_json_atomic`).
+        """
+        try:
+            write_json_atomic(self.path, data)
+        except Exception:
+            self._dirty = True  # keep the totals in memory; the next checkpoint retries
+
+
+    def checkpoint(self, ts: float | None = None) -> None:
+        """
+        `snapshot` and `write` in one go (on shutdown).
+        """
+        data = self.snapshot(ts)
+        if data is not None:
+            self.write(data)
+
+
+def _gb(n: float) -> str:
+    return f"{n / 1e9:.1f} GB"
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Show NetSpeed Widget data usage totals")
+    parser.add_argument("--days", type=int, default=7, help="recent days to list")
+    args = parser.parse_args(argv)
+
+    meter = UsageMeter({})
+    for kind, table, keys in (
+        ("month", meter.months, sorted(meter.months)[-2:]),
+        ("day", meter.days, sorted(meter.days)[-args.days:]),
+    ):
+        for key in keys:
+            per_iface = ", ".join(
+                f"{name} {_gb(s)}↑ {_gb(r)}↓" for name, (s, r) in sorted(table[key]["ifaces"].items()) if s or r
+            )
+            print(f"{kind:<5} {key}  {_gb(meter.used(kind, key)):>9}  ({per_iface or 'no traffic'})")
+
+
+if __name__ == "__main__":
+    main()